@@ -1,6 +1,10 @@
 a = 1
-program = input("Введите название программы (Вакансии или Статистика): ")
+program = input("Введите название программы (Вакансии, Сессия или Статистика): ")
 if program == "Вакансии":
-    import subprograms.table
+    from subprograms import table
+    table.main()
+elif program == "Сессия":
+    from subprograms import table
+    table.session()
 elif program == "Статистика":
     import subprograms.vacancies
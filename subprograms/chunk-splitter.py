@@ -1,31 +1,172 @@
 import csv
-def csv_splitter(file_name, save_path):
-    f = open(file_name, mode="r", encoding="utf-8-sig")
-    reader = csv.reader(f)
-    data = list(reader)
-    print(data[0])
-    field_names = data[0]
-    years = set()
-    curr_year = data[1][-1][0:4]
-    years.add(curr_year)
-    lastindex = 1
-    for i, row in enumerate(data):
-        if len(row) != len(field_names):
-            continue
-        if i == 0:
-            continue
-        year = row[-1][0:4]
-        if (year not in years):
-            newfile = open(save_path + curr_year + ".csv", "w", encoding="utf-8-sig", newline='')
-            writer = csv.writer(newfile)
-            writer.writerow(field_names)
-            writer.writerows(data[lastindex:i])
-            lastindex = i
-            years.add(year)
-            curr_year = year
-    newfile = open(save_path + curr_year + ".csv", "w", encoding="utf-8-sig", newline='')
-    writer = csv.writer(newfile)
-    writer.writerow(field_names)
-    writer.writerows(data[lastindex:len(data)])
-
-csv_splitter("vacancies_by_year.csv", "./chunks/")
\ No newline at end of file
+import json
+import os
+import tempfile
+from collections import OrderedDict
+from unittest import TestCase
+
+
+class PartitionWriters:
+    """Пул открытых буферизованных файлов чанков. Держит открытыми не больше max_open_files файлов,
+    давно не использованный файл закрывается и при следующей записи дописывается.
+
+    Attributes:
+        save_path (str): Префикс пути чанков
+        field_names (list(str)): Заголовок таблицы
+        max_open_files (int): Максимальное количество одновременно открытых файлов
+        buffering (int): Размер буфера файла в байтах
+        row_counts (dict(str, int)): Количество записанных рядов по чанкам
+    """
+
+    def __init__(self, save_path, field_names, max_open_files=16, buffering=1 << 16):
+        """Инициализирует пустой пул.
+
+        Args:
+            save_path (str): Префикс пути чанков
+            field_names (list(str)): Заголовок таблицы
+            max_open_files (int): Максимальное количество одновременно открытых файлов
+            buffering (int): Размер буфера файла в байтах
+        """
+        self.save_path = save_path
+        self.field_names = field_names
+        self.max_open_files = max_open_files
+        self.buffering = buffering
+        self.row_counts = {}
+        self.open_files = OrderedDict()
+
+    def get_file_name(self, partition):
+        return self.save_path + partition + ".csv"
+
+    def get_writer(self, partition):
+        """Возвращает csv writer чанка, при необходимости открывая файл и закрывая самый старый.
+
+        Args:
+            partition (str): Название чанка
+
+        Returns:
+            csv.writer: Writer чанка
+        """
+        if partition in self.open_files:
+            self.open_files.move_to_end(partition)
+            return self.open_files[partition][1]
+        if len(self.open_files) >= self.max_open_files:
+            self.open_files.popitem(last=False)[1][0].close()
+        is_new = partition not in self.row_counts
+        f = open(self.get_file_name(partition), "w" if is_new else "a",
+                 encoding="utf-8-sig" if is_new else "utf-8", newline='', buffering=self.buffering)
+        writer = csv.writer(f)
+        if is_new:
+            writer.writerow(self.field_names)
+            self.row_counts[partition] = 0
+        self.open_files[partition] = (f, writer)
+        return writer
+
+    def writerow(self, partition, row):
+        """Записывает ряд в чанк.
+
+        Args:
+            partition (str): Название чанка
+            row (list(str)): Ряд таблицы
+        """
+        self.get_writer(partition).writerow(row)
+        self.row_counts[partition] += 1
+
+    def close(self):
+        """Закрывает все открытые файлы."""
+        while self.open_files:
+            self.open_files.popitem(last=False)[1][0].close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def csv_splitter(file_name, save_path, max_open_files=16):
+    """Потоково разбивает csv файл на чанки по годам за один проход. Файл не обязан быть отсортирован по годам,
+    в памяти хранится только текущий ряд и буферы открытых файлов. Рядом с чанками сохраняется manifest.json
+    с количеством рядов в каждом чанке. Ряды с неполным количеством полей или с published_at, не начинающимся
+    с года, пропускаются и учитываются в skipped_rows.
+
+    Args:
+        file_name (str): Название файла в формате "*****.csv"
+        save_path (str): Префикс пути чанков, например "./chunks/"
+        max_open_files (int): Максимальное количество одновременно открытых файлов чанков
+
+    Returns:
+        dict: Манифест разбиения
+    """
+    skipped_rows = 0
+    with open(file_name, mode="r", encoding="utf-8-sig", newline='') as f:
+        reader = csv.reader(f)
+        field_names = next(reader)
+        print(field_names)
+        year_index = field_names.index("published_at") if "published_at" in field_names else -1
+        with PartitionWriters(save_path, field_names, max_open_files) as writers:
+            for row in reader:
+                if len(row) != len(field_names):
+                    skipped_rows += 1
+                    continue
+                year = row[year_index][0:4]
+                if len(year) != 4 or not year.isdigit():
+                    skipped_rows += 1
+                    continue
+                writers.writerow(year, row)
+            row_counts = writers.row_counts
+
+    manifest = {
+        "source": os.path.basename(file_name),
+        "field_names": field_names,
+        "skipped_rows": skipped_rows,
+        "partitions": {year: {"file": os.path.basename(save_path + year + ".csv"), "rows": row_counts[year]}
+                       for year in sorted(row_counts)},
+    }
+    with open(save_path + "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
+    return manifest
+
+
+class CsvSplitterTests(TestCase):
+    field_names = ["name", "salary", "published_at"]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.save_path = os.path.join(self.directory, "chunks") + os.sep
+        os.mkdir(self.save_path)
+        self.file_name = os.path.join(self.directory, "vacancies.csv")
+
+    def tearDown(self):
+        for directory, _, file_names in os.walk(self.directory, topdown=False):
+            for file_name in file_names:
+                os.remove(os.path.join(directory, file_name))
+            os.rmdir(directory)
+
+    def read_chunk(self, year):
+        with open(self.save_path + year + ".csv", encoding="utf-8-sig", newline='') as f:
+            return list(csv.reader(f))
+
+    def test_unsorted_years(self):
+        years = [2005, 2003, 2007, 2004, 2003, 2006, 2005, 2007, 2003, 2004]
+        rows = [[f"Вакансия {i}", str(i * 1000), f"{year}-0{i % 9 + 1}-01T10:00:00+0300"]
+                for i, year in enumerate(years)]
+        bad_rows = [["Без даты", "1000", ""], ["Плохая дата", "1000", "вчера"], ["Неполный ряд", "1000"]]
+        with open(self.file_name, "w", encoding="utf-8-sig", newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.field_names)
+            writer.writerows(rows[:5] + bad_rows + rows[5:])
+        manifest = csv_splitter(self.file_name, self.save_path, max_open_files=2)
+        self.assertEqual(manifest["skipped_rows"], 3)
+        self.assertEqual(manifest["partitions"],
+                         {str(year): {"file": f"{year}.csv", "rows": years.count(year)} for year in set(years)})
+        with open(self.save_path + "manifest.json", encoding="utf-8") as f:
+            self.assertEqual(json.load(f), manifest)
+        for year in set(years):
+            self.assertEqual(self.read_chunk(str(year)),
+                             [self.field_names] + [row for row in rows if row[2].startswith(str(year))])
+        self.assertEqual(sorted(os.listdir(self.save_path)),
+                         sorted([f"{year}.csv" for year in set(years)] + ["manifest.json"]))
+
+
+if __name__ == "__main__":
+    csv_splitter("vacancies_by_year.csv", "./chunks/")
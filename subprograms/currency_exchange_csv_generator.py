@@ -1,30 +1,319 @@
+import csv
+import io
+import os
+import tempfile
+import threading
+import xml.etree.ElementTree as ElementTree
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from urllib.parse import urlparse, parse_qs
+
 import requests
-import pandas as pd
 
-response = requests.get("http://www.cbr.ru/scripts/XML_daily_eng.asp?date_req=01/01/2017")
 currencies_to_convert = ["BYR", "USD", "EUR", "KZT", "UAH"]
-print(currencies_to_convert)
-df = pd.DataFrame(columns=currencies_to_convert)
-exchange_data = []
-for year in range(2003, 2023):
-    for month in range(1, 13):
-        if year == 2016 and month == 7:
-            currencies_to_convert[0] = "BYN"
-        date = f"01/{month:02d}/{year}"
-        response = requests.get(f"http://www.cbr.ru/scripts/XML_daily_eng.asp?date_req={date}")
-        if response.status_code == 200:
-            exchange_xml = pd.read_xml(response.text)
-            monthly_currencies = []
-            monthly_currencies.append(f"{year}-{month:02d}")
-            for currency in currencies_to_convert:
-                monthly_currencies.append(
-                    exchange_xml[exchange_xml["CharCode"] == currency]["Value"].apply(
-                        lambda x: float(x.split()[0].replace(',', '.'))).values[0]
-                     / exchange_xml[exchange_xml["CharCode"] == currency]["Nominal"].apply(lambda x: float(x)).values[
-                         0])
-            exchange_data.append(monthly_currencies)
-        else:
-            break
-currencies_to_convert[0] = "BYR"
-df = pd.DataFrame(exchange_data, columns=["date"] + currencies_to_convert)
-df.to_csv("exchange_data.csv", index=False, encoding="utf-8")
+
+
+def get_months(first_year, last_year):
+    """Возвращает месяцы с первого по последний год включительно.
+
+    Args:
+        first_year (int): Первый год
+        last_year (int): Последний год
+
+    Returns:
+        list(tuple(int, int)): Пары (год, месяц)
+
+    >>> get_months(2003, 2004)[11:13]
+    [(2003, 12), (2004, 1)]
+    """
+    return [(year, month) for year in range(first_year, last_year + 1) for month in range(1, 13)]
+
+
+def get_char_code(currency, year, month):
+    """Возвращает код валюты в ответе ЦБ. С июля 2016 года белорусский рубль котируется как BYN.
+
+    Args:
+        currency (str): Валюта из currencies_to_convert
+        year (int): Год
+        month (int): Месяц
+
+    Returns:
+        str: Код валюты
+
+    >>> get_char_code("BYR", 2016, 6), get_char_code("BYR", 2016, 7), get_char_code("USD", 2016, 7)
+    ('BYR', 'BYN', 'USD')
+    """
+    if currency == "BYR" and (year, month) >= (2016, 7):
+        return "BYN"
+    return currency
+
+
+def parse_rates(content):
+    """Потоково разбирает ответ ЦБ, не строя дерево документа целиком.
+
+    Args:
+        content (bytes): XML ответа XML_daily
+
+    Returns:
+        dict(str, float): Курсы валют к рублю за единицу валюты по кодам валют
+
+    >>> parse_rates(b'<ValCurs><Valute><CharCode>KZT</CharCode><Nominal>100</Nominal>'
+    ...             b'<Value>20,3925</Value></Valute></ValCurs>')
+    {'KZT': 0.203925}
+    """
+    rates = {}
+    for event, element in ElementTree.iterparse(io.BytesIO(content), events=("end",)):
+        if element.tag == "Valute":
+            value = element.findtext("Value")
+            nominal = element.findtext("Nominal")
+            rates[element.findtext("CharCode")] = float(value.split()[0].replace(',', '.')) / float(nominal)
+            element.clear()
+    return rates
+
+
+def has_rates(content, year, month, currencies=currencies_to_convert):
+    """Проверяет, что ответ ЦБ разбирается и содержит курсы всех валют.
+
+    Args:
+        content (bytes): XML ответа XML_daily
+        year (int): Год
+        month (int): Месяц
+        currencies (list(str)): Валюты
+
+    Returns:
+        bool: Ответ полный
+
+    >>> has_rates(b'<ValCurs><Valute><CharCode>USD</CharCode>', 2003, 1, ["USD"])
+    False
+    """
+    try:
+        rates = parse_rates(content)
+    except (ElementTree.ParseError, AttributeError, ValueError, ZeroDivisionError):
+        return False
+    return all(get_char_code(currency, year, month) in rates for currency in currencies)
+
+
+class ExchangeRatesFetcher:
+    """Загрузчик ежедневных курсов ЦБ на первое число месяца. Загружает месяцы параллельно
+    ограниченным пулом потоков, каждый поток переиспользует соединения своей requests.Session.
+    Каждый ответ сохраняется в cache_dir, поэтому повторный запуск загружает только недостающие месяцы.
+
+    Attributes:
+        base_url (str): Адрес XML_daily
+        cache_dir (str): Папка кэша ответов
+        max_workers (int): Максимальное количество одновременных запросов
+        timeout (float): Таймаут запроса в секундах
+    """
+
+    def __init__(self, base_url="http://www.cbr.ru/scripts/XML_daily_eng.asp", cache_dir="./exchange_cache",
+                 max_workers=8, timeout=30):
+        """Инициализирует загрузчик.
+
+        Args:
+            base_url (str): Адрес XML_daily
+            cache_dir (str): Папка кэша ответов
+            max_workers (int): Максимальное количество одновременных запросов
+            timeout (float): Таймаут запроса в секундах
+        """
+        self.base_url = base_url
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def get_session(self):
+        """Возвращает requests.Session текущего потока.
+
+        Returns:
+            requests.Session: Сессия потока
+        """
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def get_cache_name(self, year, month):
+        return os.path.join(self.cache_dir, f"{year}-{month:02d}.xml")
+
+    def fetch(self, year, month, currencies=currencies_to_convert):
+        """Возвращает ответ ЦБ за месяц из кэша или загружает его и сохраняет в кэш. Неполный или
+        неразбираемый ответ считается незагруженным и в кэш не сохраняется, такой файл кэша загружается заново.
+
+        Args:
+            year (int): Год
+            month (int): Месяц
+            currencies (list(str)): Валюты, курсы которых должны быть в ответе
+
+        Returns:
+            bytes: XML ответа или None, если загрузить его не удалось
+        """
+        cache_name = self.get_cache_name(year, month)
+        if os.path.exists(cache_name):
+            with open(cache_name, mode="rb") as f:
+                content = f.read()
+            if has_rates(content, year, month, currencies):
+                return content
+        try:
+            response = self.get_session().get(self.base_url, params={"date_req": f"01/{month:02d}/{year}"},
+                                              timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"{year}-{month:02d}: {e}")
+            return None
+        if response.status_code != 200:
+            print(f"{year}-{month:02d}: HTTP {response.status_code}")
+            return None
+        if not has_rates(response.content, year, month, currencies):
+            print(f"{year}-{month:02d}: неполный ответ")
+            return None
+        temporary_name = cache_name + f".{threading.get_ident()}.tmp"
+        with open(temporary_name, mode="wb") as f:
+            f.write(response.content)
+        os.replace(temporary_name, cache_name)
+        return response.content
+
+    def fetch_all(self, months, currencies=currencies_to_convert):
+        """Параллельно загружает ответы за месяцы.
+
+        Args:
+            months (list(tuple(int, int))): Пары (год, месяц)
+            currencies (list(str)): Валюты, курсы которых должны быть в ответах
+
+        Returns:
+            list(bytes): Ответы в порядке months, None - месяц не загружен
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            return list(executor.map(lambda year_month: self.fetch(*year_month, currencies), months))
+
+    def get_exchange_data(self, months, currencies=currencies_to_convert):
+        """Возвращает ряды таблицы курсов. Как и раньше, таблица обрывается на первом незагруженном месяце.
+
+        Args:
+            months (list(tuple(int, int))): Пары (год, месяц) по возрастанию
+            currencies (list(str)): Валюты
+
+        Returns:
+            list(list): Ряды [месяц вида "2007-12", курсы валют...]
+        """
+        exchange_data = []
+        for (year, month), content in zip(months, self.fetch_all(months, currencies)):
+            if content is None:
+                break
+            rates = parse_rates(content)
+            exchange_data.append([f"{year}-{month:02d}"]
+                                 + [rates[get_char_code(currency, year, month)] for currency in currencies])
+        return exchange_data
+
+
+def save_exchange_data(file_name, exchange_data, currencies=currencies_to_convert):
+    """Сохраняет таблицу курсов в csv.
+
+    Args:
+        file_name (str): Название файла в формате "*****.csv"
+        exchange_data (list(list)): Ряды [месяц, курсы валют...]
+        currencies (list(str)): Валюты
+    """
+    with open(file_name, mode="w", encoding="utf-8", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["date"] + currencies)
+        writer.writerows(exchange_data)
+
+
+class StubCbrHandler(BaseHTTPRequestHandler):
+    """Заглушка XML_daily для тестов: за 10 единиц валюты дается "<номер месяца>,5" рубля,
+    BYR сменяется на BYN в июле 2016 года."""
+    requests_count = 0
+    missing_dates = set()
+    malformed_dates = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        date = parse_qs(urlparse(self.path).query)["date_req"][0]
+        with self.lock:
+            type(self).requests_count += 1
+        if date in self.missing_dates:
+            self.send_response(404)
+            self.end_headers()
+            return
+        with self.lock:
+            malformed = date in self.malformed_dates
+            self.malformed_dates.discard(date)
+        if malformed:
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'<?xml version="1.0" encoding="windows-1251"?><ValCurs><Valute><CharCode>USD')
+            return
+        day, month, year = map(int, date.split("/"))
+        valutes = "".join(f"<Valute><CharCode>{code}</CharCode><Nominal>10</Nominal>"
+                          f"<Value>{month},5</Value></Valute>"
+                          for code in ["BYN" if (year, month) >= (2016, 7) else "BYR", "USD", "EUR", "KZT", "UAH"])
+        body = f'<?xml version="1.0" encoding="windows-1251"?><ValCurs Date="{date}">{valutes}</ValCurs>'
+        self.send_response(200)
+        self.end_headers()
+        self.wfile.write(body.encode("windows-1251"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ExchangeRatesFetcherTests(TestCase):
+    def setUp(self):
+        StubCbrHandler.requests_count = 0
+        StubCbrHandler.missing_dates = set()
+        StubCbrHandler.malformed_dates = set()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubCbrHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.fetcher = ExchangeRatesFetcher(f"http://127.0.0.1:{self.server.server_port}/XML_daily_eng.asp",
+                                            self.cache_dir, max_workers=4)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for file_name in os.listdir(self.cache_dir):
+            os.remove(os.path.join(self.cache_dir, file_name))
+        os.rmdir(self.cache_dir)
+
+    def test_rows(self):
+        exchange_data = self.fetcher.get_exchange_data(get_months(2016, 2016))
+        self.assertEqual(len(exchange_data), 12)
+        self.assertEqual(exchange_data[6], ["2016-07", 0.75, 0.75, 0.75, 0.75, 0.75])
+
+    def test_byn_column(self):
+        exchange_data = self.fetcher.get_exchange_data([(2016, 6), (2016, 7)])
+        self.assertEqual([row[1] for row in exchange_data], [0.65, 0.75])
+
+    def test_rerun_uses_cache(self):
+        months = get_months(2003, 2004)
+        self.fetcher.get_exchange_data(months)
+        self.assertEqual(StubCbrHandler.requests_count, 24)
+        self.fetcher.get_exchange_data(months)
+        self.assertEqual(StubCbrHandler.requests_count, 24)
+
+    def test_failed_month_is_fetched_on_rerun(self):
+        StubCbrHandler.missing_dates = {"01/03/2003"}
+        months = get_months(2003, 2003)
+        self.assertEqual(len(self.fetcher.get_exchange_data(months)), 2)
+        StubCbrHandler.missing_dates = set()
+        self.assertEqual(len(self.fetcher.get_exchange_data(months)), 12)
+        self.assertEqual(StubCbrHandler.requests_count, 13)
+
+    def test_malformed_month_is_not_cached(self):
+        StubCbrHandler.malformed_dates = {"01/03/2003"}
+        months = get_months(2003, 2003)
+        self.assertEqual(len(self.fetcher.get_exchange_data(months)), 2)
+        self.assertFalse(os.path.exists(self.fetcher.get_cache_name(2003, 3)))
+        self.assertEqual(len(self.fetcher.get_exchange_data(months)), 12)
+        self.assertEqual(StubCbrHandler.requests_count, 13)
+
+    def test_incomplete_cache_is_refetched(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.fetcher.get_cache_name(2003, 1), "wb") as f:
+            f.write(b"<html>Service unavailable</html>")
+        self.assertEqual(self.fetcher.get_exchange_data([(2003, 1)]), [["2003-01", 0.15, 0.15, 0.15, 0.15, 0.15]])
+        self.assertEqual(StubCbrHandler.requests_count, 1)
+
+
+if __name__ == "__main__":
+    fetcher = ExchangeRatesFetcher()
+    save_exchange_data("exchange_data.csv", fetcher.get_exchange_data(get_months(2003, 2022)))
@@ -1,62 +1,380 @@
-import pickle
-import requests
+import asyncio
 import json
+import math
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+date_format = "%Y-%m-%dT%H:%M:%S%z"
+
+
+class HarvestError(Exception):
+    """Страница не получена после всех попыток."""
+
+
+class TokenBucket:
+    """Ограничитель частоты запросов: токены пополняются со скоростью rate в секунду до capacity,
+    каждый запрос забирает один токен.
+
+    Attributes:
+        rate (float): Количество запросов в секунду
+        capacity (float): Максимальное количество запросов подряд без ожидания
+    """
+
+    def __init__(self, rate, capacity=1):
+        """Инициализирует заполненный ограничитель.
+
+        Args:
+            rate (float): Количество запросов в секунду
+            capacity (float): Максимальное количество запросов подряд без ожидания
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Ждет, пока появится токен, и забирает его."""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def parse_date(date):
+    return datetime.strptime(date, date_format)
+
+
+def format_date(date):
+    return date.strftime(date_format)
+
+
+def split_window(date_from, date_to):
+    """Делит окно [date_from, date_to] на два непересекающихся окна с точностью до секунды.
+
+    Args:
+        date_from (str): Начало окна вида "2022-12-09T00:00:00+0300"
+        date_to (str): Конец окна
+
+    Returns:
+        list(tuple(str, str)): Два окна или одно исходное, если его нельзя разделить
+
+    >>> split_window("2022-12-09T00:00:00+0300", "2022-12-09T23:59:59+0300")
+    [('2022-12-09T00:00:00+0300', '2022-12-09T11:59:59+0300'), ('2022-12-09T12:00:00+0300', '2022-12-09T23:59:59+0300')]
+    """
+    start, end = parse_date(date_from), parse_date(date_to)
+    seconds = int((end - start).total_seconds())
+    if seconds < 1:
+        return [(date_from, date_to)]
+    middle = start + timedelta(seconds=seconds // 2)
+    return [(date_from, format_date(middle)), (format_date(middle + timedelta(seconds=1)), date_to)]
+
+
+class HHHarvester:
+    """Асинхронный сборщик вакансий HH.ru. Страницы запрашиваются параллельно с ограничением количества
+    одновременных запросов и их частоты, неудачные запросы повторяются с растущей паузой.
+    Если в окне времени вакансий больше, чем API отдает постранично, окно делится пополам.
+
+    Вакансии дописываются в JSONL файл по мере получения, завершенные окна - в файл "*****.jsonl.windows".
+    Повторный запуск пропускает завершенные окна и вакансии, id которых уже есть в файле.
+    HTTP запросы выполняются requests в потоках через asyncio.to_thread.
+
+    Attributes:
+        output_file (str): JSONL файл вакансий
+        windows_file (str): Файл завершенных окон
+        url (str): Адрес API вакансий
+        params (dict): Дополнительные параметры запроса
+        concurrency (int): Максимальное количество одновременных запросов
+        retries (int): Количество повторов неудачного запроса
+        backoff (float): Пауза перед первым повтором в секундах, каждый следующий повтор ждет вдвое дольше
+        per_page (int): Количество вакансий на странице
+        page_cap (int): Максимальное количество вакансий, которое API отдает по одному запросу
+        timeout (float): Таймаут запроса в секундах
+        seen_ids (set(str)): id сохраненных вакансий
+        done_windows (set(str)): Завершенные окна
+    """
+
+    def __init__(self, output_file, url="https://api.hh.ru/vacancies", params=None, concurrency=8, rate=10,
+                 retries=5, backoff=0.5, per_page=100, page_cap=2000, timeout=30):
+        """Инициализирует сборщик.
+
+        Args:
+            output_file (str): JSONL файл вакансий
+            url (str): Адрес API вакансий
+            params (dict): Дополнительные параметры запроса
+            concurrency (int): Максимальное количество одновременных запросов
+            rate (float): Максимальное количество запросов в секунду
+            retries (int): Количество повторов неудачного запроса
+            backoff (float): Пауза перед первым повтором в секундах
+            per_page (int): Количество вакансий на странице
+            page_cap (int): Максимальное количество вакансий, которое API отдает по одному запросу
+            timeout (float): Таймаут запроса в секундах
+        """
+        self.output_file = output_file
+        self.windows_file = output_file + ".windows"
+        self.url = url
+        self.params = {"specialization": 1} if params is None else params
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.per_page = per_page
+        self.page_cap = page_cap
+        self.timeout = timeout
+        self.seen_ids = set()
+        self.done_windows = set()
+        self.local = threading.local()
+
+    def get_session(self):
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def load_progress(self):
+        """Загружает id сохраненных вакансий и завершенные окна. Оборванная при прерывании
+        последняя строка JSONL файла отбрасывается."""
+        self.seen_ids = set()
+        self.done_windows = set()
+        if os.path.exists(self.output_file):
+            with open(self.output_file, mode="r+b") as f:
+                complete_size = 0
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    complete_size += len(line)
+                    self.seen_ids.add(json.loads(line)["id"])
+                f.truncate(complete_size)
+        if os.path.exists(self.windows_file):
+            with open(self.windows_file, mode="r", encoding="utf-8") as f:
+                self.done_windows = set(f.read().splitlines())
 
+    def get(self, params):
+        return self.get_session().get(self.url, params=params, timeout=self.timeout)
 
-def iter_pages(pages, params, url, vacancies):
-    for page in range(1, pages):
-        params['page'] = page
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            response = response.json()
-            vacancies += response["items"]
+    async def get_page(self, date_from, date_to, page):
+        """Запрашивает страницу вакансий, повторяя запрос при ошибках соединения, 429 и 5xx.
+
+        Args:
+            date_from (str): Начало окна
+            date_to (str): Конец окна
+            page (int): Номер страницы
+
+        Returns:
+            dict: Ответ API
+
+        Raises:
+            HarvestError: Страница не получена
+        """
+        params = dict(self.params, date_from=date_from, date_to=date_to, per_page=self.per_page, page=page)
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            await self.bucket.acquire()
+            async with self.semaphore:
+                try:
+                    response = await asyncio.to_thread(self.get, params)
+                except requests.RequestException as e:
+                    error = str(e)
+                    continue
+            if response.status_code == 200:
+                return response.json()
+            error = f"Ошибка {response.status_code} при получении данных с HH.ru: {response.text}"
+            if response.status_code != 429 and response.status_code < 500:
+                break
+        raise HarvestError(f"{date_from} - {date_to}, страница {page}: {error}")
+
+    def save_items(self, items):
+        """Дописывает в JSONL файл вакансии, которых в нем еще нет.
+
+        Args:
+            items (list(dict)): Вакансии
+        """
+        for item in items:
+            if item["id"] in self.seen_ids:
+                continue
+            self.seen_ids.add(item["id"])
+            self.output.write(json.dumps(item, ensure_ascii=False) + "\n")
+        self.output.flush()
+
+    async def harvest_window(self, date_from, date_to):
+        """Собирает вакансии окна, при необходимости деля его на части.
+
+        Args:
+            date_from (str): Начало окна
+            date_to (str): Конец окна
+
+        Returns:
+            bool: Собраны ли все вакансии окна
+        """
+        window = f"{date_from} {date_to}"
+        if window in self.done_windows:
+            return True
+        try:
+            first_page = await self.get_page(date_from, date_to, 0)
+        except HarvestError as e:
+            print(e)
+            return False
+        windows = split_window(date_from, date_to) if first_page["found"] > self.page_cap else []
+        if len(windows) > 1:
+            results = await asyncio.gather(*(self.harvest_window(*window) for window in windows))
         else:
-            print(f'Ошибка {response.status_code} при получении данных с HH.ru')
-            print(response.text)
-            input("Нажмите Enter для продолжения...")
+            if windows:
+                print(f"{date_from} - {date_to}: окно нельзя разделить, будут получены первые {self.page_cap} вакансий")
+            self.save_items(first_page["items"])
+            pages = min(first_page["pages"], math.ceil(self.page_cap / self.per_page))
+            results = await asyncio.gather(*(self.harvest_page(date_from, date_to, page) for page in range(1, pages)))
+        if not all(results):
+            return False
+        self.done_windows.add(window)
+        with open(self.windows_file, mode="a", encoding="utf-8") as f:
+            f.write(window + "\n")
+        return True
+
+    async def harvest_page(self, date_from, date_to, page):
+        try:
+            self.save_items((await self.get_page(date_from, date_to, page))["items"])
+            return True
+        except HarvestError as e:
+            print(e)
+            return False
+
+    async def harvest(self, date_from, date_to):
+        """Собирает вакансии за период, продолжая прерванный сбор.
+
+        Args:
+            date_from (str): Начало периода вида "2022-12-09T00:00:00+0300"
+            date_to (str): Конец периода
+
+        Returns:
+            bool: Собраны ли все вакансии периода. Если нет, сбор можно повторить.
+        """
+        self.load_progress()
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.bucket = TokenBucket(self.rate)
+        with open(self.output_file, mode="a", encoding="utf-8") as self.output:
+            return await self.harvest_window(date_from, date_to)
+
+    def run(self, date_from, date_to):
+        return asyncio.run(self.harvest(date_from, date_to))
+
+
+class FakeHHHandler(BaseHTTPRequestHandler):
+    """Заглушка API вакансий HH.ru для тестов: отдает вакансии окна постранично, не больше page_cap,
+    отвечает 503 на первые unavailable запросов и 403 на запросы страниц из forbidden_pages
+    вида (начало окна, номер страницы)."""
+    vacancies = []
+    page_cap = 10
+    unavailable = 0
+    forbidden_pages = set()
+    requests_count = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        page, per_page = int(params["page"]), int(params["per_page"])
+        with self.lock:
+            type(self).requests_count += 1
+            unavailable = self.unavailable > 0
+            type(self).unavailable -= unavailable
+        if unavailable or (params["date_from"], page) in self.forbidden_pages:
+            self.send_response(503 if unavailable else 403)
+            self.end_headers()
             return
+        date_from, date_to = parse_date(params["date_from"]), parse_date(params["date_to"])
+        found = [vacancy for vacancy in self.vacancies if date_from <= parse_date(vacancy["published_at"]) <= date_to]
+        available = found[:self.page_cap]
+        body = {"found": len(found), "pages": math.ceil(len(available) / per_page), "per_page": per_page,
+                "page": page, "items": available[page * per_page:(page + 1) * per_page]}
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps(body, ensure_ascii=False).encode("utf-8"))
 
+    def log_message(self, format, *args):
+        pass
 
-def get_vacancies():
-    url = 'https://api.hh.ru/vacancies'
-    params = {
-        'date_from': '2022-12-09T00:00:00+0300',
-        'date_to': '2022-12-09T23:59:59+0300',
-        'per_page': 100,
-        'page': 0,
-        'specialization': 1
-    }
-    response = requests.get(url, params=params)
-    if response.status_code == 200:
-        response = response.json()
-    else:
-        print(f'Ошибка {response.status_code} при получении данных с HH.ru')
-        print(response.text)
-        input("Нажмите Enter для продолжения...")
-        return
-    vacancies = response["items"]
-    pages = response["pages"]
-    iter_pages(pages, params, url, vacancies)
-    for i in range(2, 24, 2):
-        params['date_from'] = f'2022-12-09T{i:02d}:00:00+0300'
-        params['date_to'] = f'2022-12-09T{i + 1:02d}:59:59+0300'
-        response = requests.get(url, params=params)
-        if response.status_code == 200:
-            response = response.json()
-        else:
-            print(f'Ошибка {response.status_code} при получении данных с HH.ru')
-            print(response.text)
-            input("Нажмите Enter для продолжения...")
-        pages = response["pages"]
-        iter_pages(pages, params, url, vacancies)
-
-    return vacancies
-
-
-res = get_vacancies()
-# pickle get_vacancies
-with open('vacancies_hh.pickle', 'wb') as f:
-    pickle.dump(res, f)
-# json dump get_vacancies
-with open('vacancies_hh_json_dump.json', 'w', encoding='utf-8') as f:
-    json.dump(res, f, ensure_ascii=False)
+
+class HHHarvesterTests(TestCase):
+    date_from = "2022-12-09T00:00:00+0300"
+    date_to = "2022-12-09T23:59:59+0300"
+
+    def setUp(self):
+        start = parse_date(self.date_from)
+        FakeHHHandler.vacancies = [{"id": str(i), "name": f"Вакансия {i}",
+                                    "published_at": format_date(start + timedelta(minutes=37 * i))}
+                                   for i in range(37)]
+        FakeHHHandler.unavailable = 0
+        FakeHHHandler.forbidden_pages = set()
+        FakeHHHandler.requests_count = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeHHHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        fd, self.output_file = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        for file_name in (self.output_file, self.output_file + ".windows"):
+            if os.path.exists(file_name):
+                os.remove(file_name)
+
+    def get_harvester(self):
+        return HHHarvester(self.output_file, f"http://127.0.0.1:{self.server.server_port}/vacancies", params={},
+                           concurrency=4, rate=1000, retries=2, backoff=0.01, per_page=3, page_cap=10)
+
+    def get_saved_ids(self):
+        with open(self.output_file, encoding="utf-8") as f:
+            return [json.loads(line)["id"] for line in f]
+
+    def test_windows_are_split(self):
+        self.assertTrue(self.get_harvester().run(self.date_from, self.date_to))
+        self.assertEqual(sorted(self.get_saved_ids(), key=int), [str(i) for i in range(37)])
+
+    def test_retries(self):
+        FakeHHHandler.unavailable = 2
+        self.assertTrue(self.get_harvester().run(self.date_from, self.date_to))
+        self.assertEqual(len(self.get_saved_ids()), 37)
+
+    def test_resume(self):
+        FakeHHHandler.forbidden_pages = {("2022-12-09T18:00:00+0300", 2)}
+        self.assertFalse(self.get_harvester().run(self.date_from, self.date_to))
+        saved_count = len(self.get_saved_ids())
+        first_requests_count = FakeHHHandler.requests_count
+        with open(self.output_file, "a", encoding="utf-8") as f:
+            f.write('{"id": "interrupted')
+        FakeHHHandler.forbidden_pages = set()
+        FakeHHHandler.requests_count = 0
+        self.assertTrue(self.get_harvester().run(self.date_from, self.date_to))
+        self.assertEqual(sorted(self.get_saved_ids(), key=int), [str(i) for i in range(37)])
+        self.assertLess(saved_count, 37)
+        self.assertLess(FakeHHHandler.requests_count, first_requests_count / 2)
+        FakeHHHandler.requests_count = 0
+        self.assertTrue(self.get_harvester().run(self.date_from, self.date_to))
+        self.assertEqual(FakeHHHandler.requests_count, 0)
+
+    def test_token_bucket(self):
+        async def acquire_all(bucket):
+            for i in range(11):
+                await bucket.acquire()
+
+        start = time.monotonic()
+        asyncio.run(acquire_all(TokenBucket(50)))
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+
+if __name__ == "__main__":
+    HHHarvester("vacancies_hh.jsonl").run("2022-12-09T00:00:00+0300", "2022-12-09T23:59:59+0300")
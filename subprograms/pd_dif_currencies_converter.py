@@ -1,31 +1,69 @@
+from unittest import TestCase
+
 import pandas as pd
 import numpy as np
 
-exchange = pd.read_csv("../exchange_data.csv")
-currencies = list(exchange.head())
-currencies.remove('date')
-currencies.append('RUR')
 
-df = pd.read_csv("vacancies_dif_currencies.csv", encoding='utf-8')
+def get_rates(exchange, dates, salary_currencies):
+    """Возвращает курсы валют к рублю для каждого ряда без построчного apply.
+    Таблица курсов один раз превращается в матрицу (месяц x валюта), курс ряда берется
+    индексированием матрицы по номеру месяца и номеру валюты.
+
+    Args:
+        exchange (pd.DataFrame): Таблица курсов с колонкой date вида "2007-12" и колонками валют
+        dates (pd.Series): Месяцы публикации вакансий вида "2007-12"
+        salary_currencies (pd.Series): Валюты окладов
+
+    Returns:
+        np.ndarray: Курсы; для RUR и валют, которых нет в таблице, - 1 (зарплата не переводится),
+                    для месяцев без курса и пустых курсов - NaN
+    """
+    rate_matrix = exchange.set_index('date')
+    month_index = rate_matrix.index.get_indexer(dates)
+    currency_index = rate_matrix.columns.get_indexer(salary_currencies)
+    rates = np.full(len(dates), np.nan)
+    found = (month_index >= 0) & (currency_index >= 0)
+    rates[found] = rate_matrix.to_numpy(dtype=float)[month_index[found], currency_index[found]]
+    rates[(salary_currencies == 'RUR').to_numpy() | (currency_index < 0)] = 1
+    return rates
+
+
+class GetRatesTests(TestCase):
+    exchange = pd.DataFrame({"date": ["2007-12", "2008-01"], "USD": [24.5, 24.6], "UAH": [np.nan, np.nan]})
+
+    def get_multipliers_by_apply(self, df):
+        """Прежний построчный перевод; месяц, которого нет в таблице, дает NaN вместо IndexError."""
+        currencies_set = set(self.exchange.columns) - {"date"} | {"RUR"}
+
+        def get_multiplier(date, currency):
+            if currency == 'RUR':
+                return 1
+            values = self.exchange[self.exchange['date'] == date][currency].values
+            return values[0] if len(values) else np.nan
 
+        return df.apply(lambda x: 1.0 if x['salary_currency'] not in currencies_set
+                        else get_multiplier(x['published_at'][:7], x['salary_currency']), axis=1).to_numpy(dtype=float)
 
-def get_multiplier(date, currency):
-    if currency == 'RUR':
-        return 1
-    else:
-        return exchange[exchange['date'] == date][currency].values[0]
+    def test_rates_equal_apply(self):
+        df = pd.DataFrame({"salary_currency": ["USD", "RUR", "UAH", "USD", "KZT", "USD"],
+                           "published_at": ["2007-12-03T10:00:00+0300", "2007-12-03T10:00:00+0300",
+                                            "2008-01-03T10:00:00+0300", "2009-05-03T10:00:00+0300",
+                                            "2008-01-03T10:00:00+0300", "2008-01-03T10:00:00+0300"]})
+        rates = get_rates(self.exchange, df['published_at'].str[:7], df['salary_currency'])
+        np.testing.assert_array_equal(rates, self.get_multipliers_by_apply(df))
+        np.testing.assert_array_equal(rates, [24.5, 1.0, np.nan, np.nan, 1.0, 24.6])
 
 
-df['salary'] = df[['salary_from', 'salary_to']].mean(axis=1)
+if __name__ == "__main__":
+    exchange = pd.read_csv("../exchange_data.csv")
 
-df2 = df.copy()
-currencies_set = set(currencies)
+    df = pd.read_csv("vacancies_dif_currencies.csv", encoding='utf-8')
+    df['salary'] = df[['salary_from', 'salary_to']].mean(axis=1)
 
-df2['salary'] = df2.apply(lambda x: x['salary'] \
-    if (x['salary_currency'] == 'RUR' or pd.isna(x['salary']) or x['salary_currency'] not in currencies_set) \
-    else (x['salary'] * get_multiplier(x['published_at'][:7], x['salary_currency'])), axis=1)
+    df2 = df.copy()
+    df2['salary'] = df2['salary'] * get_rates(exchange, df2['published_at'].str[:7], df2['salary_currency'])
 
-df2 = df2[['name', 'salary', 'area_name', 'published_at']]
-df2['salary'] = np.floor(df2['salary'])
+    df2 = df2[['name', 'salary', 'area_name', 'published_at']]
+    df2['salary'] = np.floor(df2['salary'])
 
-df2.to_csv('vacancies_dif_currencies_with_salary.csv', encoding='utf-8', index=False)
+    df2.to_csv('vacancies_dif_currencies_with_salary.csv', encoding='utf-8', index=False)
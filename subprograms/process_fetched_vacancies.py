@@ -1,29 +1,170 @@
-import pickle
-import pandas as pd
-# Данные за 09.12.2022
-# Сохранил их чтобы лишний раз не нагружать HH.ru
-with open('vacancies_hh.pickle', 'rb') as f:
-    vacancies = pickle.load(f)
-    formatted_vacancies = []
-    for vacancy in vacancies:
-        formatted_vacancy = {}
-        formatted_vacancy['name'] = vacancy.get('name')
-        if vacancy['salary'] is None:
-            formatted_vacancy['salary_from'] = None
-            formatted_vacancy['salary_to'] = None
-            formatted_vacancy['salary_currency'] = None
+import csv
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+field_names = ["name", "salary_from", "salary_to", "salary_currency", "area_name", "published_at"]
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Потоково читает элементы JSON массива, не загружая файл целиком.
+
+    Args:
+        f (io.TextIOBase): Файл, содержащий JSON массив
+        chunk_size (int): Размер блока чтения в символах
+
+    Yields:
+        object: Элемент массива
+
+    >>> import io
+    >>> list(iter_json_array(io.StringIO('[{"id": "1"}, {"id": "2"}]'), chunk_size=3))
+    [{'id': '1'}, {'id': '2'}]
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size).lstrip()
+    if not buffer.startswith("["):
+        raise ValueError("Ожидался JSON массив")
+    position = 1
+    eof = False
+    while True:
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ","):
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+            if end == len(buffer) and not eof:
+                raise json.JSONDecodeError("Элемент может продолжаться в следующем блоке", buffer, end)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item
+        position = end
+
+
+def iter_vacancies(file_name):
+    """Читает собранные вакансии по одной из JSONL файла или из JSON дампа списка вакансий.
+
+    Args:
+        file_name (str): Файл вакансий
+
+    Yields:
+        dict: Вакансия в формате API HH.ru
+    """
+    with open(file_name, mode="r", encoding="utf-8") as f:
+        first_char = f.read(1)
+        while first_char.isspace():
+            first_char = f.read(1)
+        f.seek(0)
+        if first_char == "[":
+            yield from iter_json_array(f)
         else:
-            formatted_vacancy['salary_from'] = vacancy['salary'].get('from')
-            formatted_vacancy['salary_to'] = vacancy['salary'].get('to')
-            formatted_vacancy['salary_currency'] = vacancy['salary'].get('currency')
-        formatted_vacancy['area_name'] = vacancy['area'].get('name')
-        formatted_vacancy['published_at'] = vacancy.get('published_at')
-        formatted_vacancies.append(formatted_vacancy)
-    
-    df = pd.DataFrame(formatted_vacancies)
-    
-    df.to_csv('vacancies_hh.csv', index=False, encoding='utf-8-sig')
-    
-
-        
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def format_number(value):
+    """Форматирует границу вилки так же, как pandas записывает колонку с пропусками: 25000 -> "25000.0".
+
+    >>> format_number(25000), format_number(None)
+    ('25000.0', '')
+    """
+    return "" if value is None else repr(float(value))
+
+
+def normalize_vacancy(vacancy):
+    """Переводит вакансию из формата API HH.ru в ряд таблицы с полями field_names.
+
+    Args:
+        vacancy (dict): Вакансия в формате API HH.ru
+
+    Returns:
+        list(str): Ряд таблицы
+
+    >>> normalize_vacancy({"name": "Повар", "salary": {"from": 25000, "to": None, "currency": "RUR"},
+    ...                    "area": {"name": "Москва"}, "published_at": "2022-12-09T15:00:27+0300"})
+    ['Повар', '25000.0', '', 'RUR', 'Москва', '2022-12-09T15:00:27+0300']
+    """
+    salary = vacancy.get("salary") or {}
+    area = vacancy.get("area") or {}
+    return [vacancy.get("name") or "",
+            format_number(salary.get("from")),
+            format_number(salary.get("to")),
+            salary.get("currency") or "",
+            area.get("name") or "",
+            vacancy.get("published_at") or ""]
+
+
+def vacancies_to_csv(file_name, csv_file_name):
+    """Потоково переводит собранные вакансии в csv: в памяти хранится только текущая вакансия.
+
+    Args:
+        file_name (str): JSONL файл или JSON дамп вакансий
+        csv_file_name (str): Название файла в формате "*****.csv"
+
+    Returns:
+        int: Количество записанных вакансий
+    """
+    count = 0
+    with open(csv_file_name, mode="w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(field_names)
+        for vacancy in iter_vacancies(file_name):
+            writer.writerow(normalize_vacancy(vacancy))
+            count += 1
+    return count
+
+
+class VacanciesToCsvTests(TestCase):
+    vacancies = [{"id": "1", "name": "Junior QA Engineer", "salary": {"from": 50000, "to": 60000, "currency": "RUR"},
+                  "area": {"name": "Санкт-Петербург"}, "published_at": "2022-12-09T12:11:17+0300"},
+                 {"id": "2", "name": "Ручной тестировщик, \"QA\"", "salary": None,
+                  "area": {"name": "Москва"}, "published_at": "2022-12-09T16:22:56+0300"}]
+    expected = ("\ufeffname,salary_from,salary_to,salary_currency,area_name,published_at\n"
+                "Junior QA Engineer,50000.0,60000.0,RUR,Санкт-Петербург,2022-12-09T12:11:17+0300\n"
+                "\"Ручной тестировщик, \"\"QA\"\"\",,,,Москва,2022-12-09T16:22:56+0300\n")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.csv_file_name = os.path.join(self.directory, "vacancies.csv")
+
+    def tearDown(self):
+        for file_name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, file_name))
+        os.rmdir(self.directory)
+
+    def convert(self, content):
+        file_name = os.path.join(self.directory, "vacancies.json")
+        with open(file_name, "w", encoding="utf-8") as f:
+            f.write(content)
+        vacancies_to_csv(file_name, self.csv_file_name)
+        with open(self.csv_file_name, encoding="utf-8", newline="") as f:
+            return f.read()
+
+    def test_json_dump(self):
+        self.assertEqual(self.convert(json.dumps(self.vacancies, ensure_ascii=False)), self.expected)
+
+    def test_jsonl(self):
+        self.assertEqual(self.convert("".join(json.dumps(vacancy, ensure_ascii=False) + "\n"
+                                              for vacancy in self.vacancies)), self.expected)
+
+    def test_json_array_small_chunks(self):
+        content = json.dumps(self.vacancies, ensure_ascii=False, indent=1)
+        with open(os.path.join(self.directory, "vacancies.json"), "w", encoding="utf-8") as f:
+            f.write(content)
+        with open(os.path.join(self.directory, "vacancies.json"), encoding="utf-8") as f:
+            self.assertEqual(list(iter_json_array(f, chunk_size=5)), self.vacancies)
+
 
+if __name__ == "__main__":
+    # Данные за 09.12.2022
+    # Сохранил их чтобы лишний раз не нагружать HH.ru
+    source = "vacancies_hh.jsonl" if os.path.exists("vacancies_hh.jsonl") else "vacancies_hh_json_dump.json"
+    vacancies_to_csv(source, "vacancies_hh.csv")
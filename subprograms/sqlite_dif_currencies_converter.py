@@ -1,35 +1,157 @@
 import pandas as pd
 import numpy as np
 import sqlite3
+import sys
+import time
+from unittest import TestCase
 
-conn = sqlite3.connect("../sqlite_database.db")
-cursor = conn.execute('select * from exchange_data')
-currencies = [description[0] for description in cursor.description]
-currencies.remove('date')
-currencies.append('RUR')
+try:
+    from subprograms.sqlite_vacancies_store import VacancyStore
+except ImportError:
+    from sqlite_vacancies_store import VacancyStore
 
-df = pd.read_csv("vacancies_dif_currencies.csv", encoding='utf-8')
 
+def get_multiplier(cursor, date, currency):
+    """Курс валюты за месяц отдельным запросом к SQLite (прежний способ, оставлен для сравнения).
 
-def get_multiplier(date, currency):
+    Args:
+        cursor (sqlite3.Cursor): Курсор базы данных
+        date (str): Месяц вида "2007-12"
+        currency (str): Валюта
+
+    Returns:
+        float: Курс валюты к рублю, NaN - курса за месяц нет
+    """
     if currency == 'RUR':
         return 1
     else:
-        res = cursor.execute("SELECT " + currency + ", date FROM exchange_data WHERE date=(?)", (date,)).fetchone()[0]
-        return res
+        res = cursor.execute("SELECT " + currency + ", date FROM exchange_data WHERE date=(?)", (date,)).fetchone()
+        if res is None or res[0] is None:
+            return np.nan
+        return res[0]
+
+
+def convert_with_queries(df, conn, currencies_set):
+    """Переводит зарплаты в рубли построчно, с запросом к SQLite на каждый ряд в иностранной валюте.
+
+    Args:
+        df (pd.DataFrame): Вакансии с колонками salary, salary_currency и published_at вида "2007-12"
+        conn (sqlite3.Connection): Соединение с базой данных
+        currencies_set (set(str)): Валюты, для которых есть курсы
+
+    Returns:
+        pd.Series: Зарплаты в рублях
+    """
+    cursor = conn.cursor()
+    return df.apply(lambda x: x['salary'] \
+        if (x['salary_currency'] == 'RUR' or pd.isna(x['salary']) or x['salary_currency'] not in currencies_set) \
+        else (x['salary'] * get_multiplier(cursor, x['published_at'], x['salary_currency'])), axis=1)
+
+
+def load_rates(conn):
+    """Загружает таблицу exchange_data одним запросом в словарь курсов по месяцу и валюте.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+
+    Returns:
+        pd.Series: Курсы с индексом (date, salary_currency)
+    """
+    exchange = pd.read_sql('select * from exchange_data', conn)
+    return exchange.melt(id_vars='date', var_name='salary_currency', value_name='rate') \
+        .set_index(['date', 'salary_currency'])['rate']
+
+
+def convert_with_lookup(df, rates, currencies_set):
+    """Переводит зарплаты в рубли по загруженным один раз курсам, без запросов на каждый ряд.
+    Зарплаты в рублях и в валютах без курса не изменяются, как и при построчном переводе;
+    для месяца без курса получается NaN.
+
+    Args:
+        df (pd.DataFrame): Вакансии с колонками salary, salary_currency и published_at вида "2007-12"
+        rates (pd.Series): Курсы с индексом (date, salary_currency), см. load_rates
+        currencies_set (set(str)): Валюты, для которых есть курсы
+
+    Returns:
+        pd.Series: Зарплаты в рублях
+    """
+    multipliers = rates.reindex(pd.MultiIndex.from_arrays([df['published_at'], df['salary_currency']])).to_numpy(dtype=float, copy=True)
+    unchanged = ((df['salary_currency'] == 'RUR') | ~df['salary_currency'].isin(currencies_set)).to_numpy()
+    multipliers[unchanged] = 1
+    return df['salary'] * multipliers
 
 
-df['salary'] = df[['salary_from', 'salary_to']].mean(axis=1)
+def benchmark(df, conn, currencies_set):
+    """Сравнивает построчный перевод с запросами к SQLite и перевод по загруженным курсам.
 
-df2 = df.copy()
-currencies_set = set(currencies)
-df2['published_at'] = df2['published_at'].str.slice(stop=7)
-df2['salary'] = df2.apply(lambda x: x['salary'] \
-    if (x['salary_currency'] == 'RUR' or pd.isna(x['salary']) or x['salary_currency'] not in currencies_set) \
-    else (x['salary'] * get_multiplier(x['published_at'], x['salary_currency'])), axis=1)
+    Args:
+        df (pd.DataFrame): Вакансии с колонками salary, salary_currency и published_at вида "2007-12"
+        conn (sqlite3.Connection): Соединение с базой данных
+        currencies_set (set(str)): Валюты, для которых есть курсы
+    """
+    start = time.time()
+    by_queries = convert_with_queries(df, conn, currencies_set)
+    queries_time = time.time() - start
 
-df2 = df2[['name', 'salary', 'area_name', 'published_at']]
-df2['salary'] = np.floor(df2['salary'])
+    start = time.time()
+    by_lookup = convert_with_lookup(df, load_rates(conn), currencies_set)
+    lookup_time = time.time() - start
+
+    print(f"Рядов: {len(df)}")
+    print(f"Запрос на каждый ряд: {queries_time}")
+    print(f"Курсы загружены один раз: {lookup_time}")
+    print(f"Результаты совпадают: {by_queries.equals(by_lookup)}")
+
+
+class ConvertTests(TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE exchange_data (date TEXT, USD REAL, EUR REAL)")
+        self.conn.executemany("INSERT INTO exchange_data VALUES (?, ?, ?)",
+                              [("2007-12", 24.5, 35.9), ("2008-01", 24.6, None)])
+        self.currencies_set = {"USD", "EUR", "RUR"}
+        self.df = pd.DataFrame({
+            "salary": [1000.0, 2000.0, 3000.0, np.nan, 4000.0, 5000.0, 6000.0],
+            "salary_currency": ["USD", "RUR", "EUR", "USD", "EUR", "USD", "KZT"],
+            "published_at": ["2007-12", "2007-12", "2007-12", "2008-01", "2008-01", "2009-05", "2007-12"],
+        })
+
+    def tearDown(self):
+        self.conn.close()
+
+    def test_lookup_equals_queries(self):
+        by_queries = convert_with_queries(self.df, self.conn, self.currencies_set)
+        by_lookup = convert_with_lookup(self.df, load_rates(self.conn), self.currencies_set)
+        pd.testing.assert_series_equal(by_queries, by_lookup, check_names=False)
+        self.assertEqual(by_lookup.fillna(-1).tolist(), [24500.0, 2000.0, 3000.0 * 35.9, -1, -1, -1, 6000.0])
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect("../sqlite_database.db")
+    cursor = conn.execute('select * from exchange_data')
+    currencies = [description[0] for description in cursor.description]
+    cursor.close()
+    currencies.remove('date')
+    currencies.append('RUR')
+
+    df = pd.read_csv("vacancies_dif_currencies.csv", encoding='utf-8')
+
+    df['salary'] = df[['salary_from', 'salary_to']].mean(axis=1)
+
+    df2 = df.copy()
+    currencies_set = set(currencies)
+    df2['published_at'] = df2['published_at'].str.slice(stop=7)
+
+    if "--benchmark" in sys.argv[1:]:
+        # Тест производительности: python sqlite_dif_currencies_converter.py --benchmark
+        benchmark(df2.head(100000), conn, currencies_set)
+        conn.close()
+    else:
+        df2['salary'] = convert_with_lookup(df2, load_rates(conn), currencies_set)
 
+        df2 = df2[['name', 'salary', 'area_name', 'published_at']]
+        df2['salary'] = np.floor(df2['salary'])
 
-df2.to_sql("vacancies_dif_currencies_salary", conn, if_exists='replace', index=False)
\ No newline at end of file
+        conn.close()
+        with VacancyStore("../sqlite_database.db", full_text_search=True, summary_tables=True) as store:
+            store.load_rows(df2.itertuples(index=False, name=None), replace=True)
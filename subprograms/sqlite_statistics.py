@@ -1,33 +1,266 @@
-
 import sqlite3
 import pandas as pd
 import os
-conn = sqlite3.connect(os.path.join(os.path.dirname(__file__), "..", "sqlite_database.db"))
-vacancy_name = input("Введите название вакансии: ")
-conn.execute('delete from vacancies_dif_currencies_salary where salary is null')
-vacancies_average_salary_by_year = pd.read_sql('select substr(published_at, 0, 5) as "year", round(avg(salary)) as "average_salary" from vacancies_dif_currencies_salary group by year', conn)
-vacancies_count_by_year = pd.read_sql('select substr(published_at, 0, 5) as "year", count(*) as "count" from vacancies_dif_currencies_salary group by year', conn)
-vacancies_count_by_year_selected_vacancy = pd.read_sql('select substr(published_at, 0, 5) as "year", count(*) as "count" from vacancies_dif_currencies_salary where name like "%'+vacancy_name+'%" group by year', conn)
-vacancies_average_salary_by_year_selected_vacancy = pd.read_sql('select substr(published_at, 0, 5) as "year", round(avg(salary)) as "average_salary" from vacancies_dif_currencies_salary where name like "%'+vacancy_name+'%" group by year', conn)
-number_of_vacancies = conn.execute('select count(*) from vacancies_dif_currencies_salary').fetchone()[0]
-one_percent_of_vacancies = number_of_vacancies // 100
-vacancies_fraction_by_city = pd.read_sql('select area_name, count(*)*1.0 / {}  as "fraction" from vacancies_dif_currencies_salary group by area_name order by fraction desc limit 10'.format(number_of_vacancies), conn)
-vacancies_top_average_salary_by_city = pd.read_sql('select area_name, round(avg(salary)) as "average_salary" from vacancies_dif_currencies_salary group by area_name having count(*) > {} order by average_salary desc limit 10'.format(one_percent_of_vacancies), conn)
-
-print("Динамика уровня зарплат по годам:")
-print(vacancies_average_salary_by_year.to_string(index=False))
-print("")
-print("Динамика количества вакансий по годам:")
-print(vacancies_count_by_year.to_string(index=False))
-print("")
-print("Динамика уровня зарплат по годам для выбранной профессии:")
-print(vacancies_average_salary_by_year_selected_vacancy.to_string(index=False))
-print("")
-print("Динамика количества вакансий по годам для выбранной профессии:")
-print(vacancies_count_by_year_selected_vacancy.to_string(index=False))
-print("")
-print("Уровень зарплат по городам (в порядке убывания):")
-print(vacancies_top_average_salary_by_city.to_string(index=False))
-print("")
-print("Доля вакансий по городам (в порядке убывания):")
-print(vacancies_fraction_by_city.to_string(index=False))
+import tempfile
+from unittest import TestCase
+
+try:
+    from subprograms.sqlite_vacancies_store import VacancyStore
+except ImportError:
+    from sqlite_vacancies_store import VacancyStore
+
+
+def get_like_pattern(vacancy_name):
+    """Возвращает шаблон LIKE для поиска подстроки, экранируя в названии символы %, _ и \\.
+
+    >>> get_like_pattern("C_%")
+    '%C\\\\_\\\\%%'
+    """
+    return "%" + vacancy_name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def get_fts_query(vacancy_name):
+    """Возвращает запрос MATCH, ищущий название целиком как одну фразу.
+
+    >>> get_fts_query('1С "Бухгалтерия" 8.3')
+    '"1С ""Бухгалтерия"" 8.3"'
+    """
+    return '"' + vacancy_name.replace('"', '""') + '"'
+
+
+def has_table(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def get_statistics_by_year(conn, vacancy_name, table="vacancies_dif_currencies_salary"):
+    """Собирает динамику по годам для всех вакансий и для выбранной профессии одним проходом по таблице
+    с помощью условной агрегации. Вакансии без зарплаты не учитываются, таблица не изменяется.
+
+    Если есть сводная таблица по годам (VacancyStore.create_summary_tables), динамика по всем вакансиям
+    берется из нее, и проход по таблице нужен только для выбранной профессии.
+
+    Если у таблицы есть полнотекстовый индекс по названиям (VacancyStore.create_name_index), а название
+    не короче 3 символов, динамика по профессии считается только по вакансиям, найденным индексом.
+    Триграммный индекс без учета регистра находит надмножество подходящих вакансий, поэтому найденные
+    названия дополнительно проверяются тем же LIKE, и результат совпадает с поиском подстроки без индекса.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        vacancy_name (str): Название профессии
+        table (str): Название таблицы вакансий (см. VacancyStore)
+
+    Returns:
+        pd.DataFrame: Колонки year, average_salary, count, average_salary_selected, count_selected
+    """
+    fts = VacancyStore.get_name_index_table(table)
+    summary_table = VacancyStore.get_summary_table(table, "year")
+    use_fts = len(vacancy_name) >= 3 and has_table(conn, fts)
+    use_summary = has_table(conn, summary_table)
+    pattern = get_like_pattern(vacancy_name)
+    if not use_fts and not use_summary:
+        return pd.read_sql(f'''SELECT CAST(year AS TEXT) AS "year",
+                round(avg(salary)) AS "average_salary",
+                count(*) AS "count",
+                round(avg(CASE WHEN name LIKE :pattern ESCAPE '\\' THEN salary END)) AS "average_salary_selected",
+                count(CASE WHEN name LIKE :pattern ESCAPE '\\' THEN 1 END) AS "count_selected"
+            FROM "{table}"
+            WHERE salary IS NOT NULL
+            GROUP BY year
+            ORDER BY year''', conn, params={"pattern": pattern})
+    if use_summary:
+        by_year = pd.read_sql(f'''SELECT CAST(year AS TEXT) AS "year",
+                round(salary_sum / count) AS "average_salary",
+                count AS "count"
+            FROM "{summary_table}"
+            ORDER BY year''', conn)
+    else:
+        by_year = pd.read_sql(f'''SELECT CAST(year AS TEXT) AS "year",
+                round(avg(salary)) AS "average_salary",
+                count(*) AS "count"
+            FROM "{table}"
+            WHERE salary IS NOT NULL
+            GROUP BY year
+            ORDER BY year''', conn)
+    if use_fts:
+        selected = pd.read_sql(f'''SELECT CAST(v.year AS TEXT) AS "year",
+                round(avg(v.salary)) AS "average_salary_selected",
+                count(*) AS "count_selected"
+            FROM "{fts}" JOIN "{table}" AS v ON v.id = "{fts}".rowid
+            WHERE "{fts}" MATCH :query AND v.name LIKE :pattern ESCAPE '\\' AND v.salary IS NOT NULL
+            GROUP BY v.year''', conn, params={"query": get_fts_query(vacancy_name), "pattern": pattern})
+    else:
+        selected = pd.read_sql(f'''SELECT CAST(year AS TEXT) AS "year",
+                round(avg(salary)) AS "average_salary_selected",
+                count(*) AS "count_selected"
+            FROM "{table}"
+            WHERE name LIKE :pattern ESCAPE '\\' AND salary IS NOT NULL
+            GROUP BY year''', conn, params={"pattern": pattern})
+    by_year = by_year.merge(selected, on="year", how="left")
+    by_year["count_selected"] = by_year["count_selected"].fillna(0).astype(int)
+    return by_year
+
+
+def get_statistics_by_city(conn, number_of_vacancies, table="vacancies_dif_currencies_salary"):
+    """Собирает топ-10 городов по доле вакансий и по уровню зарплат. Если есть сводная таблица по городам,
+    запросы читают ее, иначе - только покрывающий индекс (area_name, salary) по вакансиям с зарплатой.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        number_of_vacancies (int): Количество вакансий с зарплатой
+        table (str): Название таблицы вакансий (см. VacancyStore)
+
+    Returns:
+        vacancies_fraction_by_city (pd.DataFrame): Доля вакансий по городам
+        vacancies_top_average_salary_by_city (pd.DataFrame): Уровень зарплат по городам
+    """
+    summary_table = VacancyStore.get_summary_table(table, "city")
+    if has_table(conn, summary_table):
+        vacancies_fraction_by_city = pd.read_sql(
+            f'SELECT area_name, count * 1.0 / :total AS "fraction" FROM "{summary_table}" '
+            f'ORDER BY fraction DESC LIMIT 10', conn, params={"total": number_of_vacancies})
+        vacancies_top_average_salary_by_city = pd.read_sql(
+            f'SELECT area_name, round(salary_sum / count) AS "average_salary" FROM "{summary_table}" '
+            f'WHERE count > :one_percent ORDER BY average_salary DESC LIMIT 10', conn,
+            params={"one_percent": number_of_vacancies // 100})
+        return vacancies_fraction_by_city, vacancies_top_average_salary_by_city
+    vacancies_fraction_by_city = pd.read_sql(
+        f'SELECT area_name, count(*) * 1.0 / :total AS "fraction" FROM "{table}" WHERE salary IS NOT NULL '
+        f'GROUP BY area_name ORDER BY fraction DESC LIMIT 10', conn, params={"total": number_of_vacancies})
+    vacancies_top_average_salary_by_city = pd.read_sql(
+        f'SELECT area_name, round(avg(salary)) AS "average_salary" FROM "{table}" WHERE salary IS NOT NULL '
+        f'GROUP BY area_name HAVING count(*) > :one_percent ORDER BY average_salary DESC LIMIT 10', conn,
+        params={"one_percent": number_of_vacancies // 100})
+    return vacancies_fraction_by_city, vacancies_top_average_salary_by_city
+
+
+def get_statistics(conn, vacancy_name, table="vacancies_dif_currencies_salary"):
+    """Возвращает всю статистику по вакансиям.
+
+    Args:
+        conn (sqlite3.Connection): Соединение с базой данных
+        vacancy_name (str): Название профессии
+        table (str): Название таблицы вакансий (см. VacancyStore)
+
+    Returns:
+        dict(str, pd.DataFrame): Таблицы статистики по названиям
+    """
+    by_year = get_statistics_by_year(conn, vacancy_name, table)
+    selected = by_year[by_year["count_selected"] > 0]
+    vacancies_fraction_by_city, vacancies_top_average_salary_by_city = \
+        get_statistics_by_city(conn, int(by_year["count"].sum()), table)
+    return {
+        "vacancies_average_salary_by_year": by_year[["year", "average_salary"]],
+        "vacancies_count_by_year": by_year[["year", "count"]],
+        "vacancies_average_salary_by_year_selected_vacancy":
+            selected[["year", "average_salary_selected"]].rename(columns={"average_salary_selected": "average_salary"}),
+        "vacancies_count_by_year_selected_vacancy":
+            selected[["year", "count_selected"]].rename(columns={"count_selected": "count"}),
+        "vacancies_top_average_salary_by_city": vacancies_top_average_salary_by_city,
+        "vacancies_fraction_by_city": vacancies_fraction_by_city,
+    }
+
+
+def print_statistics(statistics):
+    print("Динамика уровня зарплат по годам:")
+    print(statistics["vacancies_average_salary_by_year"].to_string(index=False))
+    print("")
+    print("Динамика количества вакансий по годам:")
+    print(statistics["vacancies_count_by_year"].to_string(index=False))
+    print("")
+    print("Динамика уровня зарплат по годам для выбранной профессии:")
+    print(statistics["vacancies_average_salary_by_year_selected_vacancy"].to_string(index=False))
+    print("")
+    print("Динамика количества вакансий по годам для выбранной профессии:")
+    print(statistics["vacancies_count_by_year_selected_vacancy"].to_string(index=False))
+    print("")
+    print("Уровень зарплат по городам (в порядке убывания):")
+    print(statistics["vacancies_top_average_salary_by_city"].to_string(index=False))
+    print("")
+    print("Доля вакансий по городам (в порядке убывания):")
+    print(statistics["vacancies_fraction_by_city"].to_string(index=False))
+
+
+class SqliteStatisticsTests(TestCase):
+    rows = [("Аналитик", 15000.0, "Москва", "2007-12"),
+            ("Программист", 35000.0, "Казань", "2007-12"),
+            ("Повар", None, "Москва", "2008-01"),
+            ("аналитик_данных", 150.0, "Москва", "2008-01"),
+            ("Аналитик", 50000.0, "Пермь", "2008-02"),
+            ("Аналитик%", 100.0, "Пермь", "2009-02")]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = VacancyStore(os.path.join(self.directory, "test.db"))
+        self.store.load_rows(self.rows)
+
+    def tearDown(self):
+        self.store.close()
+        for file_name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, file_name))
+        os.rmdir(self.directory)
+
+    def test_single_scan_equals_separate_queries(self):
+        statistics = get_statistics(self.store.conn, "Аналитик")
+        self.assertEqual(statistics["vacancies_count_by_year"].values.tolist(), [["2007", 2], ["2008", 2], ["2009", 1]])
+        self.assertEqual(statistics["vacancies_count_by_year_selected_vacancy"].values.tolist(),
+                         [["2007", 1], ["2008", 1], ["2009", 1]])
+        self.assertEqual(statistics["vacancies_average_salary_by_year_selected_vacancy"].values.tolist(),
+                         [["2007", 15000.0], ["2008", 50000.0], ["2009", 100.0]])
+        self.assertEqual(self.store.conn.execute(
+            'SELECT count(*) FROM vacancies_dif_currencies_salary WHERE salary IS NULL').fetchone()[0], 1)
+
+    def test_wildcards_are_escaped(self):
+        statistics = get_statistics(self.store.conn, "_")
+        self.assertEqual(statistics["vacancies_count_by_year_selected_vacancy"].values.tolist(), [["2008", 1]])
+        statistics = get_statistics(self.store.conn, "%")
+        self.assertEqual(statistics["vacancies_count_by_year_selected_vacancy"].values.tolist(), [["2009", 1]])
+
+    def test_name_index_equals_like(self):
+        names = ["Аналитик", "аналитик", "Программист 1С", "SQL аналитик", "sql-разработчик", "Аналитик%", "C++"]
+        rows = [(names[i % len(names)], float(i), "Москва", f"{2003 + i % 5}-01") for i in range(200)]
+        self.store.load_rows(rows, replace=True)
+        for vacancy_name in ("Аналитик", "аналитик", "sql", "SQL", "1С", "C+", "к%", "alytics", "тик", "C++"):
+            without_index = get_statistics(self.store.conn, vacancy_name)
+            self.store.create_name_index()
+            with_index = get_statistics(self.store.conn, vacancy_name)
+            self.store.drop()
+            self.store.load_rows(rows)
+            for key in without_index:
+                self.assertTrue(without_index[key].reset_index(drop=True).equals(with_index[key].reset_index(drop=True)),
+                                (vacancy_name, key))
+
+    def test_summary_tables_equal_scan(self):
+        rows = [(["Аналитик", "Повар", "SQL аналитик"][i % 3], float(i * 100) if i % 4 else None,
+                 f"Город {i % 7}" if i % 7 else None, f"{2003 + i % 5}-01") for i in range(300)]
+        self.store.load_rows(rows, replace=True)
+        without_summary = get_statistics(self.store.conn, "Аналитик")
+        self.assertTrue(without_summary["vacancies_fraction_by_city"]["area_name"].isna().any())
+        self.store.create_summary_tables()
+        with_summary = get_statistics(self.store.conn, "Аналитик")
+        for key in without_summary:
+            self.assertTrue(without_summary[key].reset_index(drop=True).equals(with_summary[key].reset_index(drop=True)),
+                            key)
+
+    def test_name_index_is_used(self):
+        self.store.create_name_index()
+        plan = self.store.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT v.year FROM vacancies_dif_currencies_salary_name_fts '
+            'JOIN vacancies_dif_currencies_salary AS v ON v.id = vacancies_dif_currencies_salary_name_fts.rowid '
+            'WHERE vacancies_dif_currencies_salary_name_fts MATCH \'"Аналитик"\'').fetchall()
+        self.assertIn("VIRTUAL TABLE INDEX", str(plan))
+
+    def test_city_queries_use_covering_index(self):
+        plan = self.store.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT area_name, round(avg(salary)) FROM vacancies_dif_currencies_salary '
+            'WHERE salary IS NOT NULL GROUP BY area_name').fetchall()
+        self.assertIn("COVERING INDEX", str(plan))
+
+    def test_fraction_by_city(self):
+        fraction = get_statistics(self.store.conn, "Аналитик")["vacancies_fraction_by_city"]
+        self.assertEqual(fraction.values.tolist()[0], ["Москва", 0.4])
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(os.path.join(os.path.dirname(__file__), "..", "sqlite_database.db"))
+    vacancy_name = input("Введите название вакансии: ")
+    print_statistics(get_statistics(conn, vacancy_name))
@@ -0,0 +1,337 @@
+import csv
+import os
+import sqlite3
+import tempfile
+from itertools import islice
+from unittest import TestCase
+
+
+class VacancyStore:
+    """Хранилище вакансий с зарплатой в рублях в SQLite. Год и месяц публикации хранятся
+    в вычисляемых колонках, по году и городу построены индексы. Частичный индекс (area_name, salary)
+    по вакансиям с зарплатой покрывает запросы статистики по городам.
+
+    По желанию над названиями вакансий строится полнотекстовый индекс FTS5 с триграммным токенизатором
+    "*****_name_fts". Он хранит только индекс (external content) и синхронизируется с таблицей триггерами.
+
+    Также по желанию создаются сводные таблицы "*****_by_year", "*****_by_city" и "*****_by_year_city"
+    с количеством вакансий с зарплатой и суммой зарплат. Они пересчитываются триггерами при каждой вставке,
+    удалении и изменении вакансии, поэтому статистика по годам и городам не требует прохода по вакансиям.
+
+    Attributes:
+        database (str): Путь к базе данных
+        table (str): Название таблицы вакансий
+        full_text_search (bool): Строить полнотекстовый индекс по названиям при загрузке
+        summary_tables (bool): Создавать сводные таблицы при загрузке
+        conn (sqlite3.Connection): Соединение с базой данных
+    """
+    columns = ("name", "salary", "area_name", "published_at")
+    summaries = {"year": ("year",), "city": ("area_name",), "year_city": ("year", "area_name")}
+    pragmas = {"journal_mode": "WAL", "synchronous": "NORMAL", "temp_store": "MEMORY",
+               "cache_size": -65536, "mmap_size": 1 << 28}
+
+    def __init__(self, database, table="vacancies_dif_currencies_salary", full_text_search=False,
+                 summary_tables=False):
+        """Открывает базу данных и настраивает соединение.
+
+        Args:
+            database (str): Путь к базе данных
+            table (str): Название таблицы вакансий
+            full_text_search (bool): Строить полнотекстовый индекс по названиям при загрузке
+            summary_tables (bool): Создавать сводные таблицы при загрузке
+        """
+        self.database = database
+        self.table = table
+        self.full_text_search = full_text_search
+        self.summary_tables = summary_tables
+        self.conn = sqlite3.connect(database)
+        for pragma, value in self.pragmas.items():
+            self.conn.execute(f"PRAGMA {pragma} = {value}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def exists(self, table=None):
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                 (table or self.table,)).fetchone() is not None
+
+    @staticmethod
+    def get_name_index_table(table):
+        return f"{table}_name_fts"
+
+    @staticmethod
+    def get_summary_table(table, summary):
+        """Возвращает название сводной таблицы.
+
+        Args:
+            table (str): Название таблицы вакансий
+            summary (str): Группировка из VacancyStore.summaries: "year", "city" или "year_city"
+
+        Returns:
+            str: Название сводной таблицы
+        """
+        return f"{table}_by_{summary}"
+
+    def create_table(self):
+        """Создает таблицу вакансий. published_at хранится как есть ("2007-12" или полная дата),
+        year и month вычисляются из него при вставке."""
+        self.conn.execute(f'''CREATE TABLE IF NOT EXISTS "{self.table}" (
+            id INTEGER PRIMARY KEY,
+            name TEXT,
+            salary REAL,
+            area_name TEXT,
+            published_at TEXT NOT NULL,
+            year INTEGER GENERATED ALWAYS AS (CAST(substr(published_at, 1, 4) AS INTEGER)) STORED,
+            month INTEGER GENERATED ALWAYS AS (CAST(substr(published_at, 6, 2) AS INTEGER)) STORED
+        )''')
+
+    def create_indexes(self):
+        with self.conn:
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_year" ON "{self.table}" (year)')
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_area_name" ON "{self.table}" (area_name)')
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_year_area_name" '
+                              f'ON "{self.table}" (year, area_name)')
+            self.conn.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}_area_name_salary" '
+                              f'ON "{self.table}" (area_name, salary) WHERE salary IS NOT NULL')
+
+    def create_name_index(self):
+        """Создает полнотекстовый индекс по названиям вакансий и триггеры, поддерживающие его
+        при вставке, удалении и изменении названий. Уже загруженные вакансии индексируются сразу."""
+        fts = self.get_name_index_table(self.table)
+        if self.exists(fts):
+            return
+        with self.conn:
+            self.conn.execute(f'CREATE VIRTUAL TABLE "{fts}" USING fts5(name, content="{self.table}", '
+                              f'content_rowid="id", tokenize="trigram")')
+            self.conn.execute(f'CREATE TRIGGER "{fts}_insert" AFTER INSERT ON "{self.table}" BEGIN '
+                              f'INSERT INTO "{fts}" (rowid, name) VALUES (new.id, new.name); END')
+            self.conn.execute(f'CREATE TRIGGER "{fts}_delete" AFTER DELETE ON "{self.table}" BEGIN '
+                              f'INSERT INTO "{fts}" ("{fts}", rowid, name) VALUES (\'delete\', old.id, old.name); END')
+            self.conn.execute(f'CREATE TRIGGER "{fts}_update" AFTER UPDATE OF name ON "{self.table}" BEGIN '
+                              f'INSERT INTO "{fts}" ("{fts}", rowid, name) VALUES (\'delete\', old.id, old.name); '
+                              f'INSERT INTO "{fts}" (rowid, name) VALUES (new.id, new.name); END')
+            self.conn.execute(f'INSERT INTO "{fts}" ("{fts}") VALUES (\'rebuild\')')
+
+    def get_summary_statements(self, summary, row):
+        """Возвращает SQL, который добавляет вакансию в сводную таблицу или убирает ее оттуда.
+
+        Args:
+            summary (str): Группировка из VacancyStore.summaries
+            row (str): "new" - добавить новую версию ряда, "old" - убрать старую
+
+        Returns:
+            str: Выражения SQL для тела триггера
+        """
+        summary_table = self.get_summary_table(self.table, summary)
+        keys = self.summaries[summary]
+        condition = " AND ".join(f"{key} IS {row}.{key}" for key in keys)
+        if row == "new":
+            return (f'UPDATE "{summary_table}" SET count = count + 1, salary_sum = salary_sum + new.salary '
+                    f'WHERE {condition} AND new.salary IS NOT NULL; '
+                    f'INSERT INTO "{summary_table}" ({", ".join(keys)}, count, salary_sum) '
+                    f'SELECT {", ".join(f"new.{key}" for key in keys)}, 1, new.salary '
+                    f'WHERE new.salary IS NOT NULL AND NOT EXISTS (SELECT 1 FROM "{summary_table}" WHERE {condition}); ')
+        return (f'UPDATE "{summary_table}" SET count = count - 1, salary_sum = salary_sum - old.salary '
+                f'WHERE {condition} AND old.salary IS NOT NULL; '
+                f'DELETE FROM "{summary_table}" WHERE {condition} AND count = 0; ')
+
+    def create_summary_tables(self):
+        """Создает сводные таблицы по годам, городам и парам (год, город), заполняет их по уже загруженным
+        вакансиям и создает триггеры, которые поддерживают их при изменении вакансий. Город без названия (NULL)
+        остается отдельной группой NULL, как и в GROUP BY по таблице вакансий, поэтому ключи сравниваются через IS."""
+        if self.exists(self.get_summary_table(self.table, "year")):
+            return
+        with self.conn:
+            for summary, keys in self.summaries.items():
+                summary_table = self.get_summary_table(self.table, summary)
+                columns = ", ".join("year INTEGER NOT NULL" if key == "year" else "area_name TEXT" for key in keys)
+                self.conn.execute(f'CREATE TABLE "{summary_table}" ({columns}, count INTEGER NOT NULL, '
+                                  f'salary_sum REAL NOT NULL)')
+                self.conn.execute(f'CREATE UNIQUE INDEX "{summary_table}_key" ON "{summary_table}" ({", ".join(keys)})')
+                self.conn.execute(f'INSERT INTO "{summary_table}" ({", ".join(keys)}, count, salary_sum) '
+                                  f'SELECT {", ".join(keys)}, count(*), sum(salary) FROM "{self.table}" '
+                                  f'WHERE salary IS NOT NULL GROUP BY {", ".join(keys)}')
+            insert = "".join(self.get_summary_statements(summary, "new") for summary in self.summaries)
+            delete = "".join(self.get_summary_statements(summary, "old") for summary in self.summaries)
+            self.conn.execute(f'CREATE TRIGGER "{self.table}_summary_insert" AFTER INSERT ON "{self.table}" '
+                              f'BEGIN {insert}END')
+            self.conn.execute(f'CREATE TRIGGER "{self.table}_summary_delete" AFTER DELETE ON "{self.table}" '
+                              f'BEGIN {delete}END')
+            self.conn.execute(f'CREATE TRIGGER "{self.table}_summary_update" AFTER UPDATE OF salary, area_name, '
+                              f'published_at ON "{self.table}" BEGIN {delete}{insert}END')
+
+    def drop(self):
+        with self.conn:
+            self.conn.execute(f'DROP TABLE IF EXISTS "{self.table}"')
+            self.conn.execute(f'DROP TABLE IF EXISTS "{self.get_name_index_table(self.table)}"')
+            for summary in self.summaries:
+                self.conn.execute(f'DROP TABLE IF EXISTS "{self.get_summary_table(self.table, summary)}"')
+
+    @staticmethod
+    def normalize_row(row):
+        """Приводит ряд (name, salary, area_name, published_at) к типам таблицы: пустая или NaN зарплата - NULL.
+
+        >>> VacancyStore.normalize_row(("Повар", "25000.0", "Москва", "2007-12"))
+        ('Повар', 25000.0, 'Москва', '2007-12')
+        >>> VacancyStore.normalize_row(("Повар", float("nan"), "Москва", "2007-12"))[1] is None
+        True
+        """
+        name, salary, area_name, published_at = row
+        salary = float(salary) if salary is not None and salary != "" else None
+        return name, salary if salary == salary else None, area_name, published_at
+
+    def insert_rows(self, rows, batch_size=100000):
+        """Потоково вставляет ряды пачками, каждая пачка - одна транзакция executemany.
+
+        Args:
+            rows (iterable(tuple)): Ряды (name, salary, area_name, published_at)
+            batch_size (int): Количество рядов в транзакции
+
+        Returns:
+            int: Количество вставленных рядов
+        """
+        rows = map(self.normalize_row, rows)
+        query = f'INSERT INTO "{self.table}" ({", ".join(self.columns)}) VALUES (?, ?, ?, ?)'
+        count = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return count
+            with self.conn:
+                self.conn.executemany(query, batch)
+            count += len(batch)
+
+    def load_rows(self, rows, replace=False, batch_size=100000):
+        """Загружает ряды в таблицу. Для новой таблицы индексы строятся после загрузки,
+        для существующей - поддерживаются при вставке. Полнотекстовый индекс и сводные таблицы тоже.
+
+        Args:
+            rows (iterable(tuple)): Ряды (name, salary, area_name, published_at)
+            replace (bool): Пересоздать таблицу
+            batch_size (int): Количество рядов в транзакции
+
+        Returns:
+            int: Количество загруженных рядов
+        """
+        if replace:
+            self.drop()
+        self.create_table()
+        count = self.insert_rows(rows, batch_size)
+        self.create_indexes()
+        if self.full_text_search:
+            self.create_name_index()
+        if self.summary_tables:
+            self.create_summary_tables()
+        return count
+
+    def load_csv(self, file_name, replace=False, batch_size=100000):
+        """Потоково загружает csv файл с колонками name, salary, area_name, published_at.
+
+        Args:
+            file_name (str): Название файла в формате "*****.csv"
+            replace (bool): Пересоздать таблицу
+            batch_size (int): Количество рядов в транзакции
+
+        Returns:
+            int: Количество загруженных рядов
+        """
+        with open(file_name, mode="r", encoding="utf-8-sig", newline="") as f:
+            reader = csv.DictReader(f)
+            return self.load_rows((tuple(row[column] for column in self.columns) for row in reader),
+                                  replace, batch_size)
+
+
+class VacancyStoreTests(TestCase):
+    rows = [("Аналитик", 15000.0, "Москва", "2007-12"),
+            ("Программист", None, "Казань", "2007-12"),
+            ("Аналитик", "50000", "Пермь", "2008-02-03T17:47:55+0300")]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = VacancyStore(os.path.join(self.directory, "test.db"), "vacancies")
+
+    def tearDown(self):
+        self.store.close()
+        for file_name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, file_name))
+        os.rmdir(self.directory)
+
+    def test_year_and_month(self):
+        self.assertEqual(self.store.load_rows(self.rows, batch_size=2), 3)
+        self.assertEqual(self.store.conn.execute("SELECT year, month, salary FROM vacancies ORDER BY id").fetchall(),
+                         [(2007, 12, 15000.0), (2007, 12, None), (2008, 2, 50000.0)])
+
+    def test_indexes(self):
+        self.store.load_rows(self.rows)
+        indexes = {row[1] for row in self.store.conn.execute("PRAGMA index_list(vacancies)")}
+        self.assertEqual(indexes, {"vacancies_year", "vacancies_area_name", "vacancies_year_area_name",
+                                   "vacancies_area_name_salary"})
+        plan = self.store.conn.execute("EXPLAIN QUERY PLAN SELECT count(*) FROM vacancies "
+                                       "WHERE year = 2007 AND area_name = 'Москва'").fetchall()
+        self.assertIn("vacancies_year_area_name", str(plan))
+
+    def test_wal(self):
+        self.assertEqual(self.store.conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_replace_and_append(self):
+        self.store.load_rows(self.rows)
+        self.store.load_rows(self.rows)
+        self.assertEqual(self.store.conn.execute("SELECT count(*) FROM vacancies").fetchone()[0], 6)
+        self.store.load_rows(self.rows[:1], replace=True)
+        self.assertEqual(self.store.conn.execute("SELECT count(*) FROM vacancies").fetchone()[0], 1)
+
+    def test_name_index_is_synchronized(self):
+        self.store.full_text_search = True
+        self.store.load_rows(self.rows)
+        self.store.load_rows([("Повар", 100.0, "Москва", "2009-01")])
+        with self.store.conn:
+            self.store.conn.execute("DELETE FROM vacancies WHERE name = 'Программист'")
+            self.store.conn.execute("UPDATE vacancies SET name = 'Аналитик данных' WHERE id = 1")
+        self.assertEqual(self.store.conn.execute("SELECT rowid FROM vacancies_name_fts "
+                                                 "WHERE vacancies_name_fts MATCH '\"налит\"' ORDER BY rowid").fetchall(),
+                         [(1,), (3,)])
+        self.assertEqual(self.store.conn.execute("SELECT rowid FROM vacancies_name_fts "
+                                                 "WHERE vacancies_name_fts MATCH '\"данных\"'").fetchall(), [(1,)])
+        self.assertEqual(self.store.conn.execute("SELECT rowid FROM vacancies_name_fts "
+                                                 "WHERE vacancies_name_fts MATCH '\"повар\"'").fetchall(), [(4,)])
+        self.assertEqual(self.store.conn.execute("SELECT count(*) FROM vacancies_name_fts "
+                                                 "WHERE vacancies_name_fts MATCH '\"Программист\"'").fetchone(), (0,))
+        self.store.conn.execute("INSERT INTO vacancies_name_fts (vacancies_name_fts) VALUES ('integrity-check')")
+
+    def get_summary(self, summary):
+        return self.store.conn.execute(f"SELECT * FROM vacancies_by_{summary} ORDER BY 1, 2").fetchall()
+
+    def get_grouped(self, keys):
+        return self.store.conn.execute(f"SELECT {keys}, count(*), sum(salary) FROM vacancies "
+                                       f"WHERE salary IS NOT NULL GROUP BY {keys} ORDER BY 1, 2").fetchall()
+
+    def test_summary_tables(self):
+        self.store.summary_tables = True
+        self.store.load_rows(self.rows)
+        self.store.load_rows([("Повар", 100.0, "Москва", "2007-01"), ("Повар", 200.0, "Пермь", "2009-01"),
+                              ("Повар", 10.0, None, "2009-01"), ("Повар", 20.0, None, "2009-01")])
+        with self.store.conn:
+            self.store.conn.execute("DELETE FROM vacancies WHERE id = 1")
+            self.store.conn.execute("UPDATE vacancies SET salary = 300 WHERE id = 2")
+            self.store.conn.execute("UPDATE vacancies SET published_at = '2010-01' WHERE id = 3")
+            self.store.conn.execute("UPDATE vacancies SET area_name = 'Москва' WHERE id = 5")
+            self.store.conn.execute("UPDATE vacancies SET salary = 30 WHERE area_name IS NULL AND salary = 10")
+        self.assertEqual(self.get_summary("year"), self.get_grouped("year"))
+        self.assertEqual(self.get_summary("city"), self.get_grouped("area_name"))
+        self.assertEqual(self.get_summary("year_city"), self.get_grouped("year, area_name"))
+        self.assertEqual(self.get_summary("year"), [(2007, 2, 400.0), (2009, 3, 250.0), (2010, 1, 50000.0)])
+        self.assertEqual(self.get_summary("city")[0], (None, 2, 50.0))
+
+    def test_load_csv(self):
+        file_name = os.path.join(self.directory, "vacancies.csv")
+        with open(file_name, "w", encoding="utf-8-sig") as f:
+            f.write("name,salary,area_name,published_at\nАналитик,,Москва,2007-12\n\"Аналитик, 1С\",100.0,Пермь,2008-01\n")
+        self.store.load_csv(file_name)
+        self.assertEqual(self.store.conn.execute("SELECT name, salary, year FROM vacancies ORDER BY id").fetchall(),
+                         [("Аналитик", None, 2007), ("Аналитик, 1С", 100.0, 2008)])
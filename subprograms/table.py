@@ -1,24 +1,131 @@
+import contextlib
 import csv
+import heapq
+import io
+import os
 import re
+import tempfile
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping
 from datetime import datetime
 from math import floor
+from unittest import TestCase
+
 from prettytable import PrettyTable, ALL
 
+html_regex = re.compile(r'<[^>]+>')
+
+class VacancyRow(Mapping):
+    """Словарь вакансии, который хранит ряд csv в исходном виде. Поле очищается от HTML и лишних пробелов
+    при первом обращении к нему (фильтрация, сортировка, вывод), очищенное значение запоминается.
+
+    Attributes:
+        row (list(str)): Ряд csv
+        positions (dict(str, int)): Номера доступных полей в ряду по названиям полей
+        cells (dict): Очищенные значения полей
+    """
+    __slots__ = ("row", "positions", "cells")
+
+    def __init__(self, row, positions):
+        """Инициализирует словарь вакансии.
+
+        Args:
+            row (list(str)): Ряд csv
+            positions (dict(str, int)): Номера доступных полей в ряду по названиям полей, общий для всех рядов
+        """
+        self.row = row
+        self.positions = positions
+        self.cells = {}
+
+    def __getitem__(self, field_name):
+        try:
+            return self.cells[field_name]
+        except KeyError:
+            value = self.clean_field(field_name, self.row[self.positions[field_name]])
+            self.cells[field_name] = value
+            return value
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, field_name):
+        return field_name in self.positions
+
+    @staticmethod
+    def remove_html(string):
+        """Убирает html из строки.
+
+        Args:
+             string(str): Строка
+
+        Returns:
+            string: Строка, очищенная от HTML символов
+        """
+        return html_regex.sub('', string)
+
+    @staticmethod
+    def repair_string(s):
+        """Убирает из строки лишние пробелы и HTML символы.
+
+        Args:
+            s (str): Строка
+
+        Returns:
+            string: Строка, без лишних пробелов и HTML символов
+        """
+        s = VacancyRow.remove_html(s)
+        s = s.strip()
+        s = " ".join(s.split())
+        return s
+
+    @staticmethod
+    def clean_field(field_name, field_string_data):
+        """Очищает значение поля вакансии.
+
+        Args:
+            field_name (str): Название поля
+            field_string_data (str): Значение поля из csv
+
+        Returns:
+            str or list(str): Очищенное значение, для key_skills - список навыков
+        """
+        if field_name == "key_skills":
+            field_string_data = field_string_data.splitlines()
+            for j in range(len(field_string_data)):
+                field_string_data[j] = VacancyRow.repair_string(field_string_data[j])
+                field_string_data[j] = field_string_data[j].replace("True", "Да").replace("False", "Нет")
+        else:
+            field_string_data = VacancyRow.repair_string(field_string_data)
+            if field_name != "description":
+                field_string_data = field_string_data.replace("True", "Да").replace("False", "Нет")
+        return field_string_data
+
+
 class DataSet:
     """ Класс для обработки входных данных в формате CSV.
 
     Attributes:
         file_name (str): Название файла в формате "*****.csv"
-        vacancies_objects (list): Список вакансий в виде объектов обработанных csv парсером.
+        vacancies_dicts (list(VacancyRow)): Список словарей вакансий
+        sort_keys (dict(str, dict(int))): Вычисленные ключи сортировки по параметрам сортировки и индексам вакансий
+        filtered_indexes (dict(str, list(int))): Индексы вакансий, подходящих под строку фильтрации
+        hash_indexes (dict(str, dict)): Индексы вакансий по значениям поля, для key_skills - по навыкам
+        sorted_indexes (dict(str, tuple(list, list(int)))): Ключи по возрастанию и индексы вакансий с этими ключами
     """
-    def universal_csv_parser(self, file_name):
+    def universal_csv_parser(self, file_name, columns=None, condition=None, condition_columns=()):
         """Парсер csv файла.
 
         Args:
             file_name (str): Название файла в формате "*****.csv"
+            columns (set(str)): Поля, которые нужно очистить и сохранить, по умолчанию - все поля
+            condition (function): Условие фильтрации словаря вакансии, None - сохранить все вакансии
+            condition_columns (set(str)): Поля, которые читает condition
 
         Returns:
-            list(dict) : Список словарей вакансий
+            list(VacancyRow) : Список словарей вакансий, поля которых очищаются при первом обращении
         """
         def csv_reader(file_name):
             """Обработчик csv данных.
@@ -57,152 +164,82 @@ class DataSet:
         naming = reader_data[0]
         fields = reader_data[1]
 
-        def remove_html(string):
-            """Убирает html из строки.
-
-            Args:
-                 string(str): Строка
-
-            Returns:
-                string: Строка, очищенная от HTML символов
-            """
-            regex = re.compile(r'<[^>]+>')
-            return regex.sub('', string)
-
-        def repair_string(s):
-            """Убирает из строки лишние пробелы и HTML символы.
-
-            Args:
-                s (str): Строка
-
-            Returns:
-                string: Строка, без лишних пробелов и HTML символов
-            """
-            s = remove_html(s)
-            s = s.strip()
-            s = " ".join(s.split())
-            return s
-
-        def csv_filer(reader, list_naming):
-            """Заполняет словарь вакансии, ключами которого являются названия входных полей.
-
-            Args:
-                list_naming (list(str)) : Список полей вакансии, полученный из заголовка таблицы
-                reader (list(list(str))) : Список данных
+        positions = {field_name: i for i, field_name in enumerate(naming)
+                     if columns is None or field_name in columns or field_name in condition_columns}
+        vacancy_dictionary_list = [VacancyRow(field, positions) for field in fields]
+        if condition is not None:
+            vacancy_dictionary_list = [d for d in vacancy_dictionary_list if condition(d)]
+        return vacancy_dictionary_list
 
-            Returns:
-                list(dict): Список словарей с ключами-заголовками list_naming и соответствующими им полями вакансии
-            """
-            vacancy_dictionary_list = []
-            for field in reader:
-                d = dict()
-                for i in range(len(list_naming)):
-                    field_name = list_naming[i]
-                    field_string_data = field[i]
-                    if field_name == "key_skills":
-                        field_string_data = field_string_data.splitlines()
-                        for j in range(len(field_string_data)):
-                            field_string_data[j] = repair_string(field_string_data[j])
-                            if list_naming[i] != "description":
-                                field_string_data[j] = field_string_data[j].replace("True", "Да").replace("False",
-                                                                                                          "Нет")
-                    else:
-                        field_string_data = repair_string(field_string_data)
-                        if list_naming[i] != "description":
-                            field_string_data = field_string_data.replace("True", "Да").replace("False", "Нет")
-                    d[field_name] = field_string_data
-                vacancy_dictionary_list.append(d)
-            return vacancy_dictionary_list
-
-        return csv_filer(fields, naming)
-
-    def __init__(self, file_name):
+    def __init__(self, file_name, columns=None, condition=None, condition_columns=()):
         """Инициализирует Dataset, выполняет парсинг CSV файла
 
         Args:
             file_name (str): Название файла в формате "*****.csv"
+            columns (set(str)): Поля, которые нужны запросу. Остальные поля только проверяются на пустоту
+                                и недоступны в словарях вакансий.
+            condition (function): Условие фильтрации словаря вакансии, вакансии, не подходящие под него,
+                                  не сохраняются
+            condition_columns (set(str)): Поля, которые читает condition
         """
         self.file_name = file_name
-        self.vacancies_dicts = self.universal_csv_parser(file_name)
-        if isinstance(self.vacancies_dicts, list):
-            self.vacancies_objects = [Vacancy(d) for d in self.vacancies_dicts]
+        self.vacancies_dicts = self.universal_csv_parser(file_name, columns, condition, condition_columns)
+        self.sort_keys = {}
+        self.filtered_indexes = {}
+        self.hash_indexes = {}
+        self.sorted_indexes = {}
 
-
-class Salary:
-    """Класс для представления зарплаты.
-
-    Attributes:
-        salary_from (int or float or str): Нижняя граница вилки оклада
-        salary_to (int or float or str): Верхняя граница вилки оклада
-        salary_currency (str): Валюта оклада
-        currency_to_rub (dict): Словарь конвертации валюты
-        rub_salary (float): Средняя зарплата (float), переведенная в рубли с помощью словаря currency_to_rub
-    """
-    currency_to_rub = {
-        "AZN": 35.68,
-        "BYR": 23.91,
-        "EUR": 59.90,
-        "GEL": 21.74,
-        "KGS": 0.76,
-        "KZT": 0.13,
-        "RUR": 1,
-        "UAH": 1.64,
-        "USD": 60.66,
-        "UZS": 0.0055,
-    }
-
-    def __init__(self, vacancy_dictionary):
-        """Инициализирует объект Salary, выполняет конвертацию для целочисленных полей.
+    def get_sort_keys(self, sortby, key, indexes):
+        """Возвращает ключи сортировки вакансий. Ключ каждой вакансии вычисляется один раз для набора данных
+        и только тогда, когда вакансия впервые попадает в сортируемую выборку.
 
         Args:
-            vacancy_dictionary (dict(str)) : Словарь вакансии, включающий в себя пары ключ-значения зарплаты
-        """
-        self.salary_from = vacancy_dictionary["salary_from"]
-        self.salary_to = vacancy_dictionary["salary_to"]
-        self.salary_gross = vacancy_dictionary["salary_gross"].replace("Нет", "False").replace("Да", "True")
-        self.salary_currency = vacancy_dictionary["salary_currency"]
-
-    @property
-    def rub_salary(self):
-        """Вычисляет среднюю зарплату и переводит в рубли, при помощи словаря currency_to_rub.
+            sortby (str): Параметр сортировки
+            key (function): Ключ сортировки словаря вакансии
+            indexes (list(int)): Индексы сортируемых вакансий
 
         Returns:
-            float: Средняя зарплата в рублях
+            dict(int): Ключи сортировки по индексам вакансий, включая все indexes
         """
-        return floor((float(self.salary_from) * self.currency_to_rub[self.salary_currency]
-                      + float(self.salary_to) * self.currency_to_rub[self.salary_currency])
-                     / 2)
+        keys = self.sort_keys.setdefault(sortby, {})
+        for i in indexes:
+            if i not in keys:
+                keys[i] = key(self.vacancies_dicts[i])
+        return keys
 
+    def get_hash_index(self, field_name):
+        """Возвращает хэш-индекс поля, строит его при первом обращении.
 
-class Vacancy:
-    """Класс для хранения данных о вакансии.
+        Args:
+            field_name (str): Поле вакансии
 
-    Attributes:
-        name (str): Название вакансии
-        description (str): Описание вакансии
-        key_skills (str): Навыки
-        experience_id (str): Опыт работы
-        premium (str): Премиум вакансия
-        employer_name (str): Компания
-        salary (float): Зарплата в рублях
-        area_name (str): Город
-        published_at (str): Дата публикации вакансии
-    """
-    def __init__(self, vacancy_dictionary):
-        """Иницилиазирует объект Vacancy из словаря vacancy_dictionary.
+        Returns:
+            dict(object, list(int)): Индексы вакансий по значениям поля, для key_skills - по навыкам
+        """
+        if field_name not in self.hash_indexes:
+            index = {}
+            for i, d in enumerate(self.vacancies_dicts):
+                values = d[field_name] if field_name == "key_skills" else (d[field_name],)
+                for value in values:
+                    index.setdefault(value, []).append(i)
+            self.hash_indexes[field_name] = index
+        return self.hash_indexes[field_name]
+
+    def get_sorted_index(self, name, key):
+        """Возвращает отсортированный индекс для бинарного поиска, строит его при первом обращении.
 
         Args:
-            vacancy_dictionary (dict): Словарь с исходными данными о вакансии
+            name (str): Название индекса
+            key (function): Ключ словаря вакансии
+
+        Returns:
+            keys (list): Ключи вакансий по возрастанию
+            indexes (list(int)): Индексы вакансий в порядке keys
         """
-        self.name = vacancy_dictionary["name"]
-        self.description = vacancy_dictionary["description"]
-        self.key_skills = vacancy_dictionary["key_skills"]
-        self.experience_id = vacancy_dictionary["experience_id"]
-        self.premium = vacancy_dictionary["premium"].replace("Нет", "False").replace("Да", "True")
-        self.employer_name = vacancy_dictionary["employer_name"]
-        self.salary = Salary(vacancy_dictionary)
-        self.area_name = vacancy_dictionary["area_name"]
-        self.published_at = vacancy_dictionary["published_at"]
+        if name not in self.sorted_indexes:
+            pairs = sorted((key(d), i) for i, d in enumerate(self.vacancies_dicts))
+            self.sorted_indexes[name] = [k for k, i in pairs], [i for k, i in pairs]
+        return self.sorted_indexes[name]
 
 
 class InputConnect:
@@ -253,21 +290,32 @@ class InputConnect:
             vacancy_range (Union[str, int]) : Диапазон вывода вакансий
             headers (list(str)) : Требуемые стоблцы таблицы
         """
+        self.file_name = file_name
+        self.set_query(vacancy_contains, sortby, sort_order, vacancy_range, headers)
+
+    def set_query(self, vacancy_contains, sortby, sort_order, vacancy_range, headers):
+        """Проверяет и сохраняет параметры запроса. В режиме сессии вызывается для каждого нового запроса.
+
+        Args:
+            vacancy_contains (str) : Параметр фильтрации
+            sortby (str) : Параметр сортировки
+            sort_order (str): Обратный порядок сортировки (Да / Нет)
+            vacancy_range (list(int)) : Диапазон вывода вакансий
+            headers (list(str)) : Требуемые стоблцы таблицы
+
+        Raises:
+            ValueError: Параметры запроса некорректны, текст ошибки - сообщение для пользователя
+        """
         if sortby not in self.rus_eng_conversion and sortby != "":
-            print("Параметр сортировки некорректен")
-            exit()
+            raise ValueError("Параметр сортировки некорректен")
         if sort_order != "Да" and sort_order != "Нет" and sort_order != "":
-            print("Порядок сортировки задан некорректно")
-            exit()
-        if ":" not in vacancy_contains and vacancy_contains != "":
-            print("Формат ввода некорректен")
-            exit()
-        split_filter = vacancy_contains.split(": ")
-        ru_filter = split_filter[0]
-        if ru_filter not in self.rus_eng_conversion and ru_filter != "":
-            print("Параметр поиска некорректен")
-            exit()
-        self.file_name = file_name
+            raise ValueError("Порядок сортировки задан некорректно")
+        for condition in vacancy_contains.split("; "):
+            if ":" not in condition and vacancy_contains != "":
+                raise ValueError("Формат ввода некорректен")
+            ru_filter = condition.split(": ")[0]
+            if ru_filter not in self.rus_eng_conversion and ru_filter != "":
+                raise ValueError("Параметр поиска некорректен")
         self.vacancy_contains = vacancy_contains
         self.vacancies_sortby = sortby
         self.vacanies_sort_order = sort_order
@@ -312,101 +360,277 @@ class InputConnect:
     }
     experience_conversion_reversed = {v: k for k, v in experience_conversion.items()}
     currency_conversion_reversed = {v: k for k, v in currency_conversion.items()}
+    formatter_fields = {"salary_from", "salary_to", "salary_gross", "salary_currency",
+                        "experience_id", "premium", "published_at"}
 
-    def parser_decorator(self, dataset):
-        """Декоратор, который  применяет к ним соответствующие функции по русскоязычным подстановкам из словарей,
-         фильтрации данных, сортировки данных и вывода данных."""
-        def sorter(sortby, sort_order, vacancy_dictionary_list):
-            """Сортирует словарь вакансий по выбранным параметрам
+    def get_required_columns(self):
+        """Возвращает поля csv, которые нужны запросу: выводимые столбцы, поля фильтрации и сортировки
+        и поля, которые использует форматирование ряда.
 
-            Args:
-                sortby (str) : Параметр сортировки
-                sort_order (str): Обратный порядок сортировки (Да / Нет)
+        Returns:
+            set(str): Требуемые поля или None, если нужны все поля
+        """
+        if not self.headers or not self.headers[0]:
+            return None
+        headers_conversion = {v: k for k, v in self.eng_rus_conversion.items()}
+        columns = set(self.formatter_fields)
+        for header in self.headers:
+            if header not in headers_conversion:
+                return None
+            columns.add(headers_conversion[header])
+        if self.vacancy_contains:
+            columns |= self.get_filter_columns(self.vacancy_contains)
+        if self.vacancies_sortby:
+            columns.add(self.rus_eng_conversion[self.vacancies_sortby])
+        columns.discard("salary")
+        return columns
+
+    def get_sort_key(self, sortby):
+        """Возвращает функцию ключа сортировки словаря вакансии.
 
-            Returns:
-                list(dict): отсортированный словарь вакансий
-            """
-            if sortby == "":
-                return vacancy_dictionary_list
-
-            bool_sort_order = False
-            if sort_order == "Да":
-                bool_sort_order = True
-            if sortby == "Навыки":
-                vacancy_dictionary_list.sort(key=lambda x: len(x[self.rus_eng_conversion["Навыки"]]),
-                                             reverse=bool_sort_order)
-                return vacancy_dictionary_list
-            elif sortby == "Оклад":
-                vacancy_dictionary_list.sort(
-                    key=lambda x: (
-                        floor((float((x['salary_from'])
-                                     if x["salary_currency"] == "RUR"
-                                     else float(x['salary_from']) * self.currency_to_rub[x["salary_currency"]])
-                               + float((x['salary_to'])
-                                       if x["salary_currency"] == "RUR"
-                                       else float(x['salary_to']) * self.currency_to_rub[x["salary_currency"]])) / 2)),
-                    reverse=bool_sort_order)
-                return vacancy_dictionary_list
-            elif sortby == "Дата публикации вакансии":
-                vacancy_dictionary_list.sort(
-                    key=lambda x: (datetime.strptime(x["published_at"], "%Y-%m-%dT%H:%M:%S%z")),
-                    reverse=bool_sort_order)
-                return vacancy_dictionary_list
-            elif sortby == "Опыт работы":
-                vacancy_dictionary_list.sort(
-                    key=lambda x: self.experience_order[x["experience_id"]], reverse=bool_sort_order)
-                return vacancy_dictionary_list
+        Args:
+            sortby (str) : Параметр сортировки
+
+        Returns:
+            function: Ключ сортировки
+        """
+        if sortby == "Навыки":
+            return lambda x: len(x["key_skills"])
+        elif sortby == "Оклад":
+            return lambda x: floor((float(x['salary_from']) * self.currency_to_rub[x["salary_currency"]]
+                                    + float(x['salary_to']) * self.currency_to_rub[x["salary_currency"]]) / 2)
+        elif sortby == "Дата публикации вакансии":
+            return lambda x: datetime.strptime(x["published_at"], "%Y-%m-%dT%H:%M:%S%z")
+        elif sortby == "Опыт работы":
+            return lambda x: self.experience_order[x["experience_id"]]
+        field_name = self.rus_eng_conversion[sortby]
+        return lambda x: x[field_name]
+
+    @staticmethod
+    def split_filter(filter_string):
+        """Разбивает строку фильтрации на условия. Условия разделяются "; " и объединяются по И.
+
+        Args:
+            filter_string (str): Строка содержащая параметры фильтрации и требуемую информацию
+
+        Returns:
+            list(tuple(str, str)): Пары (параметр фильтрации, значение)
+
+        >>> InputConnect.split_filter("Название региона: Москва; Оклад: 50000 - 100000")
+        [('Название региона', 'Москва'), ('Оклад', '50000 - 100000')]
+        """
+        conditions = []
+        for condition in filter_string.split("; "):
+            split_filter = condition.split(": ")
+            conditions.append((split_filter[0], split_filter[1]))
+        return conditions
+
+    @staticmethod
+    def get_range(filter_parameter, convert):
+        """Разбирает значение или диапазон значений вида "<от> - <до>" включительно.
+
+        Args:
+            filter_parameter (str): Значение или диапазон
+            convert (function): Преобразование границы в ключ сравнения
+
+        Returns:
+            tuple: Нижняя и верхняя границы, для одного значения - совпадают
+
+        >>> InputConnect.get_range("50000 - 100000", int), InputConnect.get_range("50000", int)
+        ((50000, 100000), (50000, 50000))
+        """
+        bounds = filter_parameter.split(" - ")
+        if len(bounds) > 2:
+            raise ValueError("Формат ввода некорректен")
+        return convert(bounds[0]), convert(bounds[-1])
+
+    @staticmethod
+    def get_date_key(vacancy):
+        """Ключ дня публикации вакансии для сравнения с датами вида dd.mm.yyyy из get_filter_date.
+
+        >>> InputConnect.get_date_key({"published_at": "2022-07-05T18:19:30+0300"})
+        ('2022', '07', '05')
+        """
+        date = vacancy["published_at"].split("-")
+        return date[0], date[1], date[2][0:2]
+
+    @staticmethod
+    def get_filter_date(date):
+        """Переводит дату вида dd.mm.yyyy в ключ get_date_key.
+
+        >>> InputConnect.get_filter_date("05.07.2022")
+        ('2022', '07', '05')
+        """
+        return tuple(reversed(date.split(".")))
+
+    @staticmethod
+    def get_salary_from(vacancy):
+        return int(float(vacancy["salary_from"]))
+
+    @staticmethod
+    def get_salary_to(vacancy):
+        return int(float(vacancy["salary_to"]))
+
+    def get_condition(self, ru_filter, filter_parameter):
+        """Возвращает условие фильтрации словаря вакансии по одному параметру. Для даты публикации и оклада
+        значение может быть диапазоном: дата публикации попадает в диапазон, вилка оклада пересекается с ним.
+        Для одного значения это прежнее совпадение даты и попадание значения в вилку.
+
+        Args:
+            ru_filter (str): Параметр фильтрации
+            filter_parameter (str): Требуемое значение
+
+        Returns:
+            function: Условие фильтрации
+        """
+        if ru_filter == "Дата публикации вакансии":
+            first_date, last_date = self.get_range(filter_parameter, self.get_filter_date)
+            return lambda dic: first_date <= self.get_date_key(dic) <= last_date
+        elif ru_filter == "Оклад":
+            salary_min, salary_max = self.get_range(filter_parameter, int)
+            return lambda c: self.get_salary_from(c) <= salary_max and salary_min <= self.get_salary_to(c)
+        elif ru_filter == "Навыки":
+            skills = filter_parameter.split(", ")
+            return lambda c: all(x in c["key_skills"] for x in skills)
+        elif ru_filter == "Идентификатор валюты оклада":
+            currency = self.currency_conversion_reversed[filter_parameter]
+            return lambda c: currency == c["salary_currency"]
+        elif ru_filter == "Опыт работы":
+            experience = self.experience_conversion_reversed[filter_parameter]
+            return lambda c: experience == c["experience_id"]
+        field_name = self.rus_eng_conversion[ru_filter]
+        return lambda c: filter_parameter == c[field_name]
+
+    def get_filter(self, filter_string):
+        """Возвращает условие фильтрации словаря вакансии: все условия строки фильтрации одновременно.
+
+        Args:
+            filter_string (str): Строка содержащая параметры фильтрации и требуемую информацию
+
+        Returns:
+            function: Условие фильтрации
+        """
+        conditions = [self.get_condition(*condition) for condition in self.split_filter(filter_string)]
+        if len(conditions) == 1:
+            return conditions[0]
+        return lambda c: all(condition(c) for condition in conditions)
+
+    def get_filter_indexes(self, dataset, ru_filter, filter_parameter):
+        """Находит вакансии, подходящие под условие, по индексам dataset вместо просмотра всех вакансий:
+        дата публикации и оклад - бинарным поиском по отсортированным индексам, остальные поля -
+        по хэш-индексам значений.
+
+        Args:
+            dataset (DataSet): Набор данных
+            ru_filter (str): Параметр фильтрации
+            filter_parameter (str): Требуемое значение
+
+        Returns:
+            set(int): Индексы подходящих вакансий
+        """
+        if ru_filter == "Дата публикации вакансии":
+            first_date, last_date = self.get_range(filter_parameter, self.get_filter_date)
+            keys, indexes = dataset.get_sorted_index("published_at", self.get_date_key)
+            return set(indexes[bisect_left(keys, first_date):bisect_right(keys, last_date)])
+        elif ru_filter == "Оклад":
+            salary_min, salary_max = self.get_range(filter_parameter, int)
+            from_keys, from_indexes = dataset.get_sorted_index("salary_from", self.get_salary_from)
+            to_keys, to_indexes = dataset.get_sorted_index("salary_to", self.get_salary_to)
+            return (set(from_indexes[:bisect_right(from_keys, salary_max)])
+                    & set(to_indexes[bisect_left(to_keys, salary_min):]))
+        elif ru_filter == "Навыки":
+            index = dataset.get_hash_index("key_skills")
+            result = None
+            for skill in filter_parameter.split(", "):
+                result = set(index.get(skill, ())) if result is None else result & set(index.get(skill, ()))
+            return result
+        elif ru_filter == "Идентификатор валюты оклада":
+            field_name, value = "salary_currency", self.currency_conversion_reversed[filter_parameter]
+        elif ru_filter == "Опыт работы":
+            field_name, value = "experience_id", self.experience_conversion_reversed[filter_parameter]
+        else:
+            field_name, value = self.rus_eng_conversion[ru_filter], filter_parameter
+        return set(dataset.get_hash_index(field_name).get(value, ()))
+
+    def get_filter_columns(self, filter_string):
+        """Возвращает поля, которые читает условие фильтрации get_filter.
+
+        Args:
+            filter_string (str): Строка содержащая параметры фильтрации и требуемую информацию
+
+        Returns:
+            set(str): Поля вакансии
+        """
+        columns = set()
+        for ru_filter, filter_parameter in self.split_filter(filter_string):
+            if ru_filter == "Оклад":
+                columns |= {"salary_from", "salary_to"}
             else:
-                vacancy_dictionary_list.sort(key=lambda x: x[self.rus_eng_conversion[sortby]], reverse=bool_sort_order)
-                return vacancy_dictionary_list
+                columns.add(self.rus_eng_conversion[ru_filter])
+        return columns
+
+    def load_dataset(self):
+        """Читает файл запроса: только поля, нужные запросу, и только вакансии, подходящие под фильтр.
+        Отфильтрованный при чтении набор данных помечается как уже отфильтрованный по строке запроса.
+
+        Returns:
+            DataSet: Набор данных
+        """
+        if not self.vacancy_contains:
+            return DataSet(self.file_name, self.get_required_columns())
+        dataset = DataSet(self.file_name, self.get_required_columns(), self.get_filter(self.vacancy_contains),
+                          self.get_filter_columns(self.vacancy_contains))
+        if isinstance(dataset.vacancies_dicts, list):
+            dataset.filtered_indexes[self.vacancy_contains] = range(len(dataset.vacancies_dicts))
+        return dataset
+
+    def parser_decorator(self, dataset):
+        """Декоратор, который  применяет к ним соответствующие функции по русскоязычным подстановкам из словарей,
+         фильтрации данных, сортировки данных и вывода данных.
 
-        def filter_vacancies(filter_string, vacancy_dictionary_list):
-            """Сортирует словарь вакансий по строке
+         Порядок сортировки и результаты фильтрации сохраняются в dataset, поэтому повторные запросы
+         к тому же набору данных не пересчитывают ключи сортировки и условия фильтрации.
+         Словари вакансий dataset не изменяются."""
+        def filter_vacancies(filter_string):
+            """Фильтрует вакансии по строке с помощью индексов набора данных (см. get_filter_indexes)
 
             Args:
                 filter_string (str): Строка содержащая параметр фильтрации и требуемую информацию
 
             Returns:
-                list(dict)
+                list(int): Индексы подходящих вакансий в исходном порядке
             """
             if not filter_string:
-                return vacancy_dictionary_list
-            split_filter = filter_string.split(": ")
-            ru_filter = split_filter[0]
-            filter_parameter = split_filter[1]
-
-            if ru_filter == "Дата публикации вакансии":
-                formatted_vacancy_dictionary_list = []
-                for dic in vacancy_dictionary_list:
-                    raw_date = dic["published_at"]
-                    date = raw_date.split("-")
-                    date = f"{date[2][0:2]}.{date[1]}.{date[0]}"
-                    if filter_parameter == date:
-                        formatted_vacancy_dictionary_list.append(dic)
-                result = formatted_vacancy_dictionary_list
-
-            elif ru_filter == "Оклад":
-                result = [c for c in vacancy_dictionary_list if
-                          int(float(c["salary_from"])) <= int(filter_parameter) <= int(float(c["salary_to"]))]
-            elif ru_filter == "Навыки":
-                filter_parameter = filter_parameter.split(", ")
-                result = [c for c in vacancy_dictionary_list if
-                          all(x in c[self.rus_eng_conversion[ru_filter]] for x in filter_parameter)]
-            elif ru_filter == "Идентификатор валюты оклада":
-                result = [c for c in vacancy_dictionary_list if
-                          self.currency_conversion_reversed[filter_parameter] == c["salary_currency"]]
-            elif ru_filter == "Опыт работы":
-                result = [c for c in vacancy_dictionary_list if
-                          self.experience_conversion_reversed[filter_parameter] == c["experience_id"]]
+                return range(len(dataset.vacancies_dicts))
+            if filter_string not in dataset.filtered_indexes:
+                result = None
+                for condition in self.split_filter(filter_string):
+                    indexes = self.get_filter_indexes(dataset, *condition)
+                    result = indexes if result is None else result & indexes
+                dataset.filtered_indexes[filter_string] = sorted(result)
+            return dataset.filtered_indexes[filter_string]
+
+        def sorter(sortby, sort_order, indexes, count=None):
+            """Сортирует отфильтрованные вакансии по выбранным параметрам. Если нужны только первые count вакансий,
+            выполняет частичный отбор вместо полной сортировки, порядок равных ключей сохраняется.
 
-            else:
-                result = [c for c in vacancy_dictionary_list if
-                          filter_parameter == c[self.rus_eng_conversion[ru_filter]]]
+            Args:
+                sortby (str) : Параметр сортировки
+                sort_order (str): Обратный порядок сортировки (Да / Нет)
+                indexes (list(int)): Индексы вакансий в исходном порядке
+                count (int): Количество первых вакансий, которые нужно вернуть, None - все вакансии
 
-            if len(result) == 0:
-                print("Ничего не найдено")
-                exit()
-            return result
+            Returns:
+                list(int): индексы вакансий в порядке сортировки
+            """
+            if sortby == "":
+                return indexes[:count]
+            keys = dataset.get_sort_keys(sortby, self.get_sort_key(sortby), indexes)
+            reverse = sort_order == "Да"
+            if count is not None and count < len(indexes):
+                select = heapq.nlargest if reverse else heapq.nsmallest
+                return select(count, indexes, key=keys.__getitem__)
+            return sorted(indexes, key=keys.__getitem__, reverse=reverse)
 
         def formatter(row):
             """Форматирует ряд таблицы
@@ -415,9 +639,9 @@ class InputConnect:
                 row (dict): Словарь-ряд таблицы
 
             Returns:
-                new_row (dict): Отформатированный словарь-ряд таблицы
+                new_row (dict): Отформатированная копия словаря-ряда таблицы
             """
-            new_row = row
+            new_row = dict(row)
             new_row["salary_currency"] = self.currency_conversion[row["salary_currency"]]
             new_row["experience_id"] = self.experience_conversion[row["experience_id"]]
             if new_row["premium"] == "True":
@@ -445,20 +669,23 @@ class InputConnect:
             Args:
                 data_vacancies (list(dict)): Список словарей вакансий
                 dic_naming (list(str)): Заголовки таблицы
-                vacancy_range (list(int)): Диапазон вывода вакансий
+                vacancy_range (list(int)): Диапазон вывода вакансий, конец диапазона ограничивается
+                                           количеством вакансий
                 headers (list(str)) : Требуемые столбцы таблицы
             """
             if len(data_vacancies) == 0:
                 print("Нет данных")
                 return
+            dic_naming = {k: v for k, v in dic_naming.items() if k == "salary" or k in data_vacancies[0]}
             table = PrettyTable(header=True, align="l", hrules=ALL)
+            vacancy_range = list(vacancy_range)
             if len(vacancy_range) == 0:
                 vacancy_range.append(1)
                 vacancy_range.append(len(data_vacancies))
             elif len(vacancy_range) == 1:
                 vacancy_range.append(len(data_vacancies))
             else:
-                vacancy_range[1] -= 1
+                vacancy_range[1] = min(vacancy_range[1] - 1, len(data_vacancies))
 
             header = [dic_naming[x] for x in dic_naming]
             for x in dic_naming:
@@ -484,20 +711,165 @@ class InputConnect:
         vacancy_dictionary_list = dataset.vacancies_dicts
         if vacancy_dictionary_list == 0:
             print("Пустой файл")
-            exit()
-
-        print_vacancies(
-            filter_vacancies
-            (vacancy_contains, sorter(vacancies_sortby, vacanies_sort_order, vacancy_dictionary_list)),
-            self.eng_rus_conversion, vacancy_range, headers)
-
-
-file_name = input("Введите название файла: ")
-vacancy_contains = input("Введите параметр фильтрации: ")
-vacancies_sortby = input("Введите параметр сортировки: ")
-vacanies_sort_order = input("Обратный порядок сортировки (Да / Нет): ")
-vacancy_range = [int(x) for x in input("Введите диапазон вывода: ").split()]
-headers = input("Введите требуемые столбцы: ").split(", ")
-input_connect = InputConnect\
-    (file_name, vacancy_contains, vacancies_sortby, vacanies_sort_order, vacancy_range, headers)
-input_connect.parser_decorator(DataSet(file_name))
+            return
+
+        indexes = filter_vacancies(self.vacancy_contains)
+        if self.vacancy_contains and len(indexes) == 0:
+            print("Ничего не найдено")
+            return
+        count = max(self.vacancy_range[1] - 1, 1) if len(self.vacancy_range) > 1 else None
+        indexes = sorter(self.vacancies_sortby, self.vacanies_sort_order, indexes, count)
+        print_vacancies([vacancy_dictionary_list[i] for i in indexes], self.eng_rus_conversion, self.vacancy_range,
+                        self.headers)
+
+
+class SessionTests(TestCase):
+    rows = [["Программист", "<p>Пишет код</p>", "Git\nSQL", "between1And3", "False", "Компания 1",
+             "100000.0", "150000.0", "True", "RUR", "Москва", "2022-07-05T18:19:30+0300"],
+            ["Аналитик", "Считает", "SQL", "noExperience", "True", "Компания 2",
+             "1000.0", "2000.0", "False", "EUR", "Казань", "2022-07-06T10:00:00+0300"],
+            ["Повар", "Готовит", "Ножи", "noExperience", "False", "Компания 3",
+             "30000.0", "40000.0", "False", "RUR", "Москва", "2022-07-05T09:00:00+0300"]]
+    field_names = ["name", "description", "key_skills", "experience_id", "premium", "employer_name",
+                   "salary_from", "salary_to", "salary_gross", "salary_currency", "area_name", "published_at"]
+
+    def setUp(self):
+        f = tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8-sig", newline="", delete=False)
+        with f:
+            writer = csv.writer(f)
+            writer.writerow(self.field_names)
+            writer.writerows(self.rows)
+        self.file_name = f.name
+
+    def tearDown(self):
+        os.remove(self.file_name)
+
+    def run_query(self, dataset, *query):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            InputConnect(self.file_name, *query).parser_decorator(dataset)
+        return output.getvalue()
+
+    def test_queries_share_dataset(self):
+        queries = [("Название региона: Москва", "Оклад", "Да", [], ["Название", "Оклад"]),
+                   ("", "Оклад", "Нет", [1, 3], [""]),
+                   ("Опыт работы: Нет опыта", "Дата публикации вакансии", "Нет", [], ["Название"]),
+                   ("Название региона: Москва", "Оклад", "Да", [], ["Название", "Оклад"])]
+        dataset = DataSet(self.file_name)
+        for query in queries:
+            self.assertEqual(self.run_query(dataset, *query), self.run_query(DataSet(self.file_name), *query))
+        self.assertEqual(set(dataset.sort_keys), {"Оклад", "Дата публикации вакансии"})
+        self.assertEqual(dataset.vacancies_dicts, DataSet(self.file_name).vacancies_dicts)
+
+    def test_filter_pushdown(self):
+        for vacancy_contains in ["Название региона: Москва", "Оклад: 35000", "Навыки: SQL", "Премиум-вакансия: Да",
+                                 "Дата публикации вакансии: 05.07.2022", "Опыт работы: Нет опыта"]:
+            query = (vacancy_contains, "Оклад", "Нет", [], [""])
+            input_connect = InputConnect(self.file_name, *query)
+            dataset = input_connect.load_dataset()
+            self.assertEqual(dataset.vacancies_dicts,
+                             [d for d in DataSet(self.file_name).vacancies_dicts
+                              if input_connect.get_filter(vacancy_contains)(d)])
+            self.assertEqual(self.run_query(dataset, *query), self.run_query(DataSet(self.file_name), *query))
+
+    def test_indexes_equal_scan(self):
+        dataset = DataSet(self.file_name)
+        for vacancy_contains in ["Дата публикации вакансии: 05.07.2022 - 06.07.2022", "Оклад: 1500 - 35000",
+                                 "Оклад: 150000", "Название региона: Москва; Опыт работы: Нет опыта",
+                                 "Навыки: SQL; Дата публикации вакансии: 01.07.2022 - 05.07.2022",
+                                 "Идентификатор валюты оклада: Евро; Оклад: 2000", "Навыки: Git, SQL"]:
+            query = (vacancy_contains, "", "", [], [""])
+            self.assertEqual(self.run_query(dataset, *query),
+                             self.run_query(InputConnect(self.file_name, *query).load_dataset(), *query))
+        self.assertEqual(set(dataset.sorted_indexes), {"published_at", "salary_from", "salary_to"})
+        self.assertEqual(set(dataset.hash_indexes), {"area_name", "experience_id", "key_skills", "salary_currency"})
+        self.assertEqual(dataset.filtered_indexes["Оклад: 1500 - 35000"], [1, 2])
+
+    def test_cells_are_cleaned_lazily(self):
+        dataset = DataSet(self.file_name)
+        self.run_query(dataset, "Название региона: Москва", "", "", [1, 2], ["Название"])
+        self.assertEqual([set(d.cells) for d in dataset.vacancies_dicts],
+                         [set(self.field_names), {"area_name"}, {"area_name"}])
+        self.assertEqual(dataset.vacancies_dicts[0]["description"], "Пишет код")
+        self.assertEqual(dataset.vacancies_dicts[0]["key_skills"], ["Git", "SQL"])
+
+    def test_range_beyond_result(self):
+        dataset = DataSet(self.file_name)
+        output = self.run_query(dataset, "", "Оклад", "Нет", [1, 10], [""])
+        self.assertEqual(output, self.run_query(DataSet(self.file_name), "", "Оклад", "Нет", [1, 4], [""]))
+        self.assertEqual(self.run_query(dataset, "Название региона: Казань", "", "", [2, 5], ["Название"]),
+                         self.run_query(DataSet(self.file_name), "Название региона: Казань", "", "", [2], ["Название"]))
+
+    def test_nothing_found(self):
+        self.assertEqual(self.run_query(DataSet(self.file_name), "Название: Пекарь", "", "", [], [""]),
+                         "Ничего не найдено\n")
+
+    def test_incorrect_query(self):
+        with self.assertRaises(ValueError):
+            InputConnect(self.file_name, "", "Зарплата", "", [], [""])
+
+
+def input_query(vacancy_contains):
+    """Запрашивает у пользователя остальные параметры запроса.
+
+    Args:
+        vacancy_contains (str) : Параметр фильтрации
+
+    Returns:
+        tuple: Параметр фильтрации, параметр сортировки, обратный порядок сортировки, диапазон вывода, столбцы
+    """
+    vacancies_sortby = input("Введите параметр сортировки: ")
+    vacanies_sort_order = input("Обратный порядок сортировки (Да / Нет): ")
+    vacancy_range = [int(x) for x in input("Введите диапазон вывода: ").split()]
+    headers = input("Введите требуемые столбцы: ").split(", ")
+    return vacancy_contains, vacancies_sortby, vacanies_sort_order, vacancy_range, headers
+
+
+def main():
+    """Запрашивает файл и один запрос, печатает таблицу вакансий. Читает из файла только поля, нужные запросу,
+    и только вакансии, подходящие под фильтр."""
+    file_name = input("Введите название файла: ")
+    try:
+        input_connect = InputConnect(file_name, *input_query(input("Введите параметр фильтрации: ")))
+    except ValueError as e:
+        print(e)
+        return
+    input_connect.parser_decorator(input_connect.load_dataset())
+
+
+def session():
+    """Режим сессии: файл разбирается один раз, после чего выполняется любое количество запросов к нему.
+    Сессия завершается вводом "Выход" в качестве параметра фильтрации или концом ввода."""
+    file_name = input("Введите название файла: ")
+    dataset = DataSet(file_name)
+    if dataset.vacancies_dicts == 0:
+        print("Пустой файл")
+        return
+    input_connect = None
+    while True:
+        try:
+            vacancy_contains = input("Введите параметр фильтрации: ")
+            if vacancy_contains == "Выход":
+                return
+            query = input_query(vacancy_contains)
+        except EOFError:
+            return
+        except ValueError:
+            print("Формат ввода некорректен")
+            continue
+        try:
+            if input_connect is None:
+                input_connect = InputConnect(file_name, *query)
+            else:
+                input_connect.set_query(*query)
+        except ValueError as e:
+            print(e)
+            continue
+        try:
+            input_connect.parser_decorator(dataset)
+        except (ValueError, KeyError):
+            print("Формат ввода некорректен")
+
+
+if __name__ == "__main__":
+    main()
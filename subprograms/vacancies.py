@@ -1,26 +1,213 @@
+import calendar
 import csv
+import io
 import functools
+import hashlib
+import pickle
+import random
 import re
+import statistics
 from openpyxl import Workbook
 from openpyxl.reader.excel import load_workbook
 from openpyxl.styles import Border, Side, Font
 from datetime import datetime
-from math import floor
-from statistics import mean
+from fractions import Fraction
+from math import floor, fsum
 import matplotlib.pyplot as plt
 import numpy as np
 from openpyxl.styles.numbers import FORMAT_PERCENTAGE_00
 from jinja2 import Environment, FileSystemLoader
 import pdfkit
 from unittest import TestCase
+from contextlib import redirect_stdout
 import cProfile
 from multiprocessing import Pool
 import os
 import glob
-from collections import Counter
+import mmap
+import tempfile
+from array import array
+from collections import Counter, deque
 from functools import reduce, partial, partialmethod
 import time
 from concurrent.futures import ProcessPoolExecutor
+import sqlite3
+try:
+    from subprograms.sqlite_vacancies_store import VacancyStore
+except ImportError:
+    from sqlite_vacancies_store import VacancyStore
+
+
+class ExchangeRates:
+    """Исторические курсы валют к рублю по месяцам. Курсы каждой валюты хранятся в массиве,
+    индексом которого является номер месяца от начала таблицы, поэтому поиск курса не зависит от размера таблицы.
+
+    Attributes:
+        first_month (int): Номер первого месяца таблицы (год * 12 + номер месяца - 1)
+        rates (dict(str, array('d'))): Курсы валют по номеру месяца от first_month, nan - нет курса
+    """
+    redenomination_month = 2016 * 12 + 6
+    redenomination_ratio = 10000
+
+    def __init__(self, first_month, rates):
+        """Инициализирует таблицу курсов. Если в таблице есть BYR, но нет BYN, курс BYN вычисляется из него:
+        до деноминации июля 2016 года - как курс BYR, умноженный на redenomination_ratio, после - равным ему.
+        Колонка BYR таблицы exchange_data с июля 2016 года уже содержит курс BYN.
+
+        Args:
+            first_month (int): Номер первого месяца таблицы (год * 12 + номер месяца - 1)
+            rates (dict(str, array('d'))): Курсы валют по номеру месяца от first_month
+        """
+        self.first_month = first_month
+        self.rates = rates
+        if "BYR" in rates and "BYN" not in rates:
+            self.rates["BYN"] = array("d", (rate * self.redenomination_ratio
+                                            if first_month + i < self.redenomination_month else rate
+                                            for i, rate in enumerate(rates["BYR"])))
+
+    @staticmethod
+    def get_month(date):
+        """Возвращает номер месяца даты.
+
+        Args:
+            date (str): Дата вида "2007-12" или "2007-12-03T17:47:55+0300"
+
+        Returns:
+            int: Год * 12 + номер месяца - 1
+
+        >>> ExchangeRates.get_month("2007-12-03T17:47:55+0300")
+        24095
+        """
+        return int(date[0:4]) * 12 + int(date[5:7]) - 1
+
+    @classmethod
+    def from_rows(cls, currencies, rows):
+        """Создает таблицу курсов из рядов (месяц, курсы валют...). Пропущенные месяцы и курсы заполняются nan.
+
+        Args:
+            currencies (list(str)): Валюты в порядке колонок
+            rows (iterable(tuple)): Ряды с месяцем вида "2007-12" и курсами
+
+        Returns:
+            ExchangeRates: Таблица курсов
+
+        >>> ExchangeRates.from_rows(["USD"], [("2007-12", 24.5)]).get_rate("USD", "2007-12-03T17:47:55+0300")
+        24.5
+        """
+        months = {cls.get_month(row[0]): row[1:] for row in rows}
+        first_month = min(months, default=0)
+        length = max(months, default=-1) - first_month + 1
+        rates = {currency: array("d", [float("nan")]) * length for currency in currencies}
+        for month, values in months.items():
+            for currency, value in zip(currencies, values):
+                if value is not None and value != "":
+                    rates[currency][month - first_month] = float(value)
+        return cls(first_month, rates)
+
+    @classmethod
+    def from_csv(cls, file_name):
+        """Загружает курсы из csv файла с колонками date, BYR, USD... (exchange_data.csv).
+
+        Args:
+            file_name (str): Название файла в формате "*****.csv"
+
+        Returns:
+            ExchangeRates: Таблица курсов
+        """
+        with open(file_name, mode="r", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            field_names = next(reader)
+            return cls.from_rows(field_names[1:], reader)
+
+    @classmethod
+    def from_sqlite(cls, database, table="exchange_data"):
+        """Загружает курсы из таблицы SQLite с колонками date, BYR, USD...
+
+        Args:
+            database (str): Путь к базе данных
+            table (str): Название таблицы курсов
+
+        Returns:
+            ExchangeRates: Таблица курсов
+        """
+        conn = sqlite3.connect(database)
+        try:
+            cursor = conn.execute(f'SELECT * FROM "{table}"')
+            field_names = [description[0] for description in cursor.description]
+            return cls.from_rows(field_names[1:], cursor.fetchall())
+        finally:
+            conn.close()
+
+    def get_rate(self, currency, published_at):
+        """Возвращает курс валюты к рублю в месяц публикации.
+
+        Args:
+            currency (str): Валюта
+            published_at (str): Дата публикации вида "2007-12-03T17:47:55+0300"
+
+        Returns:
+            float: Курс валюты к рублю
+
+        Raises:
+            KeyError: Нет курса валюты за этот месяц
+        """
+        if currency == "RUR":
+            return 1
+        index = self.get_month(published_at) - self.first_month
+        try:
+            rate = self.rates[currency][index] if index >= 0 else float("nan")
+        except IndexError:
+            rate = float("nan")
+        if rate != rate:
+            raise KeyError((currency, published_at[0:7]))
+        return rate
+
+    def get_key(self):
+        """Возвращает хэш таблицы курсов, по которому различаются кэши, построенные с разными курсами.
+
+        Returns:
+            str: sha1 хэш таблицы курсов
+        """
+        key = hashlib.sha1(str(self.first_month).encode())
+        for currency in sorted(self.rates):
+            key.update(currency.encode())
+            key.update(self.rates[currency].tobytes())
+        return key.hexdigest()
+
+
+class ExchangeRatesTests(TestCase):
+    def setUp(self):
+        self.exchange_rates = ExchangeRates.from_rows(
+            ["BYR", "USD"], [("2016-06", 0.0033, 66.0), ("2016-07", 31.9, 64.2), ("2016-09", 32.5, None)])
+
+    def test_rate_depends_on_month(self):
+        self.assertEqual(self.exchange_rates.get_rate("USD", "2016-06-03T17:47:55+0300"), 66.0)
+        self.assertEqual(self.exchange_rates.get_rate("USD", "2016-07-03T17:47:55+0300"), 64.2)
+
+    def test_rur(self):
+        self.assertEqual(self.exchange_rates.get_rate("RUR", "2000-01-01T00:00:00+0300"), 1)
+
+    def test_missing_rate(self):
+        for currency, published_at in (("USD", "2016-08-01T00:00:00+0300"), ("USD", "2016-09-01T00:00:00+0300"),
+                                       ("USD", "2016-05-01T00:00:00+0300"), ("USD", "2017-01-01T00:00:00+0300"),
+                                       ("KZT", "2016-06-01T00:00:00+0300")):
+            with self.assertRaises(KeyError):
+                self.exchange_rates.get_rate(currency, published_at)
+
+    def test_byn_redenomination(self):
+        self.assertAlmostEqual(self.exchange_rates.get_rate("BYN", "2016-06-03T17:47:55+0300"), 33.0)
+        self.assertEqual(self.exchange_rates.get_rate("BYN", "2016-07-03T17:47:55+0300"), 31.9)
+        self.assertEqual(self.exchange_rates.get_rate("BYR", "2016-06-03T17:47:55+0300"), 0.0033)
+
+    def test_csv_equals_rows(self):
+        fd, file_name = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("date,BYR,USD\n2016-06,0.0033,66.0\n2016-07,31.9,64.2\n2016-09,32.5,\n")
+        try:
+            self.assertEqual(ExchangeRates.from_csv(file_name).get_key(), self.exchange_rates.get_key())
+        finally:
+            os.remove(file_name)
+
 
 class Salary:
     """Класс для представления зарплаты.
@@ -29,7 +216,8 @@ class Salary:
         salary_from (int or float or str): Нижняя граница вилки оклада
         salary_to (int or float or str): Верхняя граница вилки оклада
         salary_currency (str): Валюта оклада
-        rub_salary (float): Средняя зарплата, переведенная в рубли с помощью словаря currency_to_rub
+        rub_salary (float): Средняя зарплата, переведенная в рубли по курсу месяца публикации
+                            или, если курсы не переданы, с помощью словаря currency_to_rub
     """
     currency_to_rub = {
         "AZN": 35.68,
@@ -44,13 +232,15 @@ class Salary:
         "UZS": 0.0055,
     }
 
-    def __init__(self, salary_from, salary_to, salary_currency):
+    def __init__(self, salary_from, salary_to, salary_currency, published_at=None, exchange_rates=None):
         """Инициализирует объект Salary, выполняет конвертацию для целочисленных полей.
 
         Args:
             salary_from (int or float or str): Нижняя граница вилки оклада
             salary_to (int or float or str): Верхняя граница вилки оклада
             salary_currency (str): Валюта оклада
+            published_at (str): Дата публикации вакансии, по ее месяцу выбирается курс
+            exchange_rates (ExchangeRates): Исторические курсы валют
 
         >>> type(Salary(10.0, 20.4, 'RUR')).__name__
         'Salary'
@@ -64,15 +254,54 @@ class Salary:
         self.salary_from = int(float(salary_from))
         self.salary_to = int(float(salary_to))
         self.salary_currency = salary_currency
-        self.rub_salary = self.get_salary_in_rub()
+        self.rub_salary = self.get_salary_in_rub(published_at, exchange_rates)
 
-    def get_salary_in_rub(self):
-        """Вычисляет среднюю зарплату из вилки и переводит в рубли, при помощи словаря
+    def get_salary_in_rub(self, published_at=None, exchange_rates=None):
+        """Вычисляет среднюю зарплату из вилки и переводит в рубли по курсу месяца публикации
+        или, если курсы или дата не переданы, при помощи словаря
+
+        Args:
+            published_at (str): Дата публикации вакансии
+            exchange_rates (ExchangeRates): Исторические курсы валют
 
         Returns:
             float: Средняя зарплата в рублях
+
+        Raises:
+            KeyError: Нет курса валюты
         """
-        return ((self.salary_from + self.salary_to) / 2) * self.currency_to_rub[self.salary_currency]
+        if exchange_rates is None or published_at is None:
+            rate = self.currency_to_rub[self.salary_currency]
+        else:
+            rate = exchange_rates.get_rate(self.salary_currency, published_at)
+        return ((self.salary_from + self.salary_to) / 2) * rate
+
+    @staticmethod
+    def from_vacancy_dictionary(vacancy_dictionary, exchange_rates=None):
+        """Создает зарплату из словаря вакансии: из вилки с валютой или из поля salary в рублях.
+
+        Args:
+            vacancy_dictionary (dict): Словарь с исходными данными о вакансии
+            exchange_rates (ExchangeRates): Исторические курсы валют, по умолчанию - словарь currency_to_rub
+
+        Returns:
+            Salary: Зарплата или None, если ее нельзя получить
+
+        >>> Salary.from_vacancy_dictionary({"salary": "100.0"}).rub_salary
+        100.0
+        >>> Salary.from_vacancy_dictionary({"salary_from": "100"}) is None
+        True
+        """
+        try:
+            return Salary(vacancy_dictionary.get("salary_from"),
+                          vacancy_dictionary.get("salary_to"),
+                          vacancy_dictionary.get("salary_currency"),
+                          vacancy_dictionary.get("published_at"), exchange_rates)
+        except:
+            try:
+                return Salary(vacancy_dictionary.get("salary"), vacancy_dictionary.get("salary"), "RUR")
+            except:
+                return None
 
 
 class SalaryTests(TestCase):
@@ -100,6 +329,16 @@ class SalaryTests(TestCase):
     def test_currency_in_get_salary(self):
         self.assertEqual(Salary(10, 30.0, 'EUR').get_salary_in_rub(), 1198.0)
 
+    def test_exchange_rates_in_get_salary(self):
+        exchange_rates = ExchangeRates.from_rows(["EUR"], [("2007-12", 36.0), ("2022-12", 64.0)])
+        self.assertEqual(Salary(10, 30, 'EUR', "2007-12-03T17:47:55+0300", exchange_rates).rub_salary, 720.0)
+
+    def test_missing_exchange_rate(self):
+        exchange_rates = ExchangeRates.from_rows(["EUR"], [("2007-12", 36.0)])
+        self.assertIsNone(Salary.from_vacancy_dictionary(
+            {"salary_from": 10, "salary_to": 30, "salary_currency": "USD",
+             "published_at": "2007-12-03T17:47:55+0300"}, exchange_rates))
+
 
 class Vacancy:
     """Класс для хранения данных о вакансии.
@@ -116,11 +355,12 @@ class Vacancy:
         published_at (str): Дата публикации вакансии
     """
 
-    def __init__(self, vacancy_dictionary):
+    def __init__(self, vacancy_dictionary, exchange_rates=None):
         """Иницилиазирует объект Vacancy из словаря vacancy_dictionary.
 
         Args:
             vacancy_dictionary (dict): Словарь с исходными данными о вакансии
+            exchange_rates (ExchangeRates): Исторические курсы валют для перевода зарплаты в рубли
         """
         self.name = vacancy_dictionary.get("name")
         self.description = vacancy_dictionary.get("description")
@@ -128,16 +368,7 @@ class Vacancy:
         self.experience_id = vacancy_dictionary.get("experience_id")
         self.premium = vacancy_dictionary.get("premium")
         self.employer_name = vacancy_dictionary.get("employer_name")
-        try:
-            self.salary = Salary(vacancy_dictionary.get("salary_from"),
-                                 vacancy_dictionary.get("salary_to"),
-                                 vacancy_dictionary.get("salary_currency"))
-        except:
-            try:
-                self.salary = Salary(vacancy_dictionary.get("salary"), vacancy_dictionary.get("salary"), "RUR")
-            except:
-                self.salary = None
-
+        self.salary = Salary.from_vacancy_dictionary(vacancy_dictionary, exchange_rates)
         self.area_name = vacancy_dictionary.get("area_name")
         self.published_at = vacancy_dictionary.get("published_at")
 
@@ -185,22 +416,903 @@ class VacancyTests(TestCase):
         self.assertEqual(type(Vacancy({"salary_to": 1, "salary_from": 1}).salary).__name__, "NoneType")
 
 
+class SalaryAggregate:
+    """Компактный агрегат зарплат группы вакансий: количество, точная сумма, минимум и максимум.
+
+    Сумма хранится без ошибок округления в виде неперекрывающихся частичных сумм (как в math.fsum),
+    поэтому результат не зависит от порядка сложения, а mean совпадает с statistics.mean по списку зарплат.
+    Агрегаты складываются ассоциативно, поэтому их можно собирать по чанкам и процессам,
+    не храня и не пересылая списки зарплат.
+
+    Attributes:
+        count (int): Количество зарплат
+        partials (list(float)): Частичные суммы, точная сумма зарплат равна их сумме
+        min (float): Минимальная зарплата
+        max (float): Максимальная зарплата
+    """
+    __slots__ = ("count", "partials", "min", "max")
+
+    def __init__(self, count=0, total=0.0, minimum=float("inf"), maximum=float("-inf")):
+        """Инициализирует агрегат.
+
+        Args:
+            count (int): Количество зарплат
+            total (float): Сумма зарплат
+            minimum (float): Минимальная зарплата
+            maximum (float): Максимальная зарплата
+        """
+        self.count = count
+        self.partials = [total] if total else []
+        self.min = minimum
+        self.max = maximum
+
+    @property
+    def total(self):
+        """float: Сумма зарплат, округленная один раз"""
+        return fsum(self.partials)
+
+    def add_to_sum(self, x):
+        """Добавляет число к точной сумме (алгоритм Шевчука, на котором основан math.fsum).
+
+        Args:
+            x (float): Слагаемое
+        """
+        partials = self.partials
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials[i] = lo
+                i += 1
+            x = hi
+        partials[i:] = [x]
+
+    def add(self, salary):
+        """Добавляет зарплату в агрегат.
+
+        Args:
+            salary (float): Зарплата
+
+        >>> aggregate = SalaryAggregate()
+        >>> aggregate.add(10.0)
+        >>> aggregate.add(30.0)
+        >>> aggregate
+        SalaryAggregate(count=2, total=40.0, min=10.0, max=30.0)
+        """
+        self.count += 1
+        self.add_to_sum(salary)
+        if salary < self.min:
+            self.min = salary
+        if salary > self.max:
+            self.max = salary
+
+    def __iadd__(self, other):
+        """Добавляет к агрегату другой агрегат.
+
+        Args:
+            other (SalaryAggregate): Агрегат
+
+        Returns:
+            SalaryAggregate: Текущий агрегат
+        """
+        self.count += other.count
+        for partial in other.partials:
+            self.add_to_sum(partial)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def __add__(self, other):
+        """Складывает два агрегата, не изменяя их.
+
+        Args:
+            other (SalaryAggregate): Агрегат
+
+        Returns:
+            SalaryAggregate: Новый агрегат
+
+        >>> SalaryAggregate(1, 10.0, 10.0, 10.0) + SalaryAggregate(2, 50.0, 20.0, 30.0)
+        SalaryAggregate(count=3, total=60.0, min=10.0, max=30.0)
+        """
+        result = SalaryAggregate(self.count, 0.0, self.min, self.max)
+        result.partials = list(self.partials)
+        result += other
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, SalaryAggregate):
+            return NotImplemented
+        return (self.count, self.total, self.min, self.max) == (other.count, other.total, other.min, other.max)
+
+    def __repr__(self):
+        return f"SalaryAggregate(count={self.count}, total={self.total}, min={self.min}, max={self.max})"
+
+    def mean(self):
+        """Вычисляет среднюю зарплату так же, как statistics.mean: точная сумма делится на количество,
+        результат округляется один раз.
+
+        Returns:
+            float: Средняя зарплата
+
+        >>> SalaryAggregate(4, 10.0, 1.0, 4.0).mean()
+        2.5
+        """
+        return float(sum(map(Fraction, self.partials), Fraction(0)) / self.count)
+
+
+class SalaryAggregateTests(TestCase):
+    def test_add_count(self):
+        aggregate = SalaryAggregate()
+        aggregate.add(10)
+        aggregate.add(20)
+        self.assertEqual(aggregate.count, 2)
+
+    def test_add_min_max(self):
+        aggregate = SalaryAggregate()
+        for salary in (20, 10, 30):
+            aggregate.add(salary)
+        self.assertEqual((aggregate.min, aggregate.max), (10, 30))
+
+    def test_merge_is_associative(self):
+        a, b, c = SalaryAggregate(1, 1.0, 1.0, 1.0), SalaryAggregate(2, 5.0, 2.0, 3.0), SalaryAggregate(1, 4.0, 4.0, 4.0)
+        self.assertEqual((a + b) + c, a + (b + c))
+
+    def test_mean_equals_statistics_mean(self):
+        generator = random.Random(7)
+        rates = [1, 0.13, 23.91, 59.90, 60.66, 0.0055]
+        for _ in range(2000):
+            salaries = [rates[generator.randrange(len(rates))] * generator.randrange(10000, 300000) / 2
+                        for _ in range(generator.randrange(1, 40))]
+            aggregate = SalaryAggregate()
+            for salary in salaries:
+                aggregate.add(salary)
+            merged = SalaryAggregate()
+            for start in reversed(range(0, len(salaries), 7)):
+                chunk = SalaryAggregate()
+                for salary in salaries[start:start + 7]:
+                    chunk.add(salary)
+                merged += chunk
+            expected = int(statistics.mean(salaries))
+            self.assertEqual((int(aggregate.mean()), int(merged.mean())), (expected, expected))
+
+    def test_mean_is_exact(self):
+        aggregate = SalaryAggregate()
+        for salary in (100.3, 0.6, 1.1):
+            aggregate.add(salary)
+        self.assertEqual(int(aggregate.mean()), int(statistics.mean([100.3, 0.6, 1.1])))
+        self.assertEqual(int(aggregate.mean()), 34)
+
+    def test_merge_with_empty(self):
+        self.assertEqual(SalaryAggregate() + SalaryAggregate(1, 2.0, 2.0, 2.0), SalaryAggregate(1, 2.0, 2.0, 2.0))
+
+
+class StringDictionary:
+    """Словарь для кодирования повторяющихся строк целочисленными кодами.
+
+    Attributes:
+        values (list(str)): Строки по кодам
+    """
+
+    def __init__(self, values=()):
+        """Инициализирует словарь.
+
+        Args:
+            values (iterable(str)): Строки, коды которых равны их позициям
+        """
+        self.values = list(values)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+
+    def encode(self, value):
+        """Возвращает код строки, добавляя ее в словарь при необходимости.
+
+        Args:
+            value (str): Строка
+
+        Returns:
+            int: Код строки
+
+        >>> dictionary = StringDictionary()
+        >>> [dictionary.encode(x) for x in ["Москва", "Пермь", "Москва"]]
+        [0, 1, 0]
+        """
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def __getitem__(self, code):
+        return self.values[code]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getstate__(self):
+        return self.values
+
+    def __setstate__(self, values):
+        self.__init__(values)
+
+
+class VacancyColumns:
+    """Колоночное хранилище вакансий. Числовые поля хранятся в типизированных массивах,
+    повторяющиеся строки - кодами словарей, поэтому на вакансию приходится несколько десятков байт
+    вместо объектов Vacancy и Salary.
+
+    Attributes:
+        salary_from (array('d')): Нижняя граница вилки оклада, nan - нет зарплаты
+        salary_to (array('d')): Верхняя граница вилки оклада, nan - нет зарплаты
+        rub_salary (array('d')): Средняя зарплата в рублях, nan - нет зарплаты
+        published (array('q')): Время публикации в секундах Unix
+        year (array('H')): Год публикации по местному времени вакансии
+        name_codes (array('I')): Коды названий вакансий
+        area_name_codes (array('I')): Коды городов
+        salary_currency_codes (array('I')): Коды валют
+        experience_id_codes (array('I')): Коды опыта работы
+        names (StringDictionary): Названия вакансий
+        area_names (StringDictionary): Города
+        salary_currencies (StringDictionary): Валюты
+        experience_ids (StringDictionary): Опыт работы
+    """
+
+    def __init__(self):
+        """Инициализирует пустое хранилище."""
+        self.salary_from = array("d")
+        self.salary_to = array("d")
+        self.rub_salary = array("d")
+        self.published = array("q")
+        self.year = array("H")
+        self.name_codes = array("I")
+        self.area_name_codes = array("I")
+        self.salary_currency_codes = array("I")
+        self.experience_id_codes = array("I")
+        self.names = StringDictionary()
+        self.area_names = StringDictionary()
+        self.salary_currencies = StringDictionary()
+        self.experience_ids = StringDictionary()
+
+    def __len__(self):
+        return len(self.year)
+
+    @staticmethod
+    def parse_timestamp(published_at):
+        """Переводит дату публикации в секунды Unix без вызова strptime.
+
+        Args:
+            published_at (str): Дата публикации вида "2007-12-03T17:47:55+0300"
+
+        Returns:
+            int: Время публикации в секундах Unix
+
+        >>> VacancyColumns.parse_timestamp("1970-01-01T03:00:00+0300")
+        0
+        >>> VacancyColumns.parse_timestamp("2007-12-03T17:47:55+0300")
+        1196693275
+        """
+        offset = int(published_at[20:22]) * 3600 + int(published_at[22:24]) * 60
+        if published_at[19] == "-":
+            offset = -offset
+        return calendar.timegm((int(published_at[0:4]), int(published_at[5:7]), int(published_at[8:10]),
+                                int(published_at[11:13]), int(published_at[14:16]), int(published_at[17:19]))) \
+            - offset
+
+    @staticmethod
+    def get_published(published_at):
+        """Возвращает время публикации или None, если дату не удается разобрать. По этому правилу
+        вакансии с некорректной датой пропускают и колоночное хранилище, и потоковая статистика.
+
+        Args:
+            published_at (str): Дата публикации вида "2007-12-03T17:47:55+0300"
+
+        Returns:
+            int: Время публикации в секундах Unix или None
+
+        >>> VacancyColumns.get_published("вчера") is None
+        True
+        """
+        try:
+            return VacancyColumns.parse_timestamp(published_at or "")
+        except (ValueError, IndexError):
+            return None
+
+    def append(self, vacancy_dictionary, exchange_rates=None):
+        """Добавляет вакансию в хранилище. Вакансии с некорректной датой публикации пропускаются.
+
+        Args:
+            vacancy_dictionary (dict): Словарь с исходными данными о вакансии
+            exchange_rates (ExchangeRates): Исторические курсы валют для перевода зарплаты в рубли
+
+        Returns:
+            bool: Добавлена ли вакансия
+        """
+        published_at = vacancy_dictionary.get("published_at") or ""
+        published = self.get_published(published_at)
+        if published is None:
+            return False
+        salary = Salary.from_vacancy_dictionary(vacancy_dictionary, exchange_rates)
+        if salary is None:
+            self.salary_from.append(float("nan"))
+            self.salary_to.append(float("nan"))
+            self.rub_salary.append(float("nan"))
+        else:
+            self.salary_from.append(salary.salary_from)
+            self.salary_to.append(salary.salary_to)
+            self.rub_salary.append(salary.rub_salary)
+        self.published.append(published)
+        self.year.append(int(published_at[0:4]))
+        self.name_codes.append(self.names.encode(vacancy_dictionary.get("name") or ""))
+        self.area_name_codes.append(self.area_names.encode(vacancy_dictionary.get("area_name") or ""))
+        self.salary_currency_codes.append(self.salary_currencies.encode(
+            vacancy_dictionary.get("salary_currency") or ("RUR" if salary else "")))
+        self.experience_id_codes.append(self.experience_ids.encode(vacancy_dictionary.get("experience_id") or ""))
+        return True
+
+
+class VacancyColumnsTests(TestCase):
+    def test_dictionary_encoding(self):
+        columns = VacancyColumns()
+        for area_name in ("Москва", "Пермь", "Москва"):
+            columns.append({"name": "a", "area_name": area_name, "published_at": "2007-12-03T17:47:55+0300"})
+        self.assertEqual(list(columns.area_name_codes), [0, 1, 0])
+        self.assertEqual(columns.area_names.values, ["Москва", "Пермь"])
+
+    def test_rub_salary(self):
+        columns = VacancyColumns()
+        columns.append({"salary_from": "10", "salary_to": "30.0", "salary_currency": "EUR",
+                        "published_at": "2007-12-03T17:47:55+0300"})
+        self.assertEqual(columns.rub_salary[0], 1198.0)
+
+    def test_missing_salary_is_nan(self):
+        columns = VacancyColumns()
+        columns.append({"name": "a", "published_at": "2007-12-03T17:47:55+0300"})
+        self.assertNotEqual(columns.rub_salary[0], columns.rub_salary[0])
+
+    def test_incorrect_date_is_skipped(self):
+        columns = VacancyColumns()
+        self.assertFalse(columns.append({"name": "a", "published_at": "вчера"}))
+        self.assertEqual(len(columns), 0)
+
+    def test_pickle(self):
+        columns = VacancyColumns()
+        columns.append({"name": "a", "area_name": "Пермь", "published_at": "2007-12-03T17:47:55+0300"})
+        restored = pickle.loads(pickle.dumps(columns))
+        self.assertEqual(restored.area_names.encode("Пермь"), 0)
+
+
+class ProfessionMatcher:
+    """Автомат Ахо-Корасик: находит все названия профессий, входящие подстрокой в строку, за один проход по ней.
+
+    Attributes:
+        patterns (list(str)): Названия профессий
+    """
+
+    def __init__(self, patterns):
+        """Строит автомат по названиям профессий.
+
+        Args:
+            patterns (iterable(str)): Названия профессий
+        """
+        self.patterns = list(patterns)
+        self.transitions = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in pattern:
+                next_state = self.transitions[state].get(char)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][char] = next_state
+                    self.transitions.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += (index,)
+
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fail_state = self.fail[state]
+                while fail_state and char not in self.transitions[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.transitions[fail_state].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """Возвращает номера профессий, названия которых входят в строку.
+
+        Args:
+            text (str): Строка, например название вакансии
+
+        Returns:
+            set(int): Номера профессий в patterns
+
+        >>> sorted(ProfessionMatcher(["аналитик", "аналитик данных", "тик", "java"]).find("аналитик данных"))
+        [0, 1, 2]
+        >>> ProfessionMatcher(["", "java"]).find("python")
+        {0}
+        """
+        transitions, fail, output = self.transitions, self.fail, self.output
+        found = set(output[0])
+        state = 0
+        for char in text:
+            while state and char not in transitions[state]:
+                state = fail[state]
+            state = transitions[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+class ProfessionMatcherTests(TestCase):
+    def test_matches_substring_semantics(self):
+        patterns = ["Аналитик", "аналитик", "Программист", "ист", "1С", "Программист 1С"]
+        names = ["Аналитик", "Бизнес-аналитик", "Программист 1С", "Программист Java", "Тестировщик", "1С:Аналитик"]
+        matcher = ProfessionMatcher(patterns)
+        for name in names:
+            self.assertEqual(matcher.find(name), {i for i, pattern in enumerate(patterns) if pattern in name})
+
+    def test_overlapping_patterns(self):
+        self.assertEqual(ProfessionMatcher(["aa", "aaa"]).find("aaaa"), {0, 1})
+
+
+class VacanciesStatistics:
+    """Накопитель статистики по вакансиям, которую возвращает DataSet.process_vacancies.
+
+    Для каждой группы (год, город, год для выбранной профессии) хранится только SalaryAggregate,
+    поэтому объем памяти зависит от количества групп, а не вакансий. Накопители, собранные
+    по разным чанкам, объединяются методом merge. Статистика по нескольким профессиям собирается
+    за один проход: названия вакансий сопоставляются со всеми профессиями сразу через ProfessionMatcher.
+
+    Attributes:
+        vacancy_names (list(str)): Названия профессий
+        vacancy_name (str): Название первой профессии
+        salary_by_year (dict(str, SalaryAggregate)): Зарплаты по годам
+        salary_by_year_selected_names (list(dict(str, SalaryAggregate))): Зарплаты по годам для каждой профессии
+        salary_by_city (dict(str, SalaryAggregate)): Зарплаты по городам
+    """
+
+    def __init__(self, vacancy_names):
+        """Инициализирует пустой накопитель.
+
+        Args:
+            vacancy_names (str or list(str)): Название профессии или список названий
+        """
+        if isinstance(vacancy_names, str):
+            vacancy_names = [vacancy_names]
+        self.vacancy_names = list(vacancy_names)
+        self.vacancy_name = self.vacancy_names[0]
+        self.matcher = ProfessionMatcher(self.vacancy_names)
+        self.salary_by_year = {}
+        self.salary_by_year_selected_names = [{} for _ in self.vacancy_names]
+        self.salary_by_city = {}
+
+    @property
+    def salary_by_year_selected_name(self):
+        """dict(str, SalaryAggregate): Зарплаты по годам для первой профессии"""
+        return self.salary_by_year_selected_names[0]
+
+    def add_vacancy(self, vacancy):
+        """Добавляет вакансию в статистику. Вакансии без зарплаты и с некорректной датой публикации
+        пропускаются, как и в колоночном хранилище (см. VacancyColumns.get_published).
+
+        Args:
+            vacancy (Vacancy): Вакансия
+        """
+        if vacancy.salary is None or VacancyColumns.get_published(vacancy.published_at) is None:
+            return
+        self.add(vacancy.published_at[0:4], vacancy.area_name, vacancy.salary.rub_salary,
+                 self.matcher.find(vacancy.name))
+
+    def add(self, year, area_name, rub_salary, selected_names):
+        """Добавляет зарплату вакансии в статистику.
+
+        Args:
+            year (str): Год публикации
+            area_name (str): Город
+            rub_salary (float): Зарплата в рублях
+            selected_names (iterable(int)): Номера профессий, к которым относится вакансия
+        """
+        if year not in self.salary_by_year:
+            self.salary_by_year[year] = SalaryAggregate()
+        self.salary_by_year[year].add(rub_salary)
+
+        if area_name not in self.salary_by_city:
+            self.salary_by_city[area_name] = SalaryAggregate()
+        self.salary_by_city[area_name].add(rub_salary)
+
+        for index in selected_names:
+            salary_by_year_selected_name = self.salary_by_year_selected_names[index]
+            if year not in salary_by_year_selected_name:
+                salary_by_year_selected_name[year] = SalaryAggregate()
+            salary_by_year_selected_name[year].add(rub_salary)
+
+    def add_columns(self, columns):
+        """Добавляет в статистику все вакансии колоночного хранилища. Названия профессий
+        ищутся один раз для каждого уникального названия вакансии.
+
+        Args:
+            columns (VacancyColumns): Колоночное хранилище вакансий
+        """
+        selected_names = [tuple(self.matcher.find(name)) for name in columns.names.values]
+        years = {}
+        for year, area_code, name_code, rub_salary in zip(columns.year, columns.area_name_codes,
+                                                          columns.name_codes, columns.rub_salary):
+            if rub_salary != rub_salary:
+                continue
+            if year not in years:
+                years[year] = str(year)
+            self.add(years[year], columns.area_names[area_code], rub_salary, selected_names[name_code])
+
+    def add_rows(self, rows):
+        """Добавляет в статистику ряды с зарплатой в рублях, например из хранилища SQLite.
+        Названия профессий ищутся один раз для каждого уникального названия вакансии.
+
+        Args:
+            rows (iterable(tuple)): Ряды (год, город, зарплата в рублях, название вакансии)
+        """
+        selected_names = {}
+        for year, area_name, rub_salary, name in rows:
+            if name not in selected_names:
+                selected_names[name] = tuple(self.matcher.find(name or ""))
+            self.add(str(year), area_name, rub_salary, selected_names[name])
+
+    def merge(self, other):
+        """Добавляет к накопителю статистику другого накопителя с теми же профессиями.
+
+        Args:
+            other (VacanciesStatistics): Накопитель, собранный по другой части данных
+
+        Returns:
+            VacanciesStatistics: Текущий накопитель
+        """
+        self.salary_by_year = concat_vacancy_dictionaries([self.salary_by_year, other.salary_by_year])
+        self.salary_by_year_selected_names = [concat_vacancy_dictionaries([own, others]) for own, others
+                                              in zip(self.salary_by_year_selected_names,
+                                                     other.salary_by_year_selected_names)]
+        self.salary_by_city = concat_vacancy_dictionaries([self.salary_by_city, other.salary_by_city])
+        return self
+
+    def get_processed_data(self, vacancy_name=None):
+        """Возвращает статистику в формате DataSet.process_vacancies.
+
+        Args:
+            vacancy_name (str): Название профессии, по умолчанию - первая профессия
+
+        Returns:
+            tuple: Данные о вакансиях, см. DataSet.process_vacancies
+        """
+        if vacancy_name is None:
+            vacancy_name = self.vacancy_name
+        salary_by_year_selected_name = self.salary_by_year_selected_names[self.vacancy_names.index(vacancy_name)]
+        vacancies_average_salary_by_year = {}
+        vacancies_count_by_year = {}
+        vacancies_average_salary_by_year_selected_name = {}
+        vacancies_count_by_year_selected_name = {}
+        for year, aggregate in self.salary_by_year.items():
+            vacancies_average_salary_by_year[year] = int(aggregate.mean())
+            vacancies_count_by_year[year] = aggregate.count
+            selected = salary_by_year_selected_name.get(year)
+            vacancies_average_salary_by_year_selected_name[year] = int(selected.mean()) if selected else 0
+            vacancies_count_by_year_selected_name[year] = selected.count if selected else 0
+        vacancies_count_by_city = {city: aggregate.count for city, aggregate in self.salary_by_city.items()}
+
+        return vacancies_average_salary_by_year, \
+               vacancies_count_by_year, \
+               vacancies_average_salary_by_year_selected_name, \
+               vacancies_count_by_year_selected_name, \
+               vacancies_count_by_city, \
+               self.salary_by_city, \
+               vacancy_name
+
+    def get_batch_processed_data(self):
+        """Возвращает статистику для каждой профессии.
+
+        Returns:
+            dict(str, tuple): Данные о вакансиях по названиям профессий, см. DataSet.process_vacancies
+        """
+        return {vacancy_name: self.get_processed_data(vacancy_name) for vacancy_name in self.vacancy_names}
+
+
+class VacancyNameIndex:
+    """Инвертированный индекс по названиям вакансий колоночного хранилища: триграммы приведенных
+    к одному регистру названий указывают на коды названий, а коды названий - на номера рядов по годам.
+
+    Поиск профессии сводится к пересечению списков триграмм и проверке подстроки на небольшом
+    множестве кандидатов, без прохода по всем вакансиям. Индекс дополняется при появлении новых рядов
+    в хранилище и сохраняется через pickle (например, в ParseCache).
+
+    Attributes:
+        postings (dict(str, array('I'))): Коды названий по триграммам
+        rows_by_name (dict(int, dict(int, array('I')))): Номера рядов с зарплатой по кодам названий и годам
+        years (list(int)): Годы рядов с зарплатой в порядке первого появления
+        indexed_names (int): Количество проиндексированных названий
+        indexed_rows (int): Количество проиндексированных рядов
+    """
+    gram_size = 3
+
+    def __init__(self):
+        """Инициализирует пустой индекс."""
+        self.postings = {}
+        self.rows_by_name = {}
+        self.years = []
+        self.indexed_names = 0
+        self.indexed_rows = 0
+
+    @staticmethod
+    def get_grams(text):
+        """Возвращает триграммы строки, приведенной к одному регистру.
+
+        Args:
+            text (str): Строка
+
+        Returns:
+            set(str): Триграммы
+
+        >>> sorted(VacancyNameIndex.get_grams("Java"))
+        ['ava', 'jav']
+        """
+        text = text.casefold()
+        return {text[i:i + VacancyNameIndex.gram_size] for i in range(len(text) - VacancyNameIndex.gram_size + 1)}
+
+    def update(self, columns):
+        """Индексирует названия и ряды, добавленные в хранилище после предыдущего обновления.
+
+        Args:
+            columns (VacancyColumns): Колоночное хранилище вакансий
+        """
+        for name_code in range(self.indexed_names, len(columns.names)):
+            for gram in self.get_grams(columns.names[name_code]):
+                if gram not in self.postings:
+                    self.postings[gram] = array("I")
+                self.postings[gram].append(name_code)
+        self.indexed_names = len(columns.names)
+
+        known_years = set(self.years)
+        for row in range(self.indexed_rows, len(columns)):
+            if columns.rub_salary[row] != columns.rub_salary[row]:
+                continue
+            year = columns.year[row]
+            if year not in known_years:
+                known_years.add(year)
+                self.years.append(year)
+            rows_by_year = self.rows_by_name.setdefault(columns.name_codes[row], {})
+            if year not in rows_by_year:
+                rows_by_year[year] = array("I")
+            rows_by_year[year].append(row)
+        self.indexed_rows = len(columns)
+
+    def find_names(self, columns, vacancy_name):
+        """Находит коды названий, в которые входит подстрока vacancy_name.
+
+        Args:
+            columns (VacancyColumns): Колоночное хранилище вакансий
+            vacancy_name (str): Название профессии
+
+        Returns:
+            list(int): Коды названий
+        """
+        grams = self.get_grams(vacancy_name)
+        if grams:
+            if not all(gram in self.postings for gram in grams):
+                return []
+            grams = sorted(grams, key=lambda gram: len(self.postings[gram]))
+            candidates = set(self.postings[grams[0]])
+            for gram in grams[1:]:
+                candidates.intersection_update(self.postings[gram])
+                if not candidates:
+                    return []
+        else:
+            candidates = range(self.indexed_names)
+        return sorted(code for code in candidates if vacancy_name in columns.names[code])
+
+    def get_salary_by_year(self, columns, vacancy_name):
+        """Собирает зарплаты по годам для профессии по рядам-кандидатам.
+
+        Args:
+            columns (VacancyColumns): Колоночное хранилище вакансий
+            vacancy_name (str): Название профессии
+
+        Returns:
+            dict(int, SalaryAggregate): Зарплаты по годам
+        """
+        salary_by_year = {}
+        for name_code in self.find_names(columns, vacancy_name):
+            for year, rows in self.rows_by_name.get(name_code, {}).items():
+                if year not in salary_by_year:
+                    salary_by_year[year] = SalaryAggregate()
+                aggregate = salary_by_year[year]
+                for row in rows:
+                    aggregate.add(columns.rub_salary[row])
+        return salary_by_year
+
+    def get_selected_name_series(self, columns, vacancy_name):
+        """Возвращает динамику зарплат и количества вакансий по годам для профессии
+        в формате process_vacancies.
+
+        Args:
+            columns (VacancyColumns): Колоночное хранилище вакансий
+            vacancy_name (str): Название профессии
+
+        Returns:
+            vacancies_average_salary_by_year_selected_name (dict): Динамика уровня зарплат по годам
+            vacancies_count_by_year_selected_name (dict): Динамика количества вакансий по годам
+        """
+        salary_by_year = self.get_salary_by_year(columns, vacancy_name)
+        vacancies_average_salary_by_year_selected_name = {}
+        vacancies_count_by_year_selected_name = {}
+        for year in self.years:
+            aggregate = salary_by_year.get(year)
+            vacancies_average_salary_by_year_selected_name[str(year)] = int(aggregate.mean()) if aggregate else 0
+            vacancies_count_by_year_selected_name[str(year)] = aggregate.count if aggregate else 0
+        return vacancies_average_salary_by_year_selected_name, vacancies_count_by_year_selected_name
+
+
+class VacancyNameIndexTests(TestCase):
+    def setUp(self):
+        self.columns = VacancyColumns()
+        for name, salary, published_at in [("Аналитик", "100", "2007-01-01T00:00:00+0300"),
+                                           ("Бизнес-аналитик", "200", "2008-01-01T00:00:00+0300"),
+                                           ("Программист 1С", "300", "2008-01-01T00:00:00+0300"),
+                                           ("Аналитик", "400", "2008-01-01T00:00:00+0300")]:
+            self.columns.append({"name": name, "salary": salary, "published_at": published_at})
+        self.index = VacancyNameIndex()
+        self.index.update(self.columns)
+
+    def test_substring_is_case_sensitive(self):
+        self.assertEqual(self.index.find_names(self.columns, "Аналитик"), [0])
+
+    def test_short_query(self):
+        self.assertEqual(self.index.find_names(self.columns, "1С"), [2])
+
+    def test_series(self):
+        self.assertEqual(self.index.get_selected_name_series(self.columns, "налитик"),
+                         ({"2007": 100, "2008": 300}, {"2007": 1, "2008": 2}))
+
+    def test_incremental_update(self):
+        self.columns.append({"name": "Аналитик", "salary": "700", "published_at": "2009-01-01T00:00:00+0300"})
+        self.index.update(self.columns)
+        self.assertEqual(self.index.get_selected_name_series(self.columns, "Аналитик")[1],
+                         {"2007": 1, "2008": 1, "2009": 1})
+
+
+class ParseCache:
+    """Бинарный кэш распарсенного csv файла, хранящийся рядом с ним в файле "*****.csv.cache".
+
+    Кэш привязан к отпечатку исходного файла: пути, размеру, времени изменения и хэшу содержимого.
+    Если время изменения отличается, а хэш совпадает, кэш остается действительным.
+
+    Attributes:
+        file_name (str): Название исходного файла
+        cache_name (str): Название файла кэша
+        key (str): Параметры парсинга, от которых зависят данные кэша, например хэш таблицы курсов
+    """
+    version = 3
+
+    def __init__(self, file_name, suffix=".cache", key=None):
+        """Инициализирует кэш исходного файла.
+
+        Args:
+            file_name (str): Название файла в формате "*****.csv"
+            suffix (str): Суффикс файла кэша, позволяет хранить рядом несколько кэшей
+            key (str): Параметры парсинга; кэш, сохраненный с другим key, считается устаревшим
+        """
+        self.file_name = file_name
+        self.cache_name = file_name + suffix
+        self.key = key
+
+    @staticmethod
+    def get_content_hash(file_name, block_size=1 << 20):
+        """Вычисляет хэш содержимого файла.
+
+        Args:
+            file_name (str): Название файла
+            block_size (int): Размер блока чтения
+
+        Returns:
+            str: sha1 хэш содержимого
+        """
+        content_hash = hashlib.sha1()
+        with open(file_name, mode="rb") as f:
+            for block in iter(partial(f.read, block_size), b""):
+                content_hash.update(block)
+        return content_hash.hexdigest()
+
+    def get_fingerprint(self):
+        """Возвращает отпечаток исходного файла без хэша содержимого.
+
+        Returns:
+            dict: Путь, размер и время изменения файла
+        """
+        stat = os.stat(self.file_name)
+        return {"path": os.path.abspath(self.file_name), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+    def load(self):
+        """Загружает данные из кэша, если он соответствует исходному файлу.
+
+        Returns:
+            object: Сохраненные данные или None, если кэша нет или он устарел
+        """
+        try:
+            with open(self.cache_name, mode="rb") as f:
+                header = pickle.load(f)
+                fingerprint = self.get_fingerprint()
+                if header.get("version") != self.version or header.get("key") != self.key or \
+                        any(header["fingerprint"][key] != fingerprint[key] for key in ("path", "size")):
+                    return None
+                if header["fingerprint"]["mtime"] != fingerprint["mtime"] and \
+                        header["content_hash"] != self.get_content_hash(self.file_name):
+                    return None
+                data = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, KeyError, AttributeError):
+            return None
+        if header["fingerprint"]["mtime"] != fingerprint["mtime"]:
+            self.save(data, header["content_hash"])
+        return data
+
+    def save(self, data, content_hash=None):
+        """Сохраняет данные в кэш вместе с отпечатком исходного файла.
+
+        Args:
+            data (object): Данные
+            content_hash (str): Уже вычисленный хэш содержимого исходного файла
+        """
+        header = {"version": self.version,
+                  "key": self.key,
+                  "fingerprint": self.get_fingerprint(),
+                  "content_hash": content_hash or self.get_content_hash(self.file_name)}
+        temporary_name = self.cache_name + ".tmp"
+        with open(temporary_name, mode="wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_name, self.cache_name)
+
+
 class DataSet:
     """ Класс для обработки входных данных в формате CSV.
 
     Attributes:
         file_name (str): Название файла в формате "*****.csv"
-        vacancies_objects (list): Список вакансий в виде объектов обработанных csv парсером.
+        streaming (bool): Потоковый режим - вакансии не хранятся в памяти, а читаются из файла при обработке
+        use_cache (bool): Использовать бинарный кэш распарсенного файла (ParseCache)
+        exchange_rates (ExchangeRates): Исторические курсы валют. Если None, используется словарь Salary.currency_to_rub
+        vacancies_columns (VacancyColumns): Вакансии в колоночном хранилище. В потоковом режиме равен None.
+        name_index (VacancyNameIndex): Индекс по названиям вакансий, строится при первом запросе
+        file_rows (int): Количество рядов самого файла в vacancies_columns, без чанков из add_chunk
+        statistics_fields (set(str)): Поля, которые нужны для статистики. Остальные поля при парсинге
+                                      только проверяются на пустоту, но не очищаются и не сохраняются.
     """
+    statistics_fields = {"name", "salary_from", "salary_to", "salary_currency", "salary",
+                         "area_name", "published_at", "experience_id"}
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, streaming=False, use_cache=False, exchange_rates=None):
         """Инициализирует Dataset, выполняет парсинг CSV файла
 
         Args:
             file_name (str): Название файла в формате "*****.csv"
+            streaming (bool): Потоковый режим. Если True, файл не парсится заранее, а вакансии
+                              передаются генератором прямо в process_vacancies за один проход.
+            use_cache (bool): Загружать вакансии из кэша, если он действителен. В обычном режиме
+                              устаревший или отсутствующий кэш пересоздается.
+            exchange_rates (ExchangeRates): Исторические курсы валют для перевода зарплат в рубли
         """
         self.file_name = file_name
-        self.vacancies_objects = self.csv_OOP_parser(file_name)
+        self.streaming = streaming
+        self.use_cache = use_cache
+        self.exchange_rates = exchange_rates
+        self.name_index = None
+        if streaming:
+            self.vacancies_columns = None
+        elif use_cache:
+            self.vacancies_columns = self.load_columns(file_name, exchange_rates)
+        else:
+            self.vacancies_columns = self.csv_columns_parser(file_name, exchange_rates=exchange_rates)
+        self.file_rows = len(self.vacancies_columns) if self.vacancies_columns is not None else 0
 
     @staticmethod
     def remove_html(string):
@@ -250,12 +1362,14 @@ class DataSet:
         return s
 
     @staticmethod
-    def fill_vacancy_dictionary(field_names, row):
+    def fill_vacancy_dictionary(field_names, row, columns=None):
         """Заполняет словарь вакансии, ключами которого являются названия входных полей.
+        Ряд проверяется целиком, но очищаются и сохраняются только поля из columns.
 
         Args:
             field_names (list(str)) : Список полей вакансии, полученный из заголовка таблицы
             row (list(str)): Ряд таблицы, содержащий данные о вакансии
+            columns (set(str)): Требуемые поля, по умолчанию - все поля
 
         Returns:
             dict: Словарь с ключами-заголовками field_names и соответствующими им полями вакансии
@@ -270,6 +1384,10 @@ class DataSet:
         0
         >>> DataSet.fill_vacancy_dictionary(['name'], [''])
         0
+        >>> DataSet.fill_vacancy_dictionary(['name', 'description'], ['<b>Олег</b>', '<p>...</p>'], {'name'})
+        {'name': 'Олег'}
+        >>> DataSet.fill_vacancy_dictionary(['name', 'description'], ['Олег', ''], {'name'})
+        0
         """
         vacancy_dictionary = {}
         if len(row) != len(field_names):
@@ -277,39 +1395,208 @@ class DataSet:
         for i in range(len(field_names)):
             if len(row[i]) == 0:
                 return 0
-            DataSet.repair_string(row[i])
-            vacancy_dictionary[field_names[i]] = row[i]
+            if columns is None or field_names[i] in columns:
+                vacancy_dictionary[field_names[i]] = DataSet.repair_string(row[i])
         return vacancy_dictionary
 
     def slice_parse_year(self, date_string):
         return date_string[0:4]
 
-    def csv_OOP_parser(self, file_name):
-        """Парсер csv файла.
+    @staticmethod
+    def vacancies_generator(field_names, reader, columns=None, exchange_rates=None):
+        """Генератор вакансий из рядов csv таблицы. Некорректные ряды пропускаются.
 
         Args:
-            file_name (str): Название файла в формате "*****.csv"
+            field_names (list(str)) : Список полей вакансии, полученный из заголовка таблицы
+            reader (iterable(list(str))): Ряды таблицы
+            columns (set(str)): Требуемые поля, по умолчанию - все поля
+            exchange_rates (ExchangeRates): Исторические курсы валют
 
-        Returns:
-            list(Vacancy): Список вакансий в виде объектов
-        """
-        f = open(file_name, mode="r", encoding="utf-8-sig")
-        reader = csv.reader(f)
-        try:
-            field_names = next(reader)
-        except:
-            return 0
+        Yields:
+            Vacancy: Вакансия в виде объекта
 
-        vacancies_objects = []
+        >>> [v.name for v in DataSet.vacancies_generator(["name", "area_name"], [["a", "b"], ["c", ""], ["d", "e"]])]
+        ['a', 'd']
+        """
         for row in reader:
             if len(row) < len(field_names):
                 continue
-            vacancy_dict = self.fill_vacancy_dictionary(field_names, row)
+            vacancy_dict = DataSet.fill_vacancy_dictionary(field_names, row, columns)
             if vacancy_dict == 0:
                 continue
-            vacancy = Vacancy(vacancy_dict)
-            vacancies_objects.append(vacancy)
-        return vacancies_objects
+            yield Vacancy(vacancy_dict, exchange_rates)
+
+    @staticmethod
+    def csv_columns_parser(file_name, columns=None, exchange_rates=None):
+        """Парсер csv файла в колоночное хранилище.
+
+        Args:
+            file_name (str): Название файла в формате "*****.csv"
+            columns (VacancyColumns): Хранилище, в которое добавляются вакансии, по умолчанию - новое
+            exchange_rates (ExchangeRates): Исторические курсы валют
+
+        Returns:
+            VacancyColumns: Вакансии в колоночном хранилище
+        """
+        if columns is None:
+            columns = VacancyColumns()
+        with open(file_name, mode="r", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            field_names = next(reader, [])
+            for row in reader:
+                vacancy_dict = DataSet.fill_vacancy_dictionary(field_names, row, DataSet.statistics_fields)
+                if vacancy_dict == 0:
+                    continue
+                columns.append(vacancy_dict, exchange_rates)
+        return columns
+
+    @staticmethod
+    def load_columns(file_name, exchange_rates=None):
+        """Возвращает колоночное хранилище из кэша или парсит файл и сохраняет его в кэш.
+
+        Args:
+            file_name (str): Название файла в формате "*****.csv"
+            exchange_rates (ExchangeRates): Исторические курсы валют
+
+        Returns:
+            VacancyColumns: Вакансии в колоночном хранилище
+        """
+        cache = ParseCache(file_name, key=DataSet.get_cache_key(exchange_rates))
+        columns = cache.load()
+        if columns is None:
+            columns = DataSet.csv_columns_parser(file_name, exchange_rates=exchange_rates)
+            cache.save(columns)
+        return columns
+
+    @staticmethod
+    def get_cache_key(exchange_rates):
+        """Возвращает ключ кэша, зависящий от курсов, по которым переведены зарплаты.
+
+        Args:
+            exchange_rates (ExchangeRates): Исторические курсы валют
+
+        Returns:
+            str: Хэш таблицы курсов или None для словаря Salary.currency_to_rub
+        """
+        return exchange_rates.get_key() if exchange_rates is not None else None
+
+    @staticmethod
+    def csv_vacancies_generator(file_name, exchange_rates=None):
+        """Потоковый парсер csv файла: читает файл построчно, не сохраняя вакансии в памяти.
+
+        Args:
+            file_name (str): Название файла в формате "*****.csv"
+            exchange_rates (ExchangeRates): Исторические курсы валют
+
+        Yields:
+            Vacancy: Вакансия в виде объекта
+        """
+        with open(file_name, mode="r", encoding="utf-8-sig") as f:
+            reader = csv.reader(f)
+            field_names = next(reader, None)
+            if field_names is None:
+                return
+            yield from DataSet.vacancies_generator(field_names, reader, DataSet.statistics_fields, exchange_rates)
+
+    def add_chunk(self, file_name):
+        """Добавляет в DataSet вакансии из нового чанка и дополняет индекс по названиям, если он построен.
+
+        Args:
+            file_name (str): Название файла чанка
+        """
+        self.csv_columns_parser(file_name, self.vacancies_columns, self.exchange_rates)
+        if self.name_index is not None:
+            self.name_index.update(self.vacancies_columns)
+
+    def get_indexed_columns(self):
+        """Возвращает колоночное хранилище, по которому строится индекс по названиям. В потоковом режиме
+        хранилище загружается из кэша, как в aggregate_vacancies, и остается в DataSet.
+
+        Returns:
+            VacancyColumns: Вакансии в колоночном хранилище
+
+        Raises:
+            ValueError: Потоковый режим без действительного кэша - индексу не по чему строиться
+        """
+        if self.vacancies_columns is None and self.streaming and self.use_cache:
+            self.vacancies_columns = ParseCache(self.file_name, key=self.get_cache_key(self.exchange_rates)).load()
+            self.file_rows = len(self.vacancies_columns) if self.vacancies_columns is not None else 0
+        if self.vacancies_columns is None:
+            raise ValueError("Индекс по названиям строится по колоночному хранилищу: используйте DataSet "
+                             "без streaming или с use_cache и сохраненным кэшем")
+        return self.vacancies_columns
+
+    def get_name_index(self):
+        """Возвращает индекс по названиям вакансий, строя его при первом вызове.
+        При use_cache индекс сохраняется рядом с файлом в "*****.csv.index". В кэше хранится индекс только
+        по рядам самого файла: индекс с другим количеством рядов не загружается, индекс, включающий ряды
+        чанков из add_chunk, не сохраняется. Загруженный индекс дополняется рядами чанков.
+
+        Returns:
+            VacancyNameIndex: Индекс по названиям вакансий
+        """
+        if self.name_index is None:
+            columns = self.get_indexed_columns()
+            cache = ParseCache(self.file_name, ".index", self.get_cache_key(self.exchange_rates)) \
+                if self.use_cache else None
+            self.name_index = cache.load() if cache else None
+            if self.name_index is not None and self.name_index.indexed_rows != self.file_rows:
+                self.name_index = None
+            if self.name_index is None:
+                self.name_index = VacancyNameIndex()
+                self.name_index.update(columns)
+                if cache and len(columns) == self.file_rows:
+                    cache.save(self.name_index)
+            else:
+                self.name_index.update(columns)
+        return self.name_index
+
+    def get_selected_name_series(self, vacancy_name):
+        """Возвращает динамику зарплат и количества вакансий по годам для профессии с помощью индекса,
+        без прохода по всем вакансиям.
+
+        Args:
+            vacancy_name (str): Название профессии
+
+        Returns:
+            tuple(dict, dict): Элементы 2 и 3 результата process_vacancies
+
+        Raises:
+            ValueError: Потоковый режим без действительного кэша (см. get_indexed_columns)
+        """
+        name_index = self.get_name_index()
+        return name_index.get_selected_name_series(self.vacancies_columns, vacancy_name)
+
+    def aggregate_vacancies(self, vacancy_name):
+        """Собирает статистику по вакансиям за один проход.
+
+        Args:
+            vacancy_name (str or list(str)): Название вакансии или список названий
+
+        Returns:
+            VacanciesStatistics: Накопитель статистики
+        """
+        statistics = VacanciesStatistics(vacancy_name)
+        columns = self.vacancies_columns
+        if self.streaming and self.use_cache:
+            columns = ParseCache(self.file_name, key=self.get_cache_key(self.exchange_rates)).load()
+        if columns is not None:
+            statistics.add_columns(columns)
+            return statistics
+        for vacancy in self.csv_vacancies_generator(self.file_name, self.exchange_rates):
+            statistics.add_vacancy(vacancy)
+        return statistics
+
+    def process_vacancies_batch(self, vacancy_names):
+        """Обрабатывает вакансии для нескольких профессий за один проход.
+
+        Args:
+            vacancy_names (list(str)): Названия профессий
+
+        Returns:
+            dict(str, tuple): Данные о вакансиях по названиям профессий, см. process_vacancies
+        """
+        return self.aggregate_vacancies(vacancy_names).get_batch_processed_data()
 
     def process_vacancies(self, vacancy_name):
         """Обрабатывает вакансии и возвращает данные о них по категориям.
@@ -324,67 +1611,10 @@ class DataSet:
                                                                                                 для выбранной профессии
             vacancies_count_by_year_selected_name (dict): Динамика количества вакансий по годам для выбранной профессии
             vacancies_count_by_city (dict): Количество вакансий по городам
-            vacancies_salary_sum_by_city (dict): Сумма зарплат по городам
+            vacancies_salary_sum_by_city (dict(str, SalaryAggregate)): Агрегаты зарплат по городам
             vacancy_name (str): Название вакансии
         """
-        vacancies_average_salary_by_year = {}
-        vacancies_count_by_year = {}
-        vacancies_average_salary_by_year_selected_name = {}
-        vacancies_count_by_year_selected_name = {}
-        vacancies_salary_sum_by_city = {}
-        vacancies_count_by_city = {}
-        vacancies_objects = self.vacancies_objects
-        for vacancy in vacancies_objects:
-            try:
-                vacancy.salary.rub_salary
-            except:
-                continue
-            year = self.slice_parse_year(vacancy.published_at)
-            if vacancy.area_name in vacancies_count_by_city:
-                vacancies_count_by_city[vacancy.area_name] += 1
-            else:
-                vacancies_count_by_city[vacancy.area_name] = 1
-
-            if year in vacancies_count_by_year:
-                vacancies_count_by_year[year] += 1
-            else:
-                vacancies_count_by_year[year] = 1
-                vacancies_count_by_year_selected_name[year] = 0
-
-            if year in vacancies_average_salary_by_year:
-                vacancies_average_salary_by_year[year].append(vacancy.salary.rub_salary)
-            else:
-                vacancies_average_salary_by_year[year] = [vacancy.salary.rub_salary]
-                vacancies_average_salary_by_year_selected_name[year] = 0
-
-            if vacancy.area_name in vacancies_salary_sum_by_city:
-                vacancies_salary_sum_by_city[vacancy.area_name].append(vacancy.salary.rub_salary)
-            else:
-                vacancies_salary_sum_by_city[vacancy.area_name] = [vacancy.salary.rub_salary]
-
-            if vacancy_name in vacancy.name:
-                if year in vacancies_count_by_year_selected_name:
-                    vacancies_count_by_year_selected_name[year] += 1
-
-                if vacancies_average_salary_by_year_selected_name[year] == 0:
-                    vacancies_average_salary_by_year_selected_name[year] = [vacancy.salary.rub_salary]
-                else:
-                    vacancies_average_salary_by_year_selected_name[year].append(vacancy.salary.rub_salary)
-        
-        for key in vacancies_average_salary_by_year:
-            vacancies_average_salary_by_year[key] = int(mean(vacancies_average_salary_by_year[key]))
-        for key in vacancies_average_salary_by_year_selected_name:
-            if vacancies_average_salary_by_year_selected_name[key] != 0:
-                vacancies_average_salary_by_year_selected_name[key] = int(
-                    mean(vacancies_average_salary_by_year_selected_name[key]))
-
-        return vacancies_average_salary_by_year, \
-               vacancies_count_by_year, \
-               vacancies_average_salary_by_year_selected_name, \
-               vacancies_count_by_year_selected_name, \
-               vacancies_count_by_city, \
-               vacancies_salary_sum_by_city, \
-               vacancy_name
+        return self.aggregate_vacancies(vacancy_name).get_processed_data()
 
     @staticmethod
     def get_fraction_by_city(processed_data):
@@ -415,7 +1645,7 @@ class DataSet:
         city_count = sum(processed_data[4].values())
         one_percent = floor(city_count / 100)
         for key in processed_data[4]:
-            vacancies_average_salary_by_city[key] = int(mean(processed_data[5][key]))
+            vacancies_average_salary_by_city[key] = int(processed_data[5][key].mean())
         vacancies_top_average_salary_by_city = {k: v
                                                 for k, v in sorted(vacancies_average_salary_by_city.items(),
                                                                     reverse=True,
@@ -424,22 +1654,189 @@ class DataSet:
         return vacancies_top_average_salary_by_city
 
 
-def vacancies_without_multiprocessing(file_name, vacancy_name):
-
-    start = time.time()
-    dataset = DataSet(file_name)
-    processed_data = dataset.process_vacancies(vacancy_name)
-
+class DataSetTests(TestCase):
+    csv_data = ("name,salary_from,salary_to,salary_currency,area_name,published_at\n"
+                "Аналитик,10000,20000,RUR,Москва,2007-12-03T17:47:55+0300\n"
+                "Программист,30000,40000,RUR,Казань,2007-12-04T17:47:55+0300\n"
+                "\"Аналитик\nданных\",100,200,EUR,Москва,2008-01-03T17:47:55+0300\n"
+                "Повар,,20000,RUR,Москва,2008-01-03T17:47:55+0300\n"
+                "Аналитик,50000,50000,RUR,Пермь,2008-02-03T17:47:55+0300\n")
+
+    def setUp(self):
+        fd, self.file_name = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w", encoding="utf-8-sig") as f:
+            f.write(self.csv_data)
+
+    def tearDown(self):
+        os.remove(self.file_name)
+        for suffix in (".cache", ".index"):
+            if os.path.exists(self.file_name + suffix):
+                os.remove(self.file_name + suffix)
+
+    def test_streaming_does_not_store_vacancies(self):
+        self.assertIsNone(DataSet(self.file_name, streaming=True).vacancies_columns)
+
+    def test_streaming_process_vacancies_equals_list_mode(self):
+        self.assertEqual(DataSet(self.file_name, streaming=True).process_vacancies("Аналитик"),
+                         DataSet(self.file_name).process_vacancies("Аналитик"))
+
+    def test_batch_equals_single_name(self):
+        vacancy_names = ["Аналитик", "Программист", "ст", "Повар"]
+        batch = DataSet(self.file_name).process_vacancies_batch(vacancy_names)
+        for vacancy_name in vacancy_names:
+            self.assertEqual(batch[vacancy_name], DataSet(self.file_name).process_vacancies(vacancy_name))
+
+    def test_streaming_batch_equals_single_name(self):
+        batch = DataSet(self.file_name, streaming=True).process_vacancies_batch(["Аналитик", "Программист"])
+        self.assertEqual(batch["Программист"], DataSet(self.file_name).process_vacancies("Программист"))
+
+    def test_batch_output_matches_single_name(self):
+        with redirect_stdout(io.StringIO()) as batch_output:
+            vacancies_batch(self.file_name, ["Программист", "Аналитик"])
+        with redirect_stdout(io.StringIO()) as single_output:
+            vacancies_without_multiprocessing(self.file_name, "Программист")
+        batch_lines = batch_output.getvalue().splitlines()
+        single_lines = single_output.getvalue().splitlines()
+        self.assertEqual(len(batch_lines), 9)
+        self.assertEqual(batch_lines[:2], single_lines[:2])
+        self.assertEqual(batch_lines[6:8], single_lines[4:6])
+        self.assertIn("для профессии Аналитик: {'2007': 15000, '2008': 29492}", batch_lines[4])
+
+    def test_name_index_equals_scan(self):
+        dataset = DataSet(self.file_name, use_cache=True)
+        for vacancy_name in ("Аналитик", "Программист", "ст", "данных"):
+            self.assertEqual(dataset.get_selected_name_series(vacancy_name),
+                             dataset.process_vacancies(vacancy_name)[2:4])
+        self.assertIsNotNone(ParseCache(self.file_name, ".index").load())
+
+    def write_chunk(self):
+        fd, file_name = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w", encoding="utf-8-sig") as f:
+            f.write("name,salary_from,salary_to,salary_currency,area_name,published_at\n"
+                    "Аналитик,70000,90000,RUR,Тверь,2009-01-03T17:47:55+0300\n")
+        self.addCleanup(os.remove, file_name)
+        return file_name
+
+    def test_name_index_cache_with_chunk(self):
+        chunk = self.write_chunk()
+        expected = DataSet(self.file_name).process_vacancies("Аналитик")[2:4]
+        dataset = DataSet(self.file_name, use_cache=True)
+        dataset.add_chunk(chunk)
+        with_chunk = dataset.get_selected_name_series("Аналитик")
+        self.assertEqual(with_chunk[1], {"2007": 1, "2008": 2, "2009": 1})
+        self.assertIsNone(ParseCache(self.file_name, ".index").load())
+        self.assertEqual(DataSet(self.file_name, use_cache=True).get_selected_name_series("Аналитик"), expected)
+        self.assertIsNotNone(ParseCache(self.file_name, ".index").load())
+        dataset = DataSet(self.file_name, use_cache=True)
+        dataset.add_chunk(chunk)
+        self.assertEqual(dataset.get_selected_name_series("Аналитик"), with_chunk)
+        self.assertEqual(DataSet(self.file_name, use_cache=True).get_selected_name_series("Аналитик"), expected)
+
+    def test_streaming_name_index(self):
+        with self.assertRaises(ValueError):
+            DataSet(self.file_name, streaming=True).get_selected_name_series("Аналитик")
+        DataSet(self.file_name, use_cache=True)
+        self.assertEqual(DataSet(self.file_name, streaming=True, use_cache=True).get_selected_name_series("Аналитик"),
+                         DataSet(self.file_name).process_vacancies("Аналитик")[2:4])
+
+    def test_cache_equals_csv(self):
+        self.assertEqual(DataSet(self.file_name, use_cache=True).process_vacancies("Аналитик"),
+                         DataSet(self.file_name).process_vacancies("Аналитик"))
+        self.assertEqual(DataSet(self.file_name, use_cache=True).process_vacancies("Аналитик"),
+                         DataSet(self.file_name).process_vacancies("Аналитик"))
+
+    def test_cache_is_rebuilt_when_file_changes(self):
+        DataSet(self.file_name, use_cache=True)
+        with open(self.file_name, "a", encoding="utf-8") as f:
+            f.write("Аналитик,10,10,RUR,Тверь,2010-01-01T00:00:00+0300\n")
+        self.assertEqual(ParseCache(self.file_name).load(), None)
+        self.assertIn("2010", DataSet(self.file_name, use_cache=True).process_vacancies("Аналитик")[1])
+
+    def test_cache_survives_touch(self):
+        DataSet(self.file_name, use_cache=True)
+        stat = os.stat(self.file_name)
+        os.utime(self.file_name, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(ParseCache(self.file_name).load())
+
+    def test_streaming_skips_incorrect_rows(self):
+        self.assertEqual(DataSet(self.file_name, streaming=True).process_vacancies("Аналитик")[1],
+                         {"2007": 2, "2008": 2})
+
+    def test_incorrect_date_is_skipped_in_both_modes(self):
+        with open(self.file_name, "a", encoding="utf-8") as f:
+            f.write("Аналитик,70000,90000,RUR,Тверь,вчера\n"
+                    "Аналитик,70000,90000,RUR,Тверь,2009-01-0\n")
+        streaming = DataSet(self.file_name, streaming=True).process_vacancies("Аналитик")
+        self.assertEqual(streaming, DataSet(self.file_name).process_vacancies("Аналитик"))
+        self.assertEqual(streaming[1], {"2007": 2, "2008": 2})
+        self.assertNotIn("Тверь", streaming[4])
+
+    def test_exchange_rates(self):
+        exchange_rates = ExchangeRates.from_rows(["EUR"], [("2008-01", 50.0)])
+        for dataset in (DataSet(self.file_name, exchange_rates=exchange_rates),
+                        DataSet(self.file_name, streaming=True, exchange_rates=exchange_rates)):
+            self.assertEqual(dataset.process_vacancies("Аналитик")[2], {"2007": 15000, "2008": 28750})
+
+    def test_cache_depends_on_exchange_rates(self):
+        exchange_rates = ExchangeRates.from_rows(["EUR"], [("2008-01", 50.0)])
+        DataSet(self.file_name, use_cache=True)
+        self.assertIsNone(ParseCache(self.file_name, key=exchange_rates.get_key()).load())
+        self.assertEqual(DataSet(self.file_name, use_cache=True, exchange_rates=exchange_rates)
+                         .process_vacancies("Аналитик"),
+                         DataSet(self.file_name, exchange_rates=exchange_rates).process_vacancies("Аналитик"))
+
+
+def print_processed_data(processed_data, start, batch_processed_data=None):
+    """Печатает статистику по вакансиям и время выполнения.
+
+    Args:
+        processed_data (tuple): Данные о вакансиях, см. DataSet.process_vacancies
+        start (float): Время начала обработки
+        batch_processed_data (dict(str, tuple)): Данные для нескольких профессий, см.
+                                                 DataSet.process_vacancies_batch. Если заданы, динамика
+                                                 для профессий печатается по ним, а общая статистика
+                                                 по годам и городам - по processed_data.
+    """
     print(f"Динамика уровня зарплат по годам: {processed_data[0]}")
     print(f"Динамика количества вакансий по годам: {processed_data[1]}")
-    print(f"Динамика уровня зарплат по годам для выбранной профессии: {processed_data[2]}")
-    print(f"Динамика количества вакансий по годам для выбранной профессии: {processed_data[3]}")
+    if batch_processed_data is None:
+        print(f"Динамика уровня зарплат по годам для выбранной профессии: {processed_data[2]}")
+        print(f"Динамика количества вакансий по годам для выбранной профессии: {processed_data[3]}")
+    else:
+        for vacancy_name, vacancy_processed_data in batch_processed_data.items():
+            print(f"Динамика уровня зарплат по годам для профессии {vacancy_name}: {vacancy_processed_data[2]}")
+            print(f"Динамика количества вакансий по годам для профессии {vacancy_name}: {vacancy_processed_data[3]}")
     print(f"Уровень зарплат по городам (в порядке убывания): {dict(list(DataSet.get_top_average_salary_by_city(processed_data).items())[:10])}")
     print(f"Доля вакансий по городам (в порядке убывания): {dict(list(DataSet.get_fraction_by_city(processed_data).items())[:10])}")
     end = time.time() - start
     print(f"Время выполнения: {end}")
 
 
+def vacancies_batch(file_name, vacancy_names, streaming=False, exchange_rates=None):
+    """Печатает статистику для нескольких профессий, собранную за один проход по файлу.
+    Статистика по годам и городам общая для всех профессий и печатается один раз.
+
+    Args:
+        file_name (str): Название файла в формате "*****.csv"
+        vacancy_names (list(str)): Названия профессий
+        streaming (bool): Потоковый режим DataSet
+        exchange_rates (ExchangeRates): Исторические курсы валют
+    """
+    start = time.time()
+    batch_processed_data = DataSet(file_name, streaming, exchange_rates=exchange_rates) \
+        .process_vacancies_batch(vacancy_names)
+    shared_processed_data = batch_processed_data[vacancy_names[0]]
+    print_processed_data(shared_processed_data, start, batch_processed_data)
+
+
+def vacancies_without_multiprocessing(file_name, vacancy_name, streaming=False, exchange_rates=None):
+
+    start = time.time()
+    dataset = DataSet(file_name, streaming, exchange_rates=exchange_rates)
+    processed_data = dataset.process_vacancies(vacancy_name)
+    print_processed_data(processed_data, start)
+
+
 class Report:
     """Класс для формирования отчета в виде таблицы, изображения или PDF файла.
 
@@ -729,113 +2126,319 @@ class Report:
 
 
 def concat_vacancy_dictionaries(dictionaries):
-    """Склеивает словари в один"""
-    result = {k: v for salary_sum_dictionary in dictionaries for k, v in salary_sum_dictionary.items()}
+    """Склеивает словари в один. Значения совпадающих ключей складываются,
+    поэтому год, попавший в несколько чанков, не перезаписывается.
+
+    >>> concat_vacancy_dictionaries([{"2007": 1, "2008": 2}, {"2008": 3, "2009": 4}])
+    {'2007': 1, '2008': 5, '2009': 4}
+    """
+    result = {}
+    for dictionary in dictionaries:
+        for k, v in dictionary.items():
+            result[k] = result[k] + v if k in result else v
     return result
 
-def concurrent_futures_vacancies(vacancy, directory):
-    start = time.time()
-    executor = ProcessPoolExecutor()
-    datasets = executor.map(DataSet, glob.glob(f"{directory}/*.csv"))
-    worker = partial(DataSet.process_vacancies, vacancy_name=vacancy)
-    processed_vacancies = list(executor.map(worker, datasets))
-    
-    vacancies_average_salary_by_year = concat_vacancy_dictionaries([item[0] for item in processed_vacancies])
-    vacancies_count_by_year = concat_vacancy_dictionaries([item[1] for item in processed_vacancies])
-    vacancies_average_salary_by_year_selected_name = concat_vacancy_dictionaries([item[2] for item in processed_vacancies])
-    vacancies_count_by_year_selected_name = concat_vacancy_dictionaries([item[3] for item in processed_vacancies])
-    vacancies_count_by_city = reduce(lambda x, y: x + y, [Counter(item[4]) for item in processed_vacancies])
-    vacancies_salary_sum_by_year = [item[5] for item in processed_vacancies]
-
-    city_count = sum(vacancies_count_by_city.values())
-    one_percent = floor(city_count / 100)
-    vacancies_fraction_by_city = {k: round(v / city_count, 4)
-                                for k, v in sorted(vacancies_count_by_city.items(),
-                                                    reverse=True,
-                                                    key=lambda item: item[1])
-                                if v >= one_percent}
 
-    
-    concatenated_salary_sum = dict()
-    for salary_sum_dictionary in vacancies_salary_sum_by_year:
-        for k in salary_sum_dictionary:
-            if k in concatenated_salary_sum:
-                concatenated_salary_sum[k] += salary_sum_dictionary[k]
-            else:
-                concatenated_salary_sum[k] = salary_sum_dictionary[k]
-    for key in concatenated_salary_sum:
-        concatenated_salary_sum[key] = int(mean(concatenated_salary_sum[key]))
-    vacancies_top_average_salary_by_city = {k: v
-                                            for k, v in sorted(concatenated_salary_sum.items(),
-                                                            reverse=True,
-                                                            key=lambda item: item[1])
-                                            if vacancies_count_by_city[k] >= one_percent}
-    print(f"Динамика уровня зарплат по годам: {vacancies_average_salary_by_year}")
-    print(f"Динамика количества вакансий по годам: {vacancies_count_by_year}")
-    print(f"Динамика уровня зарплат по годам для выбранной профессии: {vacancies_average_salary_by_year_selected_name}")
-    print(f"Динамика количества вакансий по годам для выбранной профессии: {vacancies_count_by_year_selected_name}")
-    print(f"Уровень зарплат по городам (в порядке убывания): {dict(list(vacancies_top_average_salary_by_city.items())[:10])}")
-    print(f"Доля вакансий по городам (в порядке убывания): {dict(list(vacancies_fraction_by_city.items())[:10])}")
-    end = time.time() - start
-    print(f"Время выполнения: {end}")
+def aggregate_vacancies_file(file_name, vacancy_name, exchange_rates=None):
+    """Воркер параллельной обработки: потоково парсит чанк и собирает по нему статистику.
+    Родительскому процессу возвращается только накопитель, а не DataSet со всеми вакансиями.
 
+    Args:
+        file_name (str): Название файла чанка
+        vacancy_name (str): Название вакансии
+        exchange_rates (ExchangeRates): Исторические курсы валют
 
+    Returns:
+        VacanciesStatistics: Статистика по чанку
+    """
+    return DataSet(file_name, streaming=True, exchange_rates=exchange_rates).aggregate_vacancies(vacancy_name)
 
-def multiprocessing_vacancies(vacancy_name, directory):
-        with Pool() as pool:
-            start = time.time()
-            datasets = pool.imap(DataSet, glob.glob(f"{directory}/*.csv"))
-            datasets_with_vacancy_name = [(x,vacancy_name) for x in datasets]
-            processed_vacancies = list(pool.starmap(DataSet.process_vacancies, datasets_with_vacancy_name))
-
-            vacancies_average_salary_by_year = concat_vacancy_dictionaries([item[0] for item in processed_vacancies])
-            vacancies_count_by_year = concat_vacancy_dictionaries([item[1] for item in processed_vacancies])
-            vacancies_average_salary_by_year_selected_name = concat_vacancy_dictionaries([item[2] for item in processed_vacancies])
-            vacancies_count_by_year_selected_name = concat_vacancy_dictionaries([item[3] for item in processed_vacancies])
-            vacancies_count_by_city = reduce(lambda x, y: x + y, [Counter(item[4]) for item in processed_vacancies])
-            vacancies_salary_sum_by_year = [item[5] for item in processed_vacancies]
-
-            city_count = sum(vacancies_count_by_city.values())
-            one_percent = floor(city_count / 100)
-            vacancies_fraction_by_city = {k: round(v / city_count, 4)
-                                        for k, v in sorted(vacancies_count_by_city.items(),
-                                                            reverse=True,
-                                                            key=lambda item: item[1])
-                                        if v >= one_percent}
 
-            concatenated_salary_sum = dict()
-            for salary_sum_dictionary in vacancies_salary_sum_by_year:
-                for k in salary_sum_dictionary:
-                    if k in concatenated_salary_sum:
-                        concatenated_salary_sum[k].extend(salary_sum_dictionary[k])
-                    else:
-                        concatenated_salary_sum[k] = salary_sum_dictionary[k]
+def parallel_process_vacancies(vacancy_name, file_names, pool_factory=Pool, exchange_rates=None):
+    """Параллельно обрабатывает чанки и объединяет статистику по ним.
 
-            concatenated_salary_sum = {k: int(mean(v)) for k, v in concatenated_salary_sum.items()}
+    Args:
+        vacancy_name (str): Название вакансии
+        file_names (list(str)): Файлы чанков
+        pool_factory (callable): Пул процессов - multiprocessing.Pool или ProcessPoolExecutor
+        exchange_rates (ExchangeRates): Исторические курсы валют, передаются в каждый процесс
 
-            vacancies_top_average_salary_by_city = {k: v
-                                                    for k, v in sorted(concatenated_salary_sum.items(),
-                                                                    reverse=True,
-                                                                    key=lambda item: item[1])
-                                                    if vacancies_count_by_city[k] >= one_percent}
-                                                    
-            print(f"Динамика уровня зарплат по годам: {vacancies_average_salary_by_year}")
-            print(f"Динамика количества вакансий по годам: {vacancies_count_by_year}")
-            print(f"Динамика уровня зарплат по годам для выбранной профессии: {vacancies_average_salary_by_year_selected_name}")
-            print(f"Динамика количества вакансий по годам для выбранной профессии: {vacancies_count_by_year_selected_name}")
-            print(f"Уровень зарплат по городам (в порядке убывания): {dict(list(vacancies_top_average_salary_by_city.items())[:10])}")
-            print(f"Доля вакансий по городам (в порядке убывания): {dict(list(vacancies_fraction_by_city.items())[:10])}")
-            end = time.time() - start
-            print(f"Время выполнения: {end}")    
+    Returns:
+        tuple: Данные о вакансиях, см. DataSet.process_vacancies
+    """
+    worker = partial(aggregate_vacancies_file, vacancy_name=vacancy_name, exchange_rates=exchange_rates)
+    with pool_factory() as pool:
+        statistics = list(pool.map(worker, file_names))
+    return reduce(VacanciesStatistics.merge, statistics, VacanciesStatistics(vacancy_name)).get_processed_data()
+
+
+class ParallelProcessVacanciesTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rows = [("Аналитик,10000,20000,RUR,Москва,2007-12-03T17:47:55+0300\n"
+                 "Программист,30000,40000,RUR,Казань,2008-12-04T17:47:55+0300\n"),
+                ("Аналитик,50000,50000,RUR,Пермь,2008-02-03T17:47:55+0300\n"
+                 "Аналитик,100,200,EUR,Москва,2008-01-03T17:47:55+0300\n")]
+        self.file_names = []
+        for i, chunk in enumerate(rows):
+            file_name = os.path.join(self.directory, f"{i}.csv")
+            with open(file_name, "w", encoding="utf-8-sig") as f:
+                f.write("name,salary_from,salary_to,salary_currency,area_name,published_at\n" + chunk)
+            self.file_names.append(file_name)
+        self.whole_file_name = os.path.join(self.directory, "whole.csv")
+        with open(self.whole_file_name, "w", encoding="utf-8-sig") as f:
+            f.write("name,salary_from,salary_to,salary_currency,area_name,published_at\n" + "".join(rows))
+
+    def tearDown(self):
+        for file_name in self.file_names + [self.whole_file_name]:
+            os.remove(file_name)
+        os.rmdir(self.directory)
+
+    def test_year_spanning_chunks_is_merged(self):
+        processed_data = parallel_process_vacancies("Аналитик", self.file_names, partial(ProcessPoolExecutor, 2))
+        self.assertEqual(processed_data[1], {"2007": 1, "2008": 3})
+
+    def test_equals_single_process(self):
+        processed_data = parallel_process_vacancies("Аналитик", self.file_names, partial(ProcessPoolExecutor, 2))
+        self.assertEqual(processed_data, DataSet(self.whole_file_name).process_vacancies("Аналитик"))
+
+
+def find_record_start(mapped_file, position, quoted):
+    """Находит начало первой записи csv, начинающейся не раньше position.
+    Переводы строк внутри кавычек не считаются границей записи.
+
+    Args:
+        mapped_file (mmap.mmap): Отображенный в память файл
+        position (int): Позиция поиска
+        quoted (bool): Находится ли position внутри значения в кавычках
+
+    Returns:
+        int: Позиция начала записи или длина файла
+    """
+    while True:
+        newline = mapped_file.find(b"\n", position)
+        if newline == -1:
+            return len(mapped_file)
+        if mapped_file[position:newline].count(b'"') % 2:
+            quoted = not quoted
+        if not quoted:
+            return newline + 1
+        position = newline + 1
+
+
+def split_csv_byte_ranges(file_name, parts, block_size=1 << 20):
+    """Делит csv файл на диапазоны байт, границы которых совпадают с границами записей.
+    Четность числа кавычек до границы показывает, находится ли она внутри значения в кавычках,
+    поэтому записи с переводами строк внутри кавычек не разрываются.
+
+    Args:
+        file_name (str): Название файла в формате "*****.csv"
+        parts (int): Желаемое количество диапазонов
+        block_size (int): Размер блока, которым подсчитываются кавычки
+
+    Returns:
+        field_names (list(str)): Заголовок таблицы
+        byte_ranges (list(tuple(int, int))): Диапазоны [начало, конец) записей после заголовка
+    """
+    with open(file_name, mode="rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            size = len(mapped_file)
+            header_end = find_record_start(mapped_file, 0, False)
+            field_names = next(csv.reader([mapped_file[:header_end].decode("utf-8-sig")]), [])
+            boundaries = [header_end]
+            quotes, counted = 0, header_end
+            step = max((size - header_end) // max(parts, 1), 1)
+            for candidate in range(header_end + step, size, step):
+                if candidate <= counted:
+                    continue
+                while counted < candidate:
+                    block_end = min(counted + block_size, candidate)
+                    quotes += mapped_file[counted:block_end].count(b'"')
+                    counted = block_end
+                boundary = find_record_start(mapped_file, candidate, quotes % 2 == 1)
+                if boundary == size:
+                    break
+                quotes += mapped_file[candidate:boundary].count(b'"')
+                counted = boundary
+                boundaries.append(boundary)
+            boundaries.append(size)
+    return field_names, [(boundaries[i], boundaries[i + 1]) for i in range(len(boundaries) - 1)
+                         if boundaries[i] < boundaries[i + 1]]
+
+
+def aggregate_vacancies_byte_range(byte_range, file_name, field_names, vacancy_name, exchange_rates=None):
+    """Воркер параллельной обработки одного большого файла: читает свой диапазон байт
+    прямо из отображенного в память файла и собирает по нему статистику.
+
+    Args:
+        byte_range (tuple(int, int)): Диапазон [начало, конец) записей
+        file_name (str): Название файла в формате "*****.csv"
+        field_names (list(str)): Заголовок таблицы
+        vacancy_name (str): Название вакансии
+        exchange_rates (ExchangeRates): Исторические курсы валют
+
+    Returns:
+        VacanciesStatistics: Статистика по диапазону
+    """
+    start, end = byte_range
+    statistics = VacanciesStatistics(vacancy_name)
+    with open(file_name, mode="rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+        mapped_file.seek(start)
+
+        def lines():
+            while mapped_file.tell() < end:
+                yield mapped_file.readline().decode("utf-8")
+
+        for vacancy in DataSet.vacancies_generator(field_names, csv.reader(lines()), DataSet.statistics_fields,
+                                                   exchange_rates):
+            statistics.add_vacancy(vacancy)
+    return statistics
+
+
+def mmap_process_vacancies(vacancy_name, file_name, processes=None, parts=None, pool_factory=Pool,
+                           exchange_rates=None):
+    """Параллельно обрабатывает один большой csv файл по диапазонам байт, без разбиения на чанки.
+
+    Args:
+        vacancy_name (str): Название вакансии
+        file_name (str): Название файла в формате "*****.csv"
+        processes (int): Количество процессов, по умолчанию - количество ядер
+        parts (int): Количество диапазонов, по умолчанию - в 4 раза больше количества процессов
+        pool_factory (callable): Пул процессов - multiprocessing.Pool или ProcessPoolExecutor
+        exchange_rates (ExchangeRates): Исторические курсы валют, передаются в каждый процесс
+
+    Returns:
+        tuple: Данные о вакансиях, см. DataSet.process_vacancies
+    """
+    processes = processes or os.cpu_count()
+    field_names, byte_ranges = split_csv_byte_ranges(file_name, parts or processes * 4)
+    worker = partial(aggregate_vacancies_byte_range, file_name=file_name,
+                     field_names=field_names, vacancy_name=vacancy_name, exchange_rates=exchange_rates)
+    with pool_factory(processes) as pool:
+        statistics = list(pool.map(worker, byte_ranges))
+    return reduce(VacanciesStatistics.merge, statistics, VacanciesStatistics(vacancy_name)).get_processed_data()
+
+
+class MmapProcessVacanciesTests(TestCase):
+    csv_data = ("name,salary_from,salary_to,salary_currency,area_name,published_at\n"
+                + "Аналитик,10000,20000,RUR,Москва,2007-12-03T17:47:55+0300\n"
+                + "\"Программист\n\"\"1С\"\"\",30000,40000,RUR,Казань,2008-12-04T17:47:55+0300\n" * 7
+                + "Аналитик,50000,50000,RUR,Пермь,2008-02-03T17:47:55+0300\n"
+                + "\"Аналитик\nданных\",100,200,EUR,\"Москва\",2009-01-03T17:47:55+0300\n")
+
+    def setUp(self):
+        fd, self.file_name = tempfile.mkstemp(suffix=".csv")
+        with os.fdopen(fd, "w", encoding="utf-8-sig", newline="") as f:
+            f.write(self.csv_data)
+
+    def tearDown(self):
+        os.remove(self.file_name)
+
+    def test_ranges_cover_file(self):
+        field_names, byte_ranges = split_csv_byte_ranges(self.file_name, 5, block_size=7)
+        self.assertEqual(byte_ranges[-1][1], os.path.getsize(self.file_name))
+        self.assertTrue(all(byte_ranges[i][1] == byte_ranges[i + 1][0] for i in range(len(byte_ranges) - 1)))
+
+    def test_ranges_do_not_split_quoted_newlines(self):
+        field_names, byte_ranges = split_csv_byte_ranges(self.file_name, 50)
+        with open(self.file_name, mode="rb") as f:
+            data = f.read()
+        self.assertTrue(all(data[:start].count(b'"') % 2 == 0 for start, end in byte_ranges))
+
+    def test_equals_single_process(self):
+        for parts in (1, 3, 50, 200):
+            processed_data = mmap_process_vacancies("Аналитик", self.file_name, 2, parts, ProcessPoolExecutor)
+            self.assertEqual(processed_data, DataSet(self.file_name).process_vacancies("Аналитик"))
+
+
+def sqlite_process_vacancies(vacancy_name, database, table="vacancies_dif_currencies_salary"):
+    """Собирает статистику по вакансиям из хранилища SQLite (sqlite_vacancies_store.VacancyStore)
+    за один проход по вакансиям с зарплатой, без парсинга csv.
+
+    Args:
+        vacancy_name (str or list(str)): Название вакансии или список названий
+        database (str): Путь к базе данных
+        table (str): Название таблицы вакансий
+
+    Returns:
+        VacanciesStatistics: Накопитель статистики
+    """
+    statistics = VacanciesStatistics(vacancy_name)
+    conn = sqlite3.connect(database)
+    try:
+        statistics.add_rows(conn.execute(f'SELECT year, area_name, salary, name FROM "{table}" '
+                                         f'WHERE salary IS NOT NULL ORDER BY id'))
+    finally:
+        conn.close()
+    return statistics
+
+
+class SqliteProcessVacanciesTests(TestCase):
+    csv_data = ("name,salary,area_name,published_at\n"
+                "Аналитик,15000,Москва,2007-12-03T17:47:55+0300\n"
+                "Программист,35000,Казань,2007-12-04T17:47:55+0300\n"
+                "Аналитик данных,150,Москва,2008-01-03T17:47:55+0300\n"
+                "Аналитик,50000,Пермь,2008-02-03T17:47:55+0300\n"
+                "Повар,,Москва,2008-02-04T17:47:55+0300\n")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, "vacancies.csv")
+        self.database = os.path.join(self.directory, "vacancies.db")
+        with open(self.file_name, "w", encoding="utf-8-sig") as f:
+            f.write(self.csv_data)
+        with VacancyStore(self.database) as store:
+            store.load_csv(self.file_name)
+
+    def tearDown(self):
+        for file_name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, file_name))
+        os.rmdir(self.directory)
+
+    def test_equals_csv(self):
+        self.assertEqual(sqlite_process_vacancies("Аналитик", self.database).get_processed_data(),
+                         DataSet(self.file_name).process_vacancies("Аналитик"))
+
+
+def sqlite_vacancies(vacancy_name, database):
+    start = time.time()
+    processed_data = sqlite_process_vacancies(vacancy_name, database).get_processed_data()
+    print_processed_data(processed_data, start)
+
+
+def mmap_vacancies(vacancy_name, file_name):
+    start = time.time()
+    processed_data = mmap_process_vacancies(vacancy_name, file_name)
+    print_processed_data(processed_data, start)
+
+
+def concurrent_futures_vacancies(vacancy, directory):
+    start = time.time()
+    processed_data = parallel_process_vacancies(vacancy, glob.glob(f"{directory}/*.csv"), ProcessPoolExecutor)
+    print_processed_data(processed_data, start)
+
+
+def multiprocessing_vacancies(vacancy_name, directory):
+    start = time.time()
+    processed_data = parallel_process_vacancies(vacancy_name, glob.glob(f"{directory}/*.csv"), Pool)
+    print_processed_data(processed_data, start)
 
 if __name__ == "__main__":
 
-    # file_name = input("Введите название файла: ")
-    # vacancy = input("Введите название профессии: ")
-    # vacancies_without_multiprocessing(file_name, vacancy)
-    
+    file_name = input("Введите название файла: ")
+    vacancies = input("Введите название профессии (несколько профессий - через \", \"): ").split(", ")
+    database = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sqlite_database.db")
+    exchange_rates = ExchangeRates.from_sqlite(database) if os.path.exists(database) else None
+    if len(vacancies) == 1:
+        vacancies_without_multiprocessing(file_name, vacancies[0], streaming=True, exchange_rates=exchange_rates)
+    else:
+        vacancies_batch(file_name, vacancies, streaming=True, exchange_rates=exchange_rates)
+
 ## Аналитика на vacancies_by_year.csv    
     # vacancies_without_multiprocessing("vacancies_by_year.csv", "Аналитик")
+    # sqlite_vacancies("Аналитик", "../sqlite_database.db")
     # multiprocessing_vacancies("Аналитик", "./subprograms/chunks")
     # concurrent_futures_vacancies("Аналитик", "./subprograms/chunks")
 
@@ -844,6 +2447,8 @@ if __name__ == "__main__":
     # vacancies_without_multiprocessing("vacancies_dif_currencies_with_salary.csv", "Аналитик")
     # multiprocessing_vacancies("Аналитик", "./subprograms/dif_currencies_chunks_converted")
     # concurrent_futures_vacancies("Аналитик", "./subprograms/dif_currencies_chunks_converted")
+## Без предварительного разбиения на чанки: файл делится на диапазоны байт через mmap
+    # mmap_vacancies("Аналитик", "vacancies_dif_currencies_with_salary.csv")
 
     # vacancy = input("Введите название профессии: ")
     # directory = input("Введите директорию, где находятся чанки:")